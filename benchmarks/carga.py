@@ -0,0 +1,279 @@
+"""
+Benchmark HTTP de todas as rotas da API.
+
+Sobe `main:app` com uvicorn contra um mongod local (opcionalmente populado pelo
+gerador do seed.py), dispara carga concorrente em cada endpoint e reporta vazão
+e latências p50/p95/p99. Os resultados são gravados em JSON para comparação
+entre commits.
+
+Exemplos:
+
+    python -m benchmarks.carga --semear --escala media
+    python -m benchmarks.carga --url http://127.0.0.1:8000 --roteadores livros emprestimos
+    python -m benchmarks.carga --comparar antes.json depois.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from benchmarks.cenarios import CENARIOS, ROTEADORES, Cenario, cenario_disponivel, coletar_amostras, montar_caminho
+from benchmarks.cliente import ConexaoHTTP
+
+RAIZ = Path(__file__).resolve().parent.parent
+DIRETORIO_RESULTADOS = Path(__file__).resolve().parent / "resultados"
+
+# Volumes do gerador do seed.py para cada escala
+ESCALAS = {
+    "pequena": {"alunos": 1_000, "autores": 200, "livros": 2_000, "emprestimos": 10_000},
+    "media": {"alunos": 10_000, "autores": 2_000, "livros": 20_000, "emprestimos": 100_000},
+    "grande": {"alunos": 100_000, "autores": 10_000, "livros": 200_000, "emprestimos": 1_000_000},
+    "enorme": {"alunos": 200_000, "autores": 20_000, "livros": 500_000, "emprestimos": 5_000_000},
+}
+
+
+def percentil(valores_ordenados: List[float], p: float) -> float:
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, max(0, round(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+def resumir(cenario: Cenario, latencias: List[float], erros: int, duracao: float) -> Dict:
+    latencias.sort()
+    total = len(latencias) + erros
+    return {
+        "roteador": cenario.roteador,
+        "endpoint": cenario.nome,
+        "caminho": cenario.caminho,
+        "requisicoes": total,
+        "erros": erros,
+        "rps": round(total / duracao, 2) if duracao else 0.0,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 3),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 3),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 3),
+        "max_ms": round(latencias[-1] * 1000, 3) if latencias else 0.0,
+    }
+
+
+async def medir_cenario(url_base: str, cenario: Cenario, amostras, args) -> Dict:
+    """Dispara `args.concorrencia` workers contra um endpoint até atingir a duração ou o total de requisições."""
+    latencias: List[float] = []
+    erros = 0
+    rng = random.Random(args.seed)
+    restantes = args.requisicoes
+    fim = time.perf_counter() + args.duracao
+
+    async def worker():
+        nonlocal erros, restantes
+        conexao = ConexaoHTTP(url_base)
+        try:
+            while time.perf_counter() < fim:
+                if args.requisicoes:
+                    if restantes <= 0:
+                        break
+                    restantes -= 1
+                caminho = montar_caminho(cenario, amostras, rng)
+                inicio = time.perf_counter()
+                try:
+                    status, _ = await conexao.get(caminho)
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    erros += 1
+                    continue
+                if status >= 400:
+                    erros += 1
+                else:
+                    latencias.append(time.perf_counter() - inicio)
+        finally:
+            await conexao.fechar()
+
+    # Aquecimento: algumas requisições fora da medição
+    aquecimento = ConexaoHTTP(url_base)
+    try:
+        for _ in range(args.aquecimento):
+            await aquecimento.get(montar_caminho(cenario, amostras, rng))
+    finally:
+        await aquecimento.fechar()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concorrencia)))
+    return resumir(cenario, latencias, erros, time.perf_counter() - inicio)
+
+
+def imprimir_tabela(resultados: List[Dict]) -> None:
+    cabecalho = f"{'endpoint':<36}{'req':>8}{'erros':>7}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+    print(cabecalho)
+    print("-" * len(cabecalho))
+    for r in resultados:
+        nome = f"{r['roteador']}.{r['endpoint']}"
+        print(
+            f"{nome:<36}{r['requisicoes']:>8}{r['erros']:>7}{r['rps']:>10.1f}"
+            f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+        )
+
+
+def commit_atual() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ambiente_servidor(args) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["DATABASE_URL"] = args.mongo
+    env["DB_NAME"] = args.db
+    return env
+
+
+def semear(args) -> None:
+    """Popula o banco de benchmark com o gerador do seed.py na escala escolhida."""
+    volumes = ESCALAS[args.escala]
+    comando = [sys.executable, "seed.py", "--gerar", "--limpar", "--seed", str(args.seed)]
+    for chave, valor in volumes.items():
+        comando += [f"--{chave}", str(valor)]
+    print(f"🌱 Populando '{args.db}' na escala {args.escala}: {volumes}")
+    subprocess.run(comando, cwd=RAIZ, env=ambiente_servidor(args), check=True)
+
+
+async def aguardar_servidor(url_base: str, timeout: float = 60.0) -> None:
+    limite = time.monotonic() + timeout
+    while True:
+        conexao = ConexaoHTTP(url_base)
+        try:
+            status, _ = await conexao.get("/")
+            if status == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            await conexao.fechar()
+        if time.monotonic() > limite:
+            raise TimeoutError("o servidor não respondeu a tempo")
+        await asyncio.sleep(0.5)
+
+
+def iniciar_servidor(args) -> subprocess.Popen:
+    comando = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1",
+        "--port", str(args.porta),
+        "--workers", str(args.workers),
+        "--log-level", "warning",
+    ]
+    return subprocess.Popen(comando, cwd=RAIZ, env=ambiente_servidor(args))
+
+
+async def executar(args) -> Dict:
+    servidor = None
+    url_base = args.url
+    if url_base is None:
+        url_base = f"http://127.0.0.1:{args.porta}"
+        servidor = iniciar_servidor(args)
+
+    try:
+        await aguardar_servidor(url_base)
+        amostras = await coletar_amostras(url_base)
+        cenarios = [
+            c for c in CENARIOS
+            if c.roteador in args.roteadores and (not args.endpoints or f"{c.roteador}.{c.nome}" in args.endpoints)
+        ]
+
+        resultados = []
+        for cenario in cenarios:
+            if not cenario_disponivel(cenario, amostras):
+                print(f"⏭️  {cenario.roteador}.{cenario.nome}: sem dados para parametrizar")
+                continue
+            print(f"⏱️  {cenario.roteador}.{cenario.nome}...")
+            resultados.append(await medir_cenario(url_base, cenario, amostras, args))
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait(timeout=30)
+
+    return {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "parametros": {
+            "escala": args.escala if args.semear else None,
+            "concorrencia": args.concorrencia,
+            "duracao": args.duracao,
+            "requisicoes": args.requisicoes,
+            "workers": args.workers if args.url is None else None,
+        },
+        "resultados": resultados,
+    }
+
+
+def comparar(caminho_base: str, caminho_novo: str) -> None:
+    """Imprime a variação de vazão e latência entre duas execuções."""
+    base = {(r["roteador"], r["endpoint"]): r for r in json.loads(Path(caminho_base).read_text())["resultados"]}
+    novo = json.loads(Path(caminho_novo).read_text())["resultados"]
+
+    def variacao(antes, depois):
+        return f"{(depois - antes) / antes * 100:+.1f}%" if antes else "n/a"
+
+    print(f"{'endpoint':<36}{'rps':>12}{'p50':>12}{'p95':>12}{'p99':>12}")
+    for r in novo:
+        anterior = base.get((r["roteador"], r["endpoint"]))
+        if anterior is None:
+            continue
+        print(
+            f"{r['roteador'] + '.' + r['endpoint']:<36}"
+            f"{variacao(anterior['rps'], r['rps']):>12}"
+            f"{variacao(anterior['p50_ms'], r['p50_ms']):>12}"
+            f"{variacao(anterior['p95_ms'], r['p95_ms']):>12}"
+            f"{variacao(anterior['p99_ms'], r['p99_ms']):>12}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark HTTP das rotas da biblioteca.")
+    parser.add_argument("--url", help="Usa um servidor já em execução em vez de subir main:app")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="Workers do uvicorn")
+    parser.add_argument("--mongo", default=os.getenv("BENCH_DATABASE_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default=os.getenv("BENCH_DB_NAME", "biblioteca_bench"))
+    parser.add_argument("--semear", action="store_true", help="Popula o banco antes de medir")
+    parser.add_argument("--escala", choices=sorted(ESCALAS), default="pequena")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concorrencia", type=int, default=16, help="Requisições simultâneas por endpoint")
+    parser.add_argument("--duracao", type=float, default=10.0, help="Segundos de medição por endpoint")
+    parser.add_argument("--requisicoes", type=int, default=0, help="Limite de requisições por endpoint (0 = só duração)")
+    parser.add_argument("--aquecimento", type=int, default=20, help="Requisições de aquecimento por endpoint")
+    parser.add_argument("--roteadores", nargs="+", choices=ROTEADORES, default=ROTEADORES)
+    parser.add_argument("--endpoints", nargs="*", help="Filtra por roteador.endpoint (ex.: livros.buscar)")
+    parser.add_argument("--saida", help="Arquivo JSON de resultados (padrão: benchmarks/resultados/<data>-<commit>.json)")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NOVO"), help="Compara dois arquivos de resultados")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    if args.semear:
+        semear(args)
+
+    relatorio = asyncio.run(executar(args))
+    print()
+    imprimir_tabela(relatorio["resultados"])
+
+    saida = Path(args.saida) if args.saida else (
+        DIRETORIO_RESULTADOS / f"{datetime.now():%Y%m%d-%H%M%S}-{relatorio['commit'] or 'local'}.json"
+    )
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    saida.write_text(json.dumps(relatorio, indent=2, ensure_ascii=False))
+    print(f"\n💾 Resultados gravados em {saida}")
+
+
+if __name__ == "__main__":
+    main()
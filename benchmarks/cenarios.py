@@ -0,0 +1,80 @@
+import json
+import random
+from dataclasses import dataclass
+from typing import Dict, List
+from urllib.parse import quote
+from benchmarks.cliente import ConexaoHTTP
+
+
+@dataclass
+class Cenario:
+    """Um endpoint a ser medido. `caminho` pode conter {aluno_id}, {autor_id}, {livro_id}, {emprestimo_id} e {termo}."""
+    roteador: str
+    nome: str
+    caminho: str
+
+
+CENARIOS: List[Cenario] = [
+    # alunos
+    Cenario("alunos", "listar", "/alunos/?limit=100"),
+    Cenario("alunos", "listar_offset_profundo", "/alunos/?limit=100&offset=5000"),
+    Cenario("alunos", "obter", "/alunos/{aluno_id}"),
+    Cenario("alunos", "emprestimos", "/alunos/{aluno_id}/emprestimos?limit=100"),
+    # autores
+    Cenario("autores", "listar", "/autores/?limit=100"),
+    Cenario("autores", "obter", "/autores/{autor_id}"),
+    Cenario("autores", "livros", "/autores/{autor_id}/livros?limit=100"),
+    # livros
+    Cenario("livros", "listar", "/livros/?limit=100"),
+    Cenario("livros", "obter", "/livros/{livro_id}"),
+    Cenario("livros", "autores", "/livros/{livro_id}/autores"),
+    Cenario("livros", "emprestimos", "/livros/{livro_id}/emprestimos?limit=100"),
+    Cenario("livros", "buscar", "/livros/buscar/query?q={termo}&limit=20"),
+    Cenario("livros", "ranking", "/livros/mais-emprestados/ranking?limit=10"),
+    Cenario("livros", "por_categoria", "/livros/por-categoria/filtrar?categoria=Redes&limit=100"),
+    # emprestimos
+    Cenario("emprestimos", "listar", "/emprestimos/?limit=100"),
+    Cenario("emprestimos", "obter", "/emprestimos/{emprestimo_id}"),
+    Cenario("emprestimos", "atrasados", "/emprestimos/atrasados/listar?limit=100"),
+    Cenario("emprestimos", "ativos", "/emprestimos/ativos/listar?limit=100"),
+    # estatisticas
+    Cenario("estatisticas", "resumo", "/estatisticas/"),
+    Cenario("estatisticas", "fresh", "/estatisticas/?fresh=true"),
+]
+
+TERMOS_BUSCA = ["sistemas", "algo", "redes dados", "projeto", "silva", "introducao", "c"]
+
+ROTEADORES = sorted({cenario.roteador for cenario in CENARIOS})
+
+
+async def coletar_amostras(url_base: str, tamanho: int = 100) -> Dict[str, List[str]]:
+    """Busca ids reais de cada coleção para parametrizar os cenários."""
+    conexao = ConexaoHTTP(url_base)
+    amostras = {"termo": TERMOS_BUSCA}
+    try:
+        for chave, caminho in [
+            ("aluno_id", "/alunos/"),
+            ("autor_id", "/autores/"),
+            ("livro_id", "/livros/"),
+            ("emprestimo_id", "/emprestimos/"),
+        ]:
+            status, corpo = await conexao.get(f"{caminho}?limit={tamanho}")
+            itens = json.loads(corpo) if status == 200 else []
+            amostras[chave] = [item["id"] for item in itens]
+    finally:
+        await conexao.fechar()
+    return amostras
+
+
+def montar_caminho(cenario: Cenario, amostras: Dict[str, List[str]], rng: random.Random) -> str:
+    valores = {chave: quote(rng.choice(lista)) for chave, lista in amostras.items() if lista}
+    return cenario.caminho.format(**valores)
+
+
+def cenario_disponivel(cenario: Cenario, amostras: Dict[str, List[str]]) -> bool:
+    """Cenários que dependem de ids só rodam se a coleção tiver dados."""
+    return all(
+        amostras.get(chave)
+        for chave in ("aluno_id", "autor_id", "livro_id", "emprestimo_id")
+        if "{" + chave + "}" in cenario.caminho
+    )
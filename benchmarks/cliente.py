@@ -0,0 +1,80 @@
+import asyncio
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+
+class ConexaoHTTP:
+    """
+    Cliente HTTP/1.1 mínimo sobre asyncio, com keep-alive.
+
+    Suficiente para o benchmark (GET/POST de JSON) sem depender de bibliotecas
+    externas; cada worker de carga usa a sua própria conexão.
+    """
+
+    def __init__(self, url_base: str):
+        partes = urlsplit(url_base)
+        self.host = partes.hostname or "127.0.0.1"
+        self.port = partes.port or 80
+        self._reader = None
+        self._writer = None
+
+    async def _conectar(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def fechar(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        self._reader = self._writer = None
+
+    async def request(self, metodo: str, caminho: str, corpo: bytes = b"", headers: Dict[str, str] = None) -> Tuple[int, bytes]:
+        """Envia uma requisição e retorna (status, corpo). Reabre a conexão se o servidor a fechou."""
+        for tentativa in range(2):
+            if self._writer is None:
+                await self._conectar()
+            try:
+                return await self._enviar(metodo, caminho, corpo, headers or {})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.fechar()
+                if tentativa:
+                    raise
+        raise ConnectionError("não foi possível completar a requisição")
+
+    async def get(self, caminho: str) -> Tuple[int, bytes]:
+        return await self.request("GET", caminho)
+
+    async def _enviar(self, metodo, caminho, corpo, headers) -> Tuple[int, bytes]:
+        linhas = [f"{metodo} {caminho} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(corpo)}"]
+        linhas += [f"{k}: {v}" for k, v in headers.items()]
+        self._writer.write(("\r\n".join(linhas) + "\r\n\r\n").encode("latin-1") + corpo)
+        await self._writer.drain()
+
+        status_linha = await self._reader.readuntil(b"\r\n")
+        status = int(status_linha.split(b" ", 2)[1])
+        resposta_headers = {}
+        while True:
+            linha = await self._reader.readuntil(b"\r\n")
+            if linha == b"\r\n":
+                break
+            nome, _, valor = linha.decode("latin-1").partition(":")
+            resposta_headers[nome.strip().lower()] = valor.strip()
+
+        if resposta_headers.get("transfer-encoding", "").lower() == "chunked":
+            partes = []
+            while True:
+                tamanho = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if tamanho == 0:
+                    await self._reader.readuntil(b"\r\n")
+                    break
+                partes.append(await self._reader.readexactly(tamanho))
+                await self._reader.readexactly(2)
+            resposta = b"".join(partes)
+        else:
+            resposta = await self._reader.readexactly(int(resposta_headers.get("content-length", 0)))
+
+        if resposta_headers.get("connection", "").lower() == "close":
+            await self.fechar()
+        return status, resposta
@@ -0,0 +1,140 @@
+"""
+Microbenchmark da serialização de páginas de /emprestimos/.
+
+Mede, sem banco nem servidor, o custo por linha de transformar os documentos
+da agregação de empréstimos (aluno e livro já resolvidos) em bytes JSON:
+
+- validado: EmprestimoFull/AlunoOut/LivroOut construídos com validação e
+  depois validados e serializados de novo pelo `response_model` do FastAPI
+  (caminho anterior das rotas);
+- construct: modelos montados com model_construct, ainda passando pelo
+  `response_model`;
+- rapido: dicts simples codificados direto pela RespostaRapida.
+
+Exemplo:
+
+    python -m benchmarks.serializacao --linhas 100 --repeticoes 2000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+from bson import ObjectId
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from models import AlunoOut, EmprestimoFull, LivroOut
+from services.emprestimos import serializar_emprestimo
+from services.serializacao import RespostaRapida, emprestimo_full_dict
+
+
+def gerar_documentos(linhas: int, seed: int) -> List[Dict[str, Any]]:
+    """Documentos no formato exato devolvido por `buscar_emprestimos`."""
+    rng = random.Random(seed)
+    inicio = datetime(2024, 1, 1)
+    docs = []
+    for i in range(linhas):
+        emprestado = inicio + timedelta(days=rng.randrange(365))
+        devolvido = emprestado + timedelta(days=rng.randrange(30)) if rng.random() < 0.6 else None
+        docs.append({
+            "_id": ObjectId(),
+            "data_emprestimo": emprestado,
+            "data_devolucao_prevista": emprestado + timedelta(days=14),
+            "data_devolucao": devolvido,
+            "aluno": {
+                "_id": ObjectId(),
+                "nome": f"Aluno {i}",
+                "matricula": f"{2024000 + i}",
+                "curso": "Ciência da Computação",
+                "email": f"aluno{i}@universidade.br",
+            },
+            "livro": {
+                "_id": ObjectId(),
+                "titulo": f"Livro {rng.randrange(10_000)}",
+                "ano": rng.randrange(1900, 2025),
+                "isbn": f"978{rng.randrange(10**9):09d}",
+                "categoria": rng.choice(["Romance", "Ficção", "Técnico", None]),
+            },
+        })
+    return docs
+
+
+def _validado(doc: Dict[str, Any]) -> EmprestimoFull:
+    """Montagem anterior das rotas: todos os campos validados na construção."""
+    aluno, livro = doc["aluno"], doc["livro"]
+    return EmprestimoFull(
+        id=doc["_id"],
+        data_emprestimo=doc["data_emprestimo"],
+        data_devolucao_prevista=doc["data_devolucao_prevista"],
+        data_devolucao=doc.get("data_devolucao"),
+        aluno=AlunoOut(id=aluno["_id"], nome=aluno["nome"], matricula=aluno["matricula"],
+                       curso=aluno["curso"], email=aluno["email"]),
+        livro=LivroOut(id=livro["_id"], titulo=livro["titulo"], ano=livro["ano"],
+                       isbn=livro["isbn"], categoria=livro.get("categoria")),
+    )
+
+
+async def _via_response_model(campo, docs, montar: Callable) -> bytes:
+    """Reproduz o que o FastAPI faz com o retorno de uma rota com `response_model`."""
+    return await serialize_response(
+        field=campo,
+        response_content=[montar(doc) for doc in docs],
+        dump_json=True,
+    )
+
+
+async def medir(docs: List[Dict[str, Any]], repeticoes: int) -> Dict[str, float]:
+    campo = create_model_field(name="Response", type_=List[EmprestimoFull], mode="serialization")
+
+    async def validado():
+        return await _via_response_model(campo, docs, _validado)
+
+    async def construct():
+        return await _via_response_model(campo, docs, serializar_emprestimo)
+
+    async def rapido():
+        return RespostaRapida([emprestimo_full_dict(doc) for doc in docs]).body
+
+    caminhos = {"validado": validado, "construct": construct, "rapido": rapido}
+
+    # As três variantes precisam produzir o mesmo JSON
+    saidas = {nome: await caminho() for nome, caminho in caminhos.items()}
+    if len(set(saidas.values())) != 1:
+        raise AssertionError("os caminhos de serialização divergem")
+
+    resultados = {}
+    for nome, caminho in caminhos.items():
+        for _ in range(max(1, repeticoes // 10)):
+            await caminho()
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            await caminho()
+        resultados[nome] = (time.perf_counter() - inicio) / (repeticoes * len(docs))
+    return resultados
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Custo por linha da serialização de /emprestimos/.")
+    parser.add_argument("--linhas", type=int, default=100, help="Linhas por página")
+    parser.add_argument("--repeticoes", type=int, default=2000, help="Páginas serializadas por caminho")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    docs = gerar_documentos(args.linhas, args.seed)
+    resultados = asyncio.run(medir(docs, args.repeticoes))
+
+    base = resultados["validado"]
+    print(f"{'caminho':<12}{'µs/linha':>12}{'µs/página':>14}{'ganho':>10}")
+    for nome, por_linha in resultados.items():
+        print(
+            f"{nome:<12}{por_linha * 1e6:>12.2f}{por_linha * args.linhas * 1e6:>14.1f}"
+            f"{base / por_linha:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
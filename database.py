@@ -1,7 +1,16 @@
 from pymongo import AsyncMongoClient
+from pymongo.errors import OperationFailure
 from beanie import init_beanie
-from models import Aluno, Autor, Emprestimo, Livro
+from models import Aluno, Autor, Autoria, Emprestimo, Estatisticas, Livro, Tarefa
+from services.carregador import contador_consultas
+from services.consultas_lentas import consultas_lentas
+from services.metricas import metricas_comandos
+from services.observador import observador
+from services.pool import metricas_pool
 from dotenv import load_dotenv
+from typing import Optional
+import asyncio
+import logging
 import os
 
 load_dotenv()
@@ -9,23 +18,148 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 DB_NAME = os.getenv("DB_NAME")
 
+DOCUMENT_MODELS = [
+    Aluno,
+    Autor,
+    Autoria,
+    Emprestimo,
+    Estatisticas,
+    Livro,
+    Tarefa,
+]
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+# Cliente e pool de conexões
+
+def _env_int(nome: str, padrao: Optional[int] = None) -> Optional[int]:
+    valor = os.getenv(nome)
+    return int(valor) if valor else padrao
+
+def opcoes_cliente() -> dict:
+    """
+    Opções do pool lidas do ambiente. Variáveis não definidas ficam com o
+    padrão do pymongo.
+
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS e MONGO_COMPRESSORS (ex.: "zstd,snappy,zlib").
+    """
+    opcoes = {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE"),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE"),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_TIME_MS"),
+        "waitQueueTimeoutMS": _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS"),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS"),
+        "compressors": os.getenv("MONGO_COMPRESSORS") or None,
+    }
+    return {chave: valor for chave, valor in opcoes.items() if valor is not None}
+
+def criar_cliente(url: Optional[str] = None) -> AsyncMongoClient:
+    """Fábrica única do cliente Mongo (API e seed), com os listeners de métricas registrados."""
+    return AsyncMongoClient(
+        url or DATABASE_URL,
+        event_listeners=[metricas_pool, metricas_comandos, consultas_lentas, contador_consultas, observador],
+        **opcoes_cliente(),
+    )
+
+async def aquecer_pool(client: AsyncMongoClient) -> int:
+    """
+    Abre minPoolSize conexões imediatamente com pings simultâneos, em vez de
+    esperar o preenchimento em segundo plano do pymongo. Retorna quantas.
+    """
+    conexoes = client.options.pool_options.min_pool_size
+    if conexoes > 0:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(conexoes)))
+    return conexoes
+
 async def init_db():
     global _client
-    _client = AsyncMongoClient(DATABASE_URL)
+    _client = criar_cliente()
     db = _client[DB_NAME]
 
     await init_beanie(
         database=db,
-        document_models=[
-            Aluno,
-            Autor,
-            Emprestimo,
-            Livro,
-        ],
+        document_models=DOCUMENT_MODELS,
+        skip_indexes=True,
     )
+    await sincronizar_indices()
+    await aquecer_pool(_client)
+    consultas_lentas.configurar(_client)
 
 async def close_db():
     global _client
     if _client is not None:
+        consultas_lentas.configurar(None)
         await _client.close()
         _client = None
+
+
+# Índices
+
+def _opcoes_indice(info: dict) -> dict:
+    """Normaliza as opções relevantes de um índice para comparação."""
+    key = info["key"]
+    pares = key.items() if isinstance(key, dict) else key
+    return {
+        "key": [
+            (campo, int(direcao) if isinstance(direcao, (int, float)) else direcao)
+            for campo, direcao in pares
+        ],
+        "unique": bool(info.get("unique", False)),
+        "partialFilterExpression": info.get("partialFilterExpression"),
+    }
+
+async def sincronizar_indices() -> dict:
+    """
+    Cria os índices declarados em `Settings.indexes` de cada modelo e
+    reporta divergências em relação aos índices existentes no banco.
+
+    Retorna um dicionário {colecao: [divergencias]} (vazio se não houver).
+    Falhar ao criar um índice único (ex.: documentos já duplicados) levanta
+    o OperationFailure: as rotas contam com ele para recusar duplicatas.
+    """
+    divergencias = {}
+
+    for model in DOCUMENT_MODELS:
+        collection = model.get_pymongo_collection()
+        # O Beanie guarda os índices declarados como IndexModelField
+        declarados = [field.index for field in model.get_settings().indexes or []]
+        existentes = await collection.index_information()
+        problemas = []
+
+        for index in declarados:
+            doc = index.document
+            nome = doc["name"]
+            esperado = _opcoes_indice(doc)
+
+            if nome in existentes:
+                atual = _opcoes_indice(existentes[nome])
+                if atual != esperado:
+                    problemas.append(f"índice '{nome}' difere do declarado: {atual} != {esperado}")
+                continue
+
+            try:
+                await collection.create_indexes([index])
+            except OperationFailure as e:
+                if esperado["unique"]:
+                    # Sem o índice único a regra que ele garante deixaria de valer: não sobe
+                    logger.error("[%s] não foi possível criar o índice único '%s': %s", collection.name, nome, e)
+                    raise
+                problemas.append(f"não foi possível criar o índice '{nome}': {e}")
+
+        nomes_declarados = {index.document["name"] for index in declarados}
+        for nome in existentes:
+            if nome != "_id_" and nome not in nomes_declarados:
+                problemas.append(f"índice '{nome}' existe no banco mas não está declarado")
+
+        if problemas:
+            divergencias[collection.name] = problemas
+            for problema in problemas:
+                logger.warning("[%s] %s", collection.name, problema)
+
+    return divergencias
@@ -1,15 +1,37 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import Depends, FastAPI
 from contextlib import asynccontextmanager
-from routes import home, alunos, autores, livros, emprestimos, estatisticas
+from routes import home, alunos, autores, livros, emprestimos, estatisticas, debug, metricas, tarefas
 from database import init_db, close_db
+from services.aquecimento import loop_aquecimento
+from services.atrasos import loop_atrasos
+from services.busca import indice_livros
+from services.carregador import MiddlewareCarregadores
+from services.estatisticas import loop_reconciliacao
+from services.metricas import MiddlewareMetricas, registrar_rota
+from services.observador import observador
+from services.tarefas import fila_tarefas
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await indice_livros.reconstruir()
+    await fila_tarefas.iniciar()
+    await observador.iniciar()
+    reconciliacao = asyncio.create_task(loop_reconciliacao())
+    atrasos = asyncio.create_task(loop_atrasos())
+    aquecimento = asyncio.create_task(loop_aquecimento())
     yield
+    aquecimento.cancel()
+    atrasos.cancel()
+    reconciliacao.cancel()
+    await observador.parar()
+    await fila_tarefas.parar()
     await close_db()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(registrar_rota)])
+app.add_middleware(MiddlewareCarregadores)
+app.add_middleware(MiddlewareMetricas)
 
 app.include_router(home.router)
 app.include_router(alunos.router)
@@ -17,3 +39,6 @@ app.include_router(autores.router)
 app.include_router(livros.router)
 app.include_router(emprestimos.router)
 app.include_router(estatisticas.router)
+app.include_router(debug.router)
+app.include_router(metricas.router)
+app.include_router(tarefas.router)
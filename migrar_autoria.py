@@ -0,0 +1,33 @@
+import argparse
+import asyncio
+
+from seed import init_db
+from services.autoria import MODO_COLECAO, MODO_EMBUTIDO, migrar_para_colecao, migrar_para_embutido
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Migra os vínculos livro-autor entre os arrays embutidos e a coleção autorias.")
+    parser.add_argument("--para", choices=[MODO_COLECAO, MODO_EMBUTIDO], required=True, help="Formato de destino")
+    parser.add_argument("--limpar-arrays", action="store_true", help="Com --para colecao, esvazia Livro.autores e Autor.livros")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    await init_db()
+
+    if args.para == MODO_COLECAO:
+        resultado = await migrar_para_colecao(limpar_arrays=args.limpar_arrays)
+        print(f"🔗 Arestas gravadas em autorias: {resultado['arestas']}")
+        if args.limpar_arrays:
+            print("🗑️  Arrays embutidos esvaziados")
+    else:
+        resultado = await migrar_para_embutido()
+        print(f"📚 Livros atualizados: {resultado['livros']}")
+        print(f"✍️  Autores atualizados: {resultado['autores']}")
+
+    print(f"\n✅ Ajuste AUTORIA_STORAGE={args.para} e reinicie a API.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,12 @@
 from .aluno import *
 from .autor import *
+from .autoria import *
+from .bulk import *
 from .emprestimo import *
+from .estatisticas import *
 from .livro import *
+from .lote import *
+from .tarefa import *
 
 AlunoOut.model_rebuild()
 Autor.model_rebuild()
@@ -1,6 +1,7 @@
 from beanie import Document, PydanticObjectId
 from pydantic import BaseModel, EmailStr
 from typing import Optional
+from pymongo import ASCENDING, IndexModel
 
 class AlunoCreate(BaseModel):
     nome: str
@@ -22,6 +23,9 @@ class Aluno(Document):
 
     class Settings:
         name = "alunos"
+        indexes = [
+            IndexModel([("matricula", ASCENDING)], name="matricula_unique", unique=True),
+        ]
 
 class AlunoOut(BaseModel):
     id: PydanticObjectId
@@ -1,6 +1,7 @@
 from beanie import Document, Link, PydanticObjectId
 from typing import Optional, List, TYPE_CHECKING
 from pydantic import BaseModel
+from pymongo import ASCENDING, IndexModel
 
 if TYPE_CHECKING:
     from .livro import Livro
@@ -24,6 +25,9 @@ class Autor(Document):
 
     class Settings:
         name = "autores"
+        indexes = [
+            IndexModel([("nome", ASCENDING)], name="nome"),
+        ]
 
 class AutorOut(BaseModel):
     id: PydanticObjectId
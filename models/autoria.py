@@ -0,0 +1,44 @@
+from typing import Any, Optional, Tuple
+from beanie import Document, PydanticObjectId
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, IndexModel
+
+class Autoria(Document):
+    """
+    Vínculo livro-autor guardado como aresta em coleção própria.
+
+    Usado quando AUTORIA_STORAGE=colecao, no lugar dos arrays embutidos
+    `Livro.autores` / `Autor.livros`, que crescem sem limite.
+
+    O _id das arestas é derivado do par (ver `id_autoria`), para que uma
+    remoção, que só informa o _id, ainda identifique o livro e o autor.
+    Arestas gravadas antes disso mantêm um ObjectId.
+    """
+    livro_id: PydanticObjectId
+    autor_id: PydanticObjectId
+
+    class Settings:
+        name = "autorias"
+        indexes = [
+            # Um vínculo por par; também atende "autores de um livro"
+            IndexModel([("livro_id", ASCENDING), ("autor_id", ASCENDING)], name="livro_autor_unique", unique=True),
+            # Livros de um autor, paginados por livro_id
+            IndexModel([("autor_id", ASCENDING), ("livro_id", ASCENDING)], name="autor_livro"),
+        ]
+
+
+def id_autoria(livro_id: ObjectId, autor_id: ObjectId) -> str:
+    """_id da aresta do par: "<livro_id>:<autor_id>"."""
+    return f"{livro_id}:{autor_id}"
+
+
+def par_da_autoria(autoria_id: Any) -> Optional[Tuple[ObjectId, ObjectId]]:
+    """(livro_id, autor_id) de um _id gerado por `id_autoria`; None para os antigos."""
+    if not isinstance(autoria_id, str):
+        return None
+    livro_id, _, autor_id = autoria_id.partition(":")
+    try:
+        return ObjectId(livro_id), ObjectId(autor_id)
+    except (InvalidId, TypeError):
+        return None
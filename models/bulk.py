@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import List
+
+class BulkErro(BaseModel):
+    linha: int
+    erro: str
+
+class BulkResultado(BaseModel):
+    inseridos: int
+    erros: List[BulkErro] = []
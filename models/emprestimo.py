@@ -1,12 +1,25 @@
 from beanie import Document, Link, PydanticObjectId
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
+from pymongo import ASCENDING, IndexModel
 from datetime import date
-from typing import Optional, TYPE_CHECKING
+from typing import Literal, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .aluno import Aluno, AlunoOut
     from .livro import Livro, LivroOut
 
+StatusEmprestimo = Literal["ativo", "atrasado", "devolvido"]
+
+def status_emprestimo(
+    data_devolucao: Optional[date],
+    data_devolucao_prevista: date,
+    hoje: Optional[date] = None,
+) -> StatusEmprestimo:
+    """Situação de um empréstimo a partir das datas."""
+    if data_devolucao is not None:
+        return "devolvido"
+    return "atrasado" if data_devolucao_prevista < (hoje or date.today()) else "ativo"
+
 class EmprestimoCreate(BaseModel):
     data_emprestimo: date
     data_devolucao_prevista: date
@@ -25,18 +38,66 @@ class Emprestimo(Document):
     data_emprestimo: date
     data_devolucao_prevista: date
     data_devolucao: Optional[date] = None
+    # Mantido pelas rotas de escrita e pela varredura de atrasos (services/atrasos.py)
+    status: Optional[StatusEmprestimo] = None
 
     aluno: Link["Aluno"]
     livro: Link["Livro"]
 
+    @model_validator(mode="after")
+    def _preencher_status(self):
+        if self.status is None:
+            self.status = status_emprestimo(self.data_devolucao, self.data_devolucao_prevista)
+        return self
+
     class Settings:
         name = "emprestimos"
+        indexes = [
+            # Ordenação keyset (data_emprestimo, _id) das listagens
+            IndexModel([("data_emprestimo", ASCENDING), ("_id", ASCENDING)], name="data_id"),
+            # Mesma ordenação só sobre os ativos (/ativos/listar): o filtro parcial
+            # é o da rota, então o cursor percorre o índice sem ordenar em memória
+            IndexModel(
+                [("data_emprestimo", ASCENDING), ("_id", ASCENDING)],
+                name="ativos_data_id",
+                partialFilterExpression={"data_devolucao": None},
+            ),
+            # Empréstimos de um aluno / de um livro (rotas de relacionamento)
+            IndexModel(
+                [("aluno.$id", ASCENDING), ("data_emprestimo", ASCENDING), ("_id", ASCENDING)],
+                name="aluno_data_id",
+            ),
+            IndexModel(
+                [("livro.$id", ASCENDING), ("data_emprestimo", ASCENDING), ("_id", ASCENDING)],
+                name="livro_data_id",
+            ),
+            # No máximo um empréstimo ativo por (aluno, livro), garantido pelo banco
+            IndexModel(
+                [("aluno.$id", ASCENDING), ("livro.$id", ASCENDING)],
+                name="ativo_aluno_livro_unique",
+                unique=True,
+                partialFilterExpression={"data_devolucao": None},
+            ),
+            # Listagem e contagem de atrasados: igualdade em status + ordenação keyset
+            IndexModel(
+                [("status", ASCENDING), ("data_emprestimo", ASCENDING), ("_id", ASCENDING)],
+                name="status_data_id",
+            ),
+            # Varredura de atrasos: status == "ativo" com prazo vencido
+            IndexModel([("status", ASCENDING), ("data_devolucao_prevista", ASCENDING)], name="status_prevista"),
+            # Empréstimos ativos (data_devolucao == None)
+            IndexModel(
+                [("data_devolucao", ASCENDING), ("data_devolucao_prevista", ASCENDING)],
+                name="devolucao_prevista",
+            ),
+        ]
 
 class EmprestimoOut(BaseModel):
     id: PydanticObjectId
     data_emprestimo: date
     data_devolucao_prevista: date
     data_devolucao: Optional[date]
+    status: Optional[StatusEmprestimo] = None
     aluno_id: PydanticObjectId
     livro_id: PydanticObjectId
 
@@ -49,7 +110,9 @@ class EmprestimoWithLivroOut(BaseModel):
     data_emprestimo: date
     data_devolucao_prevista: date
     data_devolucao: Optional[date]
-    livro: "LivroOut"
+    status: Optional[StatusEmprestimo] = None
+    # None quando o livro foi removido
+    livro: Optional["LivroOut"]
 
     model_config = {
         "from_attributes": True
@@ -60,8 +123,10 @@ class EmprestimoFull(BaseModel):
     data_emprestimo: date
     data_devolucao_prevista: date
     data_devolucao: Optional[date]
-    aluno: "AlunoOut"
-    livro: "LivroOut"
+    status: Optional[StatusEmprestimo] = None
+    # None quando o aluno ou o livro foi removido
+    aluno: Optional["AlunoOut"]
+    livro: Optional["LivroOut"]
 
     model_config = {
         "from_attributes": True
@@ -0,0 +1,21 @@
+from beanie import Document
+from datetime import datetime
+from typing import Optional
+
+RESUMO_ID = "geral"
+
+class Estatisticas(Document):
+    """Resumo pré-calculado das estatísticas gerais (documento único)."""
+    id: str = RESUMO_ID
+    total_alunos: int = 0
+    total_autores: int = 0
+    total_livros: int = 0
+    total_emprestimos: int = 0
+    emprestimos_ativos: int = 0
+    emprestimos_atrasados: int = 0
+    livro_mais_emprestado: Optional[str] = None
+    aluno_mais_ativo: Optional[str] = None
+    atualizado_em: Optional[datetime] = None
+
+    class Settings:
+        name = "estatisticas"
@@ -1,5 +1,6 @@
 from beanie import Document, Link, PydanticObjectId
 from pydantic import BaseModel
+from pymongo import ASCENDING, IndexModel
 from typing import List, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -29,6 +30,11 @@ class Livro(Document):
 
     class Settings:
         name = "livros"
+        indexes = [
+            IndexModel([("isbn", ASCENDING)], name="isbn_unique", unique=True),
+            IndexModel([("autores.$id", ASCENDING)], name="autores_id"),
+            IndexModel([("categoria", ASCENDING)], name="categoria"),
+        ]
 
 class LivroOut(BaseModel):
     id: PydanticObjectId
@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import Generic, List, TypeVar
+
+T = TypeVar("T")
+
+class LoteIds(BaseModel):
+    ids: List[str] = Field(..., min_length=1)
+
+class Lote(BaseModel, Generic[T]):
+    """Resultado de uma leitura por lista de ids, na ordem pedida."""
+    itens: List[T]
+    nao_encontrados: List[str] = []
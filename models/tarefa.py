@@ -0,0 +1,31 @@
+from beanie import Document
+from datetime import datetime
+from pymongo import ASCENDING, IndexModel
+from typing import Any, Dict, Literal, Optional
+
+StatusTarefa = Literal["pendente", "executando", "concluida", "falhou"]
+
+class Tarefa(Document):
+    """
+    Tarefa da fila em segundo plano (services/tarefas.py), gravada apenas com
+    TAREFAS_PERSISTIR=true para sobreviver a reinícios.
+    """
+    nome: str
+    argumentos: Dict[str, Any] = {}
+    chave: Optional[str] = None
+    status: StatusTarefa = "pendente"
+    tentativas: int = 0
+    erro: Optional[str] = None
+    criada_em: datetime
+    iniciada_em: Optional[datetime] = None
+    concluida_em: Optional[datetime] = None
+    # Processo que executará a tarefa e até quando a posse vale (services/tarefas.py)
+    dono: Optional[str] = None
+    lease_ate: Optional[datetime] = None
+
+    class Settings:
+        name = "tarefas"
+        indexes = [
+            # Tarefas sem dono a assumir (status + lease) e listagem por status
+            IndexModel([("status", ASCENDING), ("criada_em", ASCENDING)], name="status_criada"),
+        ]
@@ -1,7 +1,22 @@
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from beanie import PydanticObjectId
-from typing import List
-from models import Aluno, AlunoCreate, AlunoUpdate, Emprestimo, EmprestimoWithLivroOut, LivroOut, AlunoOut
+from pymongo.errors import DuplicateKeyError
+from typing import List, Optional
+from models import Aluno, AlunoCreate, AlunoUpdate, Emprestimo, EmprestimoWithLivroOut, AlunoOut, BulkResultado, Lote, LoteIds
+from services.emprestimos import buscar_emprestimos, definir_proximo_cursor_emprestimos
+from services.serializacao import aluno_dict, emprestimo_com_livro_dict, linhas_emprestimos, resposta_rapida
+from services.paginacao import paginar
+from services.campos import Campos, campos_da_query, modelo_projecao, projetar
+from services.estatisticas import incrementar
+from services.bulk import importar_em_lote
+from services.cache import cache_entidades
+from services.carregador import carregador
+from services.lote import buscar_lote, ids_da_query, validar_ids
+from services.exportacao import CAMPOS_ALUNO, FormatoExportacao, exportar
+
+# Violação do índice único (matricula_unique)
+ERRO_MATRICULA_DUPLICADA = "Já existe um aluno com esta matrícula"
 
 router = APIRouter(
     prefix="/alunos",
@@ -12,19 +27,60 @@ router = APIRouter(
 async def create_aluno(aluno: AlunoCreate):
     """Cria um novo aluno."""
     aluno_db = Aluno(**aluno.model_dump())
-    await aluno_db.insert()
+    try:
+        await aluno_db.insert()
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=ERRO_MATRICULA_DUPLICADA)
+    await incrementar(total_alunos=1)
     return aluno_db
 
+@router.post("/bulk", response_model=BulkResultado)
+async def create_alunos_bulk(request: Request):
+    """Cria alunos em lote a partir de um array JSON ou de um corpo NDJSON (application/x-ndjson)."""
+    async def ao_inserir(alunos):
+        await incrementar(total_alunos=len(alunos))
+
+    return await importar_em_lote(request, AlunoCreate, Aluno, ao_inserir=ao_inserir)
+
 @router.get("/", response_model=List[AlunoOut])
-async def read_alunos(offset: int = 0, limit: int = Query(default=10, le=100)):
-    """Retorna uma lista de alunos com paginação."""
-    alunos = await Aluno.find_all().skip(offset).limit(limit).to_list()
-    return alunos
+async def read_alunos(
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    campos: Optional[Campos] = Depends(campos_da_query(AlunoOut))
+):
+    """
+    Retorna uma lista de alunos com paginação (offset ou cursor).
+
+    `?fields=id,nome` restringe os campos lidos do banco e devolvidos.
+    """
+    alunos = await paginar(Aluno.find_all().project(modelo_projecao(AlunoOut, campos)), response, cursor, offset, limit)
+    return resposta_rapida(projetar(alunos, AlunoOut, campos), response)
+
+@router.get("/export")
+async def export_alunos(formato: FormatoExportacao = Query(default="ndjson", alias="format")):
+    """Exporta todos os alunos em NDJSON ou CSV, transmitidos a partir do cursor do banco."""
+    return exportar(Aluno, CAMPOS_ALUNO, formato)
+
+@router.get("/lote", response_model=Lote[AlunoOut])
+async def read_alunos_lote(ids: List[PydanticObjectId] = Depends(ids_da_query)):
+    """
+    Retorna vários alunos pelos ids (`?ids=a,b,c`) com uma única consulta $in,
+    na ordem pedida. Ids inexistentes são listados em `nao_encontrados`.
+    """
+    return resposta_rapida(await buscar_lote(Aluno, ids, aluno_dict))
+
+@router.post("/lote", response_model=Lote[AlunoOut])
+async def read_alunos_lote_post(lote: LoteIds):
+    """Mesmo que GET /alunos/lote, com os ids no corpo (para listas longas)."""
+    ids = validar_ids(lote.ids)
+    return resposta_rapida(await buscar_lote(Aluno, ids, aluno_dict))
 
 @router.get("/{aluno_id}", response_model=AlunoOut)
 async def read_aluno(aluno_id: PydanticObjectId):
     """Retorna um aluno pelo ID."""
-    aluno = await Aluno.get(aluno_id)
+    aluno = await cache_entidades.obter(Aluno, aluno_id, AlunoOut)
     if not aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
     return aluno
@@ -36,7 +92,11 @@ async def update_aluno(aluno_id: PydanticObjectId, aluno_data: AlunoUpdate):
     if not aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
-    await aluno.set(aluno_data.model_dump(exclude_unset=True))
+    try:
+        await aluno.set(aluno_data.model_dump(exclude_unset=True))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=ERRO_MATRICULA_DUPLICADA)
+    cache_entidades.invalidar(Aluno, aluno_id)
     return aluno
 
 @router.delete("/{aluno_id}")
@@ -47,6 +107,8 @@ async def delete_aluno(aluno_id: PydanticObjectId):
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
     await aluno.delete()
+    await incrementar(total_alunos=-1)
+    cache_entidades.invalidar(Aluno, aluno_id)
     return {"detail": "Aluno deletado com sucesso"}
 
 
@@ -55,32 +117,27 @@ async def delete_aluno(aluno_id: PydanticObjectId):
 @router.get("/{aluno_id}/emprestimos", response_model=List[EmprestimoWithLivroOut])
 async def get_emprestimos_aluno(
     aluno_id: PydanticObjectId,
-    offset: int = 0,
-    limit: int = Query(default=10, le=100)
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    campos: Optional[Campos] = Depends(campos_da_query(EmprestimoWithLivroOut))
 ):
-    """Retorna os empréstimos de um aluno específico com paginação."""
-    aluno = await Aluno.get(aluno_id)
+    """Retorna os empréstimos de um aluno específico com paginação (`fields` limita os campos)."""
+    # A checagem do aluno e a consulta dos empréstimos seguem em paralelo
+    aluno, emprestimos = await asyncio.gather(
+        carregador(Aluno).carregar(aluno_id),
+        buscar_emprestimos(
+            Emprestimo.aluno.id == aluno_id,
+            offset=offset,
+            limit=limit,
+            cursor=cursor,
+            incluir_aluno=False,
+            campos=campos
+        ),
+    )
     if not aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
+    definir_proximo_cursor_emprestimos(response, emprestimos, limit)
 
-    emprestimos = await Emprestimo.find(
-        Emprestimo.aluno.id == aluno_id,
-        fetch_links=True
-    ).skip(offset).limit(limit).to_list()
-
-    return [
-        EmprestimoWithLivroOut(
-            id=str(emp.id),
-            data_emprestimo=emp.data_emprestimo,
-            data_devolucao_prevista=emp.data_devolucao_prevista,
-            data_devolucao=emp.data_devolucao,
-            livro=LivroOut(
-                id=str(emp.livro.id),
-                titulo=emp.livro.titulo,
-                ano=emp.livro.ano,
-                isbn=emp.livro.isbn,
-                categoria=emp.livro.categoria
-            )
-        )
-        for emp in emprestimos
-    ]
+    return resposta_rapida(linhas_emprestimos(emprestimos, campos, emprestimo_com_livro_dict), response)
@@ -1,8 +1,22 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from beanie import PydanticObjectId
-from typing import List
+from typing import List, Optional
 from models.autor import Autor, AutorCreate, AutorUpdate, AutorOut
 from models.livro import Livro, LivroOut
+from models.bulk import BulkResultado
+from models.lote import Lote, LoteIds
+from services.paginacao import paginar
+from services.campos import Campos, campos_da_query, modelo_projecao, projetar
+from services.serializacao import autor_dict, resposta_rapida
+from services.autoria import livros_do_autor
+from services.busca import indice_livros
+from services.estatisticas import incrementar
+from services.bulk import importar_em_lote
+from services.cache import cache_entidades
+from services.lote import buscar_lote, ids_da_query, validar_ids
+from services.tarefas import fila_tarefas
+from services.vinculos import desvincular, vincular
+from services.exportacao import CAMPOS_AUTOR, FormatoExportacao, exportar
 
 router = APIRouter(
     prefix="/autores",
@@ -14,18 +28,60 @@ async def create_autor(autor_data: AutorCreate):
     """Cria um novo autor."""
     autor = Autor(**autor_data.model_dump())
     await autor.insert()
+    await incrementar(total_autores=1)
+    indice_livros.indexar_autor(autor)
     return autor
 
+@router.post("/bulk", response_model=BulkResultado)
+async def create_autores_bulk(request: Request):
+    """Cria autores em lote a partir de um array JSON ou de um corpo NDJSON (application/x-ndjson)."""
+    async def ao_inserir(autores):
+        await incrementar(total_autores=len(autores))
+        for autor in autores:
+            indice_livros.indexar_autor(autor)
+
+    return await importar_em_lote(request, AutorCreate, Autor, ao_inserir=ao_inserir)
+
 @router.get("/", response_model=List[AutorOut])
-async def read_autores(offset: int = 0, limit: int = Query(default=10, le=100)):
-    """Retorna uma lista de autores com paginação."""
-    autores = await Autor.find_all().skip(offset).limit(limit).to_list()
-    return autores
+async def read_autores(
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    campos: Optional[Campos] = Depends(campos_da_query(AutorOut))
+):
+    """
+    Retorna uma lista de autores com paginação (offset ou cursor).
+
+    Apenas os campos de AutorOut são lidos do banco (nunca o array de livros);
+    `?fields=id,nome` restringe a leitura e a resposta a eles.
+    """
+    autores = await paginar(Autor.find_all().project(modelo_projecao(AutorOut, campos)), response, cursor, offset, limit)
+    return resposta_rapida(projetar(autores, AutorOut, campos), response)
+
+@router.get("/export")
+async def export_autores(formato: FormatoExportacao = Query(default="ndjson", alias="format")):
+    """Exporta todos os autores em NDJSON ou CSV, transmitidos a partir do cursor do banco."""
+    return exportar(Autor, CAMPOS_AUTOR, formato)
+
+@router.get("/lote", response_model=Lote[AutorOut])
+async def read_autores_lote(ids: List[PydanticObjectId] = Depends(ids_da_query)):
+    """
+    Retorna vários autores pelos ids (`?ids=a,b,c`) com uma única consulta $in,
+    na ordem pedida. Ids inexistentes são listados em `nao_encontrados`.
+    """
+    return resposta_rapida(await buscar_lote(Autor, ids, autor_dict))
+
+@router.post("/lote", response_model=Lote[AutorOut])
+async def read_autores_lote_post(lote: LoteIds):
+    """Mesmo que GET /autores/lote, com os ids no corpo (para listas longas)."""
+    ids = validar_ids(lote.ids)
+    return resposta_rapida(await buscar_lote(Autor, ids, autor_dict))
 
 @router.get("/{autor_id}", response_model=AutorOut)
 async def read_autor(autor_id: PydanticObjectId):
     """Retorna um autor pelo ID."""
-    autor = await Autor.get(autor_id)
+    autor = await cache_entidades.obter(Autor, autor_id, AutorOut)
     if not autor:
         raise HTTPException(status_code=404, detail="Autor não encontrado")
     return autor
@@ -38,6 +94,8 @@ async def update_autor(autor_id: PydanticObjectId, autor_data: AutorUpdate):
         raise HTTPException(status_code=404, detail="Autor não encontrado")
     
     await autor.set(autor_data.model_dump(exclude_unset=True))
+    indice_livros.indexar_autor(autor)
+    cache_entidades.invalidar(Autor, autor_id)
     return autor
 
 @router.delete("/{autor_id}")
@@ -48,6 +106,11 @@ async def delete_autor(autor_id: PydanticObjectId):
         raise HTTPException(status_code=404, detail="Autor não encontrado")
     
     await autor.delete()
+    # Retirar o autor dos livros pode tocar muitos documentos: fica para a fila
+    await fila_tarefas.enfileirar("limpar_vinculos_autor", autor_id=autor_id)
+    await incrementar(total_autores=-1)
+    indice_livros.remover_autor(autor_id)
+    cache_entidades.invalidar(Autor, autor_id)
     return {"detail": "Autor deletado com sucesso"}
 
 
@@ -56,72 +119,36 @@ async def delete_autor(autor_id: PydanticObjectId):
 @router.post("/{autor_id}/livros/{livro_id}")
 async def add_livro_to_autor(autor_id: PydanticObjectId, livro_id: PydanticObjectId):
     """Vincula um livro a um autor."""
-    autor = await Autor.get(autor_id)
-    if not autor:
-        raise HTTPException(status_code=404, detail="Autor não encontrado")
-    
-    livro = await Livro.get(livro_id)
-    if not livro:
-        raise HTTPException(status_code=404, detail="Livro não encontrado")
-    
-    if autor.livros is None:
-        autor.livros = []
-    
-    for link in autor.livros:
-        if link.ref.id == livro.id:
-            raise HTTPException(status_code=400, detail="Livro já está vinculado a este autor")
-        
-    autor.livros.append(livro)
-    await autor.save()
-    
-    if livro.autores is None:
-        livro.autores = []
-
-    ja_vinculado = any(link.ref.id == autor.id for link in livro.autores)
-    if not ja_vinculado:
-        livro.autores.append(autor)
-        await livro.save()
+    await vincular(Autor, autor_id, livro_id, erro_ja_vinculado="Livro já está vinculado a este autor")
 
+    indice_livros.vincular(livro_id, autor_id)
+    cache_entidades.invalidar(Autor, autor_id)
+    cache_entidades.invalidar(Livro, livro_id)
     return {"detail": "Livro adicionado ao autor com sucesso"}
 
 @router.get("/{autor_id}/livros", response_model=List[LivroOut])
 async def get_livros_by_autor(
     autor_id: PydanticObjectId,
-    offset: int = 0,
-    limit: int = Query(default=10, le=100)
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (header X-Next-Cursor)")
 ):
     """Retorna os livros associados a um autor específico."""
     autor = await Autor.get(autor_id)
     if not autor:
         raise HTTPException(status_code=404, detail="Autor não encontrado")
 
-    livros = await Livro.find(Livro.autores.id == autor_id).skip(offset).limit(limit).to_list()
+    livros = await livros_do_autor(autor_id, response, cursor, offset, limit)
     
     return livros
 
 @router.delete("/{autor_id}/livros/{livro_id}")
 async def remove_livro_from_autor(autor_id: PydanticObjectId, livro_id: PydanticObjectId):
     """Remove o vínculo entre um livro e um autor."""
-    autor = await Autor.get(autor_id)
-    if not autor:
-        raise HTTPException(status_code=404, detail="Autor não encontrado")
-        
-    livro = await Livro.get(livro_id)
-    if not livro:
-        raise HTTPException(status_code=404, detail="Livro não encontrado")
-
-    # Remove do autor
-    if autor.livros:
-        original_count = len(autor.livros)
-        autor.livros = [link for link in autor.livros if link.ref.id != livro.id]
-        
-        if len(autor.livros) == original_count:
-             raise HTTPException(status_code=404, detail="Vínculo entre livro e autor não encontrado")
-             
-        await autor.save()
-        
-    if livro.autores:
-        livro.autores = [link for link in livro.autores if link.ref.id != autor.id]
-        await livro.save()
+    await desvincular(Autor, autor_id, livro_id, erro_nao_vinculado="Vínculo entre livro e autor não encontrado")
 
+    indice_livros.desvincular(livro_id, autor_id)
+    cache_entidades.invalidar(Autor, autor_id)
+    cache_entidades.invalidar(Livro, livro_id)
     return {"detail": "Livro removido do autor com sucesso"}
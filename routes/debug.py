@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Query
+from typing import Optional
+from services.cache import cache_entidades
+from services.consultas_lentas import consultas_lentas
+from services.observador import observador
+from services.pool import metricas_pool
+from services.ranking import ranking_cache
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["debug"]
+)
+
+@router.get("/cache")
+async def get_cache_estatisticas():
+    """Retorna os contadores (hits, misses, evictions) dos caches em memória."""
+    return {
+        "entidades": cache_entidades.estatisticas(),
+        "ranking": ranking_cache.estatisticas()
+    }
+
+@router.get("/observador")
+async def get_observador_estatisticas():
+    """Retorna o modo (change stream ou polling) e os contadores do observador de mudanças entre processos."""
+    return observador.estatisticas()
+
+@router.get("/pool")
+async def get_pool_estatisticas():
+    """Retorna os medidores do pool de conexões do Mongo (em uso, fila de espera, latência de checkout)."""
+    return metricas_pool.estatisticas()
+
+@router.get("/slow-queries")
+async def get_consultas_lentas(
+    limit: Optional[int] = Query(default=None, ge=1, description="Quantidade de registros (mais recentes primeiro)")
+):
+    """
+    Retorna os comandos do Mongo emitidos pelas rotas que passaram do limiar
+    SLOW_QUERY_MS, com filtro/pipeline, rota de origem e, se o explain estiver
+    habilitado, documentos examinados e se houve COLLSCAN.
+    """
+    return {
+        "limiar_ms": consultas_lentas.limiar_ms,
+        "explain": consultas_lentas.explain,
+        "consultas": consultas_lentas.listar(limit)
+    }
+
+@router.delete("/slow-queries")
+async def delete_consultas_lentas():
+    """Esvazia o registro de consultas lentas."""
+    consultas_lentas.limpar()
+    return {"detail": "Registro de consultas lentas esvaziado"}
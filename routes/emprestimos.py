@@ -1,10 +1,30 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from beanie import PydanticObjectId
+from bson import DBRef
 from datetime import date
-from typing import List
-from models.emprestimo import Emprestimo, EmprestimoCreate, EmprestimoUpdate, EmprestimoFull, EmprestimoOut
-from models.aluno import Aluno, AlunoOut
-from models.livro import Livro, LivroOut
+from typing import List, Literal, Optional
+from models.emprestimo import Emprestimo, EmprestimoCreate, EmprestimoUpdate, EmprestimoFull, EmprestimoOut, status_emprestimo
+from models.aluno import Aluno
+from models.livro import Livro
+from models.bulk import BulkResultado
+from models.lote import Lote, LoteIds
+from services.emprestimos import (
+    buscar_emprestimos,
+    definir_proximo_cursor_emprestimos,
+    emprestimo_ativo_unico,
+    obter_emprestimo,
+    preparar_lote_emprestimos,
+    verificar_aluno_e_livro,
+)
+from services.serializacao import emprestimo_full_dict, linhas_emprestimos, resposta_rapida
+from services.campos import Campos, campos_da_query
+from services.cache import cache_entidades
+from services.lote import ids_da_query, montar_lote, validar_ids
+from services.estatisticas import atualizar_emprestimo, contribuicao_emprestimo, registrar_emprestimo, registrar_emprestimos
+from services.bulk import importar_em_lote
+from services.ranking import invalidar_ranking
+from services.tarefas import fila_tarefas
+from services.exportacao import CAMPOS_EMPRESTIMO, FormatoExportacao, exportar, filtro_emprestimos
 
 router = APIRouter(
     prefix="/emprestimos",
@@ -13,151 +33,154 @@ router = APIRouter(
 
 @router.post("/", response_model=EmprestimoOut)
 async def create_emprestimo(emprestimo_data: EmprestimoCreate):
-    """Cria um novo empréstimo."""
-    aluno = await Aluno.get(PydanticObjectId(emprestimo_data.aluno_id))
-    if not aluno:
-        raise HTTPException(status_code=404, detail="Aluno não encontrado")
-    
-    livro = await Livro.get(PydanticObjectId(emprestimo_data.livro_id))
-    if not livro:
-        raise HTTPException(status_code=404, detail="Livro não encontrado")
-    
-    # Verifica se já existe um empréstimo ativo para este livro e aluno
-    emprestimo_existente = await Emprestimo.find_one(
-        Emprestimo.livro.id == PydanticObjectId(emprestimo_data.livro_id),
-        Emprestimo.aluno.id == PydanticObjectId(emprestimo_data.aluno_id),
-        Emprestimo.data_devolucao == None
-    )
-    if emprestimo_existente:
-        raise HTTPException(status_code=400, detail="Já existe um empréstimo ativo para este livro e aluno")
+    """
+    Cria um novo empréstimo.
+
+    Aluno e livro são verificados em paralelo; a unicidade do empréstimo ativo
+    por (aluno, livro) é garantida pelo índice parcial na própria inserção.
+    """
+    aluno_id = PydanticObjectId(emprestimo_data.aluno_id)
+    livro_id = PydanticObjectId(emprestimo_data.livro_id)
+    await verificar_aluno_e_livro(aluno_id, livro_id)
 
     novo_emprestimo = Emprestimo(
-        aluno=aluno,
-        livro=livro,
+        aluno=DBRef(Aluno.get_collection_name(), aluno_id),
+        livro=DBRef(Livro.get_collection_name(), livro_id),
         data_emprestimo=emprestimo_data.data_emprestimo,
         data_devolucao_prevista=emprestimo_data.data_devolucao_prevista,
         data_devolucao=emprestimo_data.data_devolucao
     )
-    await novo_emprestimo.insert()
+    with emprestimo_ativo_unico():
+        await novo_emprestimo.insert()
+    await registrar_emprestimo(novo_emprestimo)
+    await invalidar_ranking()
     
     return EmprestimoOut(
         id=novo_emprestimo.id,
         data_emprestimo=novo_emprestimo.data_emprestimo,
         data_devolucao_prevista=novo_emprestimo.data_devolucao_prevista,
         data_devolucao=novo_emprestimo.data_devolucao,
-        aluno_id=novo_emprestimo.aluno.id,
-        livro_id=novo_emprestimo.livro.id
+        status=novo_emprestimo.status,
+        aluno_id=aluno_id,
+        livro_id=livro_id
     )
 
+@router.post("/bulk", response_model=BulkResultado)
+async def create_emprestimos_bulk(request: Request):
+    """
+    Cria empréstimos em lote a partir de um array JSON ou de um corpo NDJSON (application/x-ndjson).
+
+    A existência de alunos e livros é verificada com uma consulta $in por bloco.
+    """
+    async def ao_inserir(emprestimos):
+        await registrar_emprestimos(emprestimos)
+        await invalidar_ranking()
+
+    resultado = await importar_em_lote(
+        request,
+        EmprestimoCreate,
+        Emprestimo,
+        preparar=preparar_lote_emprestimos,
+        ao_inserir=ao_inserir
+    )
+    if resultado.inseridos:
+        # Livro mais emprestado / aluno mais ativo só mudam com o recálculo completo
+        await fila_tarefas.enfileirar("reconciliar_estatisticas", chave="reconciliar_estatisticas")
+    return resultado
+
 @router.get("/", response_model=List[EmprestimoFull])
 async def read_emprestimos(
-    offset: int = 0,
-    limit: int = Query(default=10, le=100)
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    campos: Optional[Campos] = Depends(campos_da_query(EmprestimoFull))
 ):
-    """Retorna uma lista de todos os empréstimos."""
-    emprestimos = await Emprestimo.find_all(fetch_links=True).skip(offset).limit(limit).to_list()
-    
-    return [
-        EmprestimoFull(
-            id=emp.id,
-            data_emprestimo=emp.data_emprestimo,
-            data_devolucao_prevista=emp.data_devolucao_prevista,
-            data_devolucao=emp.data_devolucao,
-            aluno=AlunoOut(
-                id=str(emp.aluno.id),
-                nome=emp.aluno.nome,
-                matricula=emp.aluno.matricula,
-                curso=emp.aluno.curso,
-                email=emp.aluno.email
-            ),
-            livro=LivroOut(
-                id=str(emp.livro.id),
-                titulo=emp.livro.titulo,
-                ano=emp.livro.ano,
-                isbn=emp.livro.isbn,
-                categoria=emp.livro.categoria
-            )
-        )
-        for emp in emprestimos
-    ]
+    """Retorna uma lista de todos os empréstimos (`fields` limita os campos e os $lookup)."""
+    emprestimos = await buscar_emprestimos(offset=offset, limit=limit, cursor=cursor, campos=campos)
+    definir_proximo_cursor_emprestimos(response, emprestimos, limit)
+
+    return resposta_rapida(linhas_emprestimos(emprestimos, campos), response)
+
+@router.get("/export")
+async def export_emprestimos(
+    formato: FormatoExportacao = Query(default="ndjson", alias="format"),
+    status: Optional[Literal["ativo", "atrasado", "devolvido"]] = None,
+    data_inicio: Optional[date] = Query(default=None, description="data_emprestimo mínima (inclusive)"),
+    data_fim: Optional[date] = Query(default=None, description="data_emprestimo máxima (inclusive)")
+):
+    """
+    Exporta empréstimos em NDJSON ou CSV, transmitidos a partir do cursor do banco.
+
+    Aceita filtro por situação (ativo, atrasado, devolvido) e por intervalo de data_emprestimo.
+    """
+    filtro = filtro_emprestimos(status, data_inicio, data_fim)
+    return exportar(Emprestimo, CAMPOS_EMPRESTIMO, formato, filtro)
+
+@router.get("/lote", response_model=Lote[EmprestimoFull])
+async def read_emprestimos_lote(ids: List[PydanticObjectId] = Depends(ids_da_query)):
+    """
+    Retorna vários empréstimos pelos ids (`?ids=a,b,c`) com uma única consulta $in,
+    na ordem pedida. Ids inexistentes são listados em `nao_encontrados`.
+    """
+    return resposta_rapida(montar_lote(ids, await buscar_emprestimos({"_id": {"$in": ids}}), emprestimo_full_dict))
+
+@router.post("/lote", response_model=Lote[EmprestimoFull])
+async def read_emprestimos_lote_post(lote: LoteIds):
+    """Mesmo que GET /emprestimos/lote, com os ids no corpo (para listas longas)."""
+    ids = validar_ids(lote.ids)
+    return resposta_rapida(montar_lote(ids, await buscar_emprestimos({"_id": {"$in": ids}}), emprestimo_full_dict))
 
 @router.get("/{emprestimo_id}", response_model=EmprestimoFull)
 async def read_emprestimo(emprestimo_id: PydanticObjectId):
     """Retorna um empréstimo pelo ID."""
-    emprestimo = await Emprestimo.get(emprestimo_id, fetch_links=True)
+    emprestimo = await obter_emprestimo(emprestimo_id)
     if not emprestimo:
         raise HTTPException(status_code=404, detail="Empréstimo não encontrado")
     
-    return EmprestimoFull(
-        id=str(emprestimo.id),
-        data_emprestimo=emprestimo.data_emprestimo,
-        data_devolucao_prevista=emprestimo.data_devolucao_prevista,
-        data_devolucao=emprestimo.data_devolucao,
-        aluno=AlunoOut(
-            id=str(emprestimo.aluno.id),
-            nome=emprestimo.aluno.nome,
-            matricula=emprestimo.aluno.matricula,
-            curso=emprestimo.aluno.curso,
-            email=emprestimo.aluno.email
-        ),
-        livro=LivroOut(
-            id=str(emprestimo.livro.id),
-            titulo=emprestimo.livro.titulo,
-            ano=emprestimo.livro.ano,
-            isbn=emprestimo.livro.isbn,
-            categoria=emprestimo.livro.categoria
-        )
-    )
+    return emprestimo
 
 @router.put("/{emprestimo_id}", response_model=EmprestimoOut)
 async def update_emprestimo(emprestimo_id: PydanticObjectId, emprestimo_data: EmprestimoUpdate):
     """Atualiza os dados de um empréstimo pelo ID."""
-    db_emprestimo = await Emprestimo.get(emprestimo_id, fetch_links=True)
+    db_emprestimo = await Emprestimo.get(emprestimo_id)
     if not db_emprestimo:
         raise HTTPException(status_code=404, detail="Empréstimo não encontrado")
     
+    contribuicao_anterior = contribuicao_emprestimo(db_emprestimo)
     update_dict = emprestimo_data.model_dump(exclude_unset=True)
-    
-    if 'aluno_id' in update_dict:
-        aluno = await Aluno.get(PydanticObjectId(update_dict['aluno_id']))
-        if not aluno:
-            raise HTTPException(status_code=404, detail="Aluno não encontrado")
-        db_emprestimo.aluno = aluno
-        del update_dict['aluno_id']
-        
-    if 'livro_id' in update_dict:
-        livro = await Livro.get(PydanticObjectId(update_dict['livro_id']))
-        if not livro:
-            raise HTTPException(status_code=404, detail="Livro não encontrado")
-        db_emprestimo.livro = livro
-        del update_dict['livro_id']
-    
-    # Verifica se já existe um empréstimo ativo para este livro e aluno (se mudou um deles)
-    aluno_id_check = db_emprestimo.aluno.id
-    livro_id_check = db_emprestimo.livro.id
-    
-    emprestimo_ativo = await Emprestimo.find_one(
-        Emprestimo.aluno.id == aluno_id_check,
-        Emprestimo.livro.id == livro_id_check,
-        Emprestimo.data_devolucao == None,
-        Emprestimo.id != emprestimo_id
-    )
-    if emprestimo_ativo:
-        raise HTTPException(status_code=400, detail="Já existe um empréstimo ativo para este livro e aluno")
-    
-    # Atualiza campos restantes (datas)
+    novo_aluno_id = PydanticObjectId(update_dict.pop('aluno_id')) if 'aluno_id' in update_dict else None
+    novo_livro_id = PydanticObjectId(update_dict.pop('livro_id')) if 'livro_id' in update_dict else None
+    await verificar_aluno_e_livro(novo_aluno_id, novo_livro_id)
+
+    if novo_aluno_id is not None:
+        update_dict['aluno'] = DBRef(Aluno.get_collection_name(), novo_aluno_id)
+    if novo_livro_id is not None:
+        update_dict['livro'] = DBRef(Livro.get_collection_name(), novo_livro_id)
+    if update_dict.keys() & {'data_devolucao', 'data_devolucao_prevista'}:
+        update_dict['status'] = status_emprestimo(
+            update_dict.get('data_devolucao', db_emprestimo.data_devolucao),
+            update_dict.get('data_devolucao_prevista', db_emprestimo.data_devolucao_prevista),
+        )
+    aluno_id = novo_aluno_id or db_emprestimo.aluno.ref.id
+    livro_id = novo_livro_id or db_emprestimo.livro.ref.id
+
+    # Um único $set; o índice parcial rejeita um segundo empréstimo ativo do par
     if update_dict:
-        await db_emprestimo.set(update_dict)
-    else:
-        await db_emprestimo.save()
+        with emprestimo_ativo_unico():
+            await db_emprestimo.set(update_dict)
+    await atualizar_emprestimo(contribuicao_anterior, db_emprestimo)
+    cache_entidades.invalidar(Emprestimo, emprestimo_id)
+    await invalidar_ranking()
         
     return EmprestimoOut(
         id=db_emprestimo.id,
         data_emprestimo=db_emprestimo.data_emprestimo,
         data_devolucao_prevista=db_emprestimo.data_devolucao_prevista,
         data_devolucao=db_emprestimo.data_devolucao,
-        aluno_id=db_emprestimo.aluno.id,
-        livro_id=db_emprestimo.livro.id
+        status=db_emprestimo.status,
+        aluno_id=aluno_id,
+        livro_id=livro_id
     )
 
 @router.delete("/{emprestimo_id}")
@@ -168,6 +191,9 @@ async def delete_emprestimo(emprestimo_id: PydanticObjectId):
         raise HTTPException(status_code=404, detail="Empréstimo não encontrado")
     
     await emprestimo.delete()
+    await registrar_emprestimo(emprestimo, sinal=-1)
+    cache_entidades.invalidar(Emprestimo, emprestimo_id)
+    await invalidar_ranking()
     return {"detail": "Empréstimo deletado com sucesso"}
 
 
@@ -175,73 +201,45 @@ async def delete_emprestimo(emprestimo_id: PydanticObjectId):
 
 @router.get("/atrasados/listar", response_model=List[EmprestimoFull])
 async def get_emprestimos_atrasados(
-    offset: int = 0,
-    limit: int = Query(default=10, le=100)
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    campos: Optional[Campos] = Depends(campos_da_query(EmprestimoFull))
 ):
-    """Retorna todos os empréstimos atrasados (data_devolucao_prevista < hoje e ainda não devolvidos)."""
-    hoje = date.today()
-    emprestimos = await Emprestimo.find(
-        Emprestimo.data_devolucao == None,
-        Emprestimo.data_devolucao_prevista < hoje,
-        fetch_links=True
-    ).skip(offset).limit(limit).to_list()
-
-    return [
-        EmprestimoFull(
-            id=str(emp.id),
-            data_emprestimo=emp.data_emprestimo,
-            data_devolucao_prevista=emp.data_devolucao_prevista,
-            data_devolucao=emp.data_devolucao,
-            aluno=AlunoOut(
-                id=str(emp.aluno.id),
-                nome=emp.aluno.nome,
-                matricula=emp.aluno.matricula,
-                curso=emp.aluno.curso,
-                email=emp.aluno.email
-            ),
-            livro=LivroOut(
-                id=str(emp.livro.id),
-                titulo=emp.livro.titulo,
-                ano=emp.livro.ano,
-                isbn=emp.livro.isbn,
-                categoria=emp.livro.categoria
-            )
-        )
-        for emp in emprestimos
-    ]
+    """
+    Retorna todos os empréstimos atrasados (prazo vencido e ainda não devolvidos).
+
+    Usa o status mantido pela varredura de atrasos (índice status_data_id).
+    """
+    emprestimos = await buscar_emprestimos(
+        Emprestimo.status == "atrasado",
+        offset=offset,
+        limit=limit,
+        cursor=cursor,
+        campos=campos
+    )
+    definir_proximo_cursor_emprestimos(response, emprestimos, limit)
+
+    return resposta_rapida(linhas_emprestimos(emprestimos, campos), response)
 
 
 @router.get("/ativos/listar", response_model=List[EmprestimoFull])
 async def get_emprestimos_ativos(
-    offset: int = 0,
-    limit: int = Query(default=10, le=100)
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    campos: Optional[Campos] = Depends(campos_da_query(EmprestimoFull))
 ):
     """Retorna todos os empréstimos ativos (ainda não devolvidos)."""
-    emprestimos = await Emprestimo.find(
+    emprestimos = await buscar_emprestimos(
         Emprestimo.data_devolucao == None,
-        fetch_links=True
-    ).skip(offset).limit(limit).to_list()
-
-    return [
-        EmprestimoFull(
-            id=str(emp.id),
-            data_emprestimo=emp.data_emprestimo,
-            data_devolucao_prevista=emp.data_devolucao_prevista,
-            data_devolucao=emp.data_devolucao,
-            aluno=AlunoOut(
-                id=str(emp.aluno.id),
-                nome=emp.aluno.nome,
-                matricula=emp.aluno.matricula,
-                curso=emp.aluno.curso,
-                email=emp.aluno.email
-            ),
-            livro=LivroOut(
-                id=str(emp.livro.id),
-                titulo=emp.livro.titulo,
-                ano=emp.livro.ano,
-                isbn=emp.livro.isbn,
-                categoria=emp.livro.categoria
-            )
-        )
-        for emp in emprestimos
-    ]
+        offset=offset,
+        limit=limit,
+        cursor=cursor,
+        campos=campos
+    )
+    definir_proximo_cursor_emprestimos(response, emprestimos, limit)
+
+    return resposta_rapida(linhas_emprestimos(emprestimos, campos), response)
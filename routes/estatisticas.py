@@ -1,10 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from pydantic import BaseModel
-from datetime import date
-from models.aluno import Aluno
-from models.autor import Autor
-from models.livro import Livro
-from models.emprestimo import Emprestimo
+from services.estatisticas import calcular_estatisticas, ler_resumo
 
 router = APIRouter(
     prefix="/estatisticas",
@@ -24,65 +20,28 @@ class EstatisticasGerais(BaseModel):
     aluno_mais_ativo: str | None
 
 @router.get("/", response_model=EstatisticasGerais)
-async def get_estatisticas_gerais():
+async def get_estatisticas_gerais(
+    fresh: bool = Query(default=False, description="Recalcula as estatísticas em vez de ler o resumo")
+):
     """
     Retorna estatísticas gerais do sistema de biblioteca.
-    """
-    total_alunos = await Aluno.count()
-    total_autores = await Autor.count()
-    total_livros = await Livro.count()
-    total_emprestimos = await Emprestimo.count()
-
-    emprestimos_ativos = await Emprestimo.find(
-        Emprestimo.data_devolucao == None
-    ).count()
-
-    emprestimos_finalizados = total_emprestimos - emprestimos_ativos
-
-    hoje = date.today()
-    emprestimos_atrasados = await Emprestimo.find(
-        Emprestimo.data_devolucao == None,
-        Emprestimo.data_devolucao_prevista < hoje
-    ).count()
 
-    pipeline_livro = [
-        {"$group": {"_id": "$livro.$id", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 1}
-    ]
-    
-    top_livro_data = await Emprestimo.aggregate(pipeline_livro).to_list(1)
-    
-    livro_mais_emprestado = None
-    if top_livro_data:
-        livro_id = top_livro_data[0]["_id"]
-        livro = await Livro.get(livro_id)
-        if livro:
-            livro_mais_emprestado = livro.titulo
-
-    pipeline_aluno = [
-        {"$group": {"_id": "$aluno.$id", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 1}
-    ]
-
-    top_aluno_data = await Emprestimo.aggregate(pipeline_aluno).to_list(1)
-
-    aluno_mais_ativo = None
-    if top_aluno_data:
-        aluno_id = top_aluno_data[0]["_id"]
-        aluno = await Aluno.get(aluno_id)
-        if aluno:
-            aluno_mais_ativo = aluno.nome
+    Por padrão lê o resumo mantido pelas rotas de escrita e reconciliado
+    periodicamente; com `fresh=true` recalcula tudo na hora.
+    """
+    if fresh:
+        dados = await calcular_estatisticas()
+    else:
+        dados = await ler_resumo()
 
     return EstatisticasGerais(
-        total_alunos=total_alunos,
-        total_autores=total_autores,
-        total_livros=total_livros,
-        total_emprestimos=total_emprestimos,
-        emprestimos_ativos=emprestimos_ativos,
-        emprestimos_finalizados=emprestimos_finalizados,
-        emprestimos_atrasados=emprestimos_atrasados,
-        livro_mais_emprestado=livro_mais_emprestado,
-        aluno_mais_ativo=aluno_mais_ativo
+        total_alunos=dados["total_alunos"],
+        total_autores=dados["total_autores"],
+        total_livros=dados["total_livros"],
+        total_emprestimos=dados["total_emprestimos"],
+        emprestimos_ativos=dados["emprestimos_ativos"],
+        emprestimos_finalizados=dados["total_emprestimos"] - dados["emprestimos_ativos"],
+        emprestimos_atrasados=dados["emprestimos_atrasados"],
+        livro_mais_emprestado=dados["livro_mais_emprestado"],
+        aluno_mais_ativo=dados["aluno_mais_ativo"]
     )
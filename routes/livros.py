@@ -1,10 +1,32 @@
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from beanie import PydanticObjectId
-from typing import List
+from beanie.operators import In
+from pymongo.errors import DuplicateKeyError
+from typing import List, Optional
 from models.livro import Livro, LivroCreate, LivroUpdate, LivroOut, LivroComEstatisticas
 from models.autor import Autor, AutorOut
 from models.emprestimo import Emprestimo, EmprestimoFull
-from models.aluno import AlunoOut
+from models.bulk import BulkResultado
+from models.lote import Lote, LoteIds
+from services.emprestimos import buscar_emprestimos, definir_proximo_cursor_emprestimos
+from services.serializacao import autor_dict, livro_dict, linhas_emprestimos, resposta_rapida
+from services.paginacao import paginar
+from services.campos import Campos, campos_da_query, modelo_projecao, projetar
+from services.autoria import autores_do_livro
+from services.busca import indice_livros
+from services.estatisticas import incrementar
+from services.ranking import RANKING_LIMIT_PADRAO, invalidar_ranking, obter_ranking
+from services.bulk import importar_em_lote
+from services.cache import cache_entidades
+from services.carregador import carregador
+from services.lote import buscar_lote, ids_da_query, validar_ids
+from services.tarefas import fila_tarefas
+from services.vinculos import desvincular, vincular
+from services.exportacao import CAMPOS_LIVRO, FormatoExportacao, exportar
+
+# Violação do índice único (isbn_unique)
+ERRO_ISBN_DUPLICADO = "Já existe um livro com este ISBN"
 
 router = APIRouter(
     prefix="/livros",
@@ -15,19 +37,64 @@ router = APIRouter(
 async def create_livro(livro_data: LivroCreate):
     """Cria um novo livro."""
     livro = Livro(**livro_data.model_dump())
-    await livro.insert()
+    try:
+        await livro.insert()
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=ERRO_ISBN_DUPLICADO)
+    await incrementar(total_livros=1)
+    indice_livros.indexar_livro(livro)
     return livro
 
+@router.post("/bulk", response_model=BulkResultado)
+async def create_livros_bulk(request: Request):
+    """Cria livros em lote a partir de um array JSON ou de um corpo NDJSON (application/x-ndjson)."""
+    async def ao_inserir(livros):
+        await incrementar(total_livros=len(livros))
+        for livro in livros:
+            indice_livros.indexar_livro(livro)
+
+    return await importar_em_lote(request, LivroCreate, Livro, ao_inserir=ao_inserir)
+
 @router.get("/", response_model=List[LivroOut])
-async def read_livros(offset: int = 0, limit: int = Query(default=10, le=100)):
-    """Retorna uma lista de livros com paginação."""
-    livros = await Livro.find_all().skip(offset).limit(limit).to_list()
-    return livros
+async def read_livros(
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    campos: Optional[Campos] = Depends(campos_da_query(LivroOut))
+):
+    """
+    Retorna uma lista de livros com paginação (offset ou cursor).
+
+    Apenas os campos de LivroOut são lidos do banco (nunca os arrays de
+    vínculos); `?fields=id,titulo` restringe a leitura e a resposta a eles.
+    """
+    livros = await paginar(Livro.find_all().project(modelo_projecao(LivroOut, campos)), response, cursor, offset, limit)
+    return resposta_rapida(projetar(livros, LivroOut, campos), response)
+
+@router.get("/export")
+async def export_livros(formato: FormatoExportacao = Query(default="ndjson", alias="format")):
+    """Exporta todos os livros em NDJSON ou CSV, transmitidos a partir do cursor do banco."""
+    return exportar(Livro, CAMPOS_LIVRO, formato)
+
+@router.get("/lote", response_model=Lote[LivroOut])
+async def read_livros_lote(ids: List[PydanticObjectId] = Depends(ids_da_query)):
+    """
+    Retorna vários livros pelos ids (`?ids=a,b,c`) com uma única consulta $in,
+    na ordem pedida. Ids inexistentes são listados em `nao_encontrados`.
+    """
+    return resposta_rapida(await buscar_lote(Livro, ids, livro_dict))
+
+@router.post("/lote", response_model=Lote[LivroOut])
+async def read_livros_lote_post(lote: LoteIds):
+    """Mesmo que GET /livros/lote, com os ids no corpo (para listas longas)."""
+    ids = validar_ids(lote.ids)
+    return resposta_rapida(await buscar_lote(Livro, ids, livro_dict))
 
 @router.get("/{livro_id}", response_model=LivroOut)
 async def read_livro(livro_id: PydanticObjectId):
     """Retorna um livro pelo ID."""
-    livro = await Livro.get(livro_id)
+    livro = await cache_entidades.obter(Livro, livro_id, LivroOut)
     if not livro:
         raise HTTPException(status_code=404, detail="Livro não encontrado")
     return livro
@@ -39,7 +106,13 @@ async def update_livro(livro_id: PydanticObjectId, livro_data: LivroUpdate):
     if not livro:
         raise HTTPException(status_code=404, detail="Livro não encontrado")
     
-    await livro.set(livro_data.model_dump(exclude_unset=True))
+    try:
+        await livro.set(livro_data.model_dump(exclude_unset=True))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=ERRO_ISBN_DUPLICADO)
+    indice_livros.indexar_livro(livro)
+    await invalidar_ranking()
+    cache_entidades.invalidar(Livro, livro_id)
     return livro
 
 @router.delete("/{livro_id}")
@@ -50,6 +123,12 @@ async def delete_livro(livro_id: PydanticObjectId):
         raise HTTPException(status_code=404, detail="Livro não encontrado")
     
     await livro.delete()
+    # Retirar o livro dos autores pode tocar muitos documentos: fica para a fila
+    await fila_tarefas.enfileirar("limpar_vinculos_livro", livro_id=livro_id)
+    await incrementar(total_livros=-1)
+    indice_livros.remover_livro(livro_id)
+    await invalidar_ranking()
+    cache_entidades.invalidar(Livro, livro_id)
     return {"detail": "Livro deletado com sucesso"}
 
 
@@ -58,59 +137,29 @@ async def delete_livro(livro_id: PydanticObjectId):
 @router.post("/{livro_id}/autores/{autor_id}")
 async def add_autor_to_livro(livro_id: PydanticObjectId, autor_id: PydanticObjectId):
     """Vincula um autor a um livro."""
-    livro = await Livro.get(livro_id)
-    if not livro:
-        raise HTTPException(status_code=404, detail="Livro não encontrado")
-    
-    autor = await Autor.get(autor_id)
-    if not autor:
-        raise HTTPException(status_code=404, detail="Autor não encontrado")
-
-    # Inicializa listas se estiverem None
-    if livro.autores is None:
-        livro.autores = []
-    if autor.livros is None:
-        autor.livros = []
-
-    # Verifica se já está vinculado
-    if any(link.ref.id == autor_id for link in livro.autores):
-        raise HTTPException(status_code=400, detail="Autor já está vinculado a este livro")
-
-    livro.autores.append(autor)
-    autor.livros.append(livro)
-    
-    await livro.save()
-    await autor.save()
-    
+    await vincular(Livro, livro_id, autor_id, erro_ja_vinculado="Autor já está vinculado a este livro")
+
+    indice_livros.vincular(livro_id, autor_id)
+    cache_entidades.invalidar(Livro, livro_id)
+    cache_entidades.invalidar(Autor, autor_id)
     return {"detail": "Autor adicionado ao livro com sucesso"}
 
 @router.get("/{livro_id}/autores", response_model=List[AutorOut])
 async def get_autores_of_livro(livro_id: PydanticObjectId):
     """Retorna os autores associados a um livro."""
-    livro = await Livro.get(livro_id, fetch_links=True)
-    if not livro:
+    autores = await autores_do_livro(livro_id)
+    if autores is None:
         raise HTTPException(status_code=404, detail="Livro não encontrado")
-    return livro.autores or []
+    return resposta_rapida([autor_dict(autor) for autor in autores])
 
 @router.delete("/{livro_id}/autores/{autor_id}")
 async def remove_autor_from_livro(livro_id: PydanticObjectId, autor_id: PydanticObjectId):
     """Remove o vínculo de um autor com um livro."""
-    livro = await Livro.get(livro_id, fetch_links=True)
-    if not livro:
-        raise HTTPException(status_code=404, detail="Livro não encontrado")
-    
-    autor = await Autor.get(autor_id, fetch_links=True)
-    if not autor:
-        raise HTTPException(status_code=404, detail="Autor não encontrado")
-
-    if livro.autores:
-        livro.autores = [a for a in livro.autores if a.id != autor_id]
-        await livro.save()
-    
-    if autor.livros:
-        autor.livros = [l for l in autor.livros if l.id != livro_id]
-        await autor.save()
+    await desvincular(Livro, livro_id, autor_id)
 
+    indice_livros.desvincular(livro_id, autor_id)
+    cache_entidades.invalidar(Livro, livro_id)
+    cache_entidades.invalidar(Autor, autor_id)
     return {"detail": "Autor removido do livro com sucesso"}
 
 
@@ -119,42 +168,29 @@ async def remove_autor_from_livro(livro_id: PydanticObjectId, autor_id: Pydantic
 @router.get("/{livro_id}/emprestimos", response_model=List[EmprestimoFull])
 async def get_emprestimos_of_livro(
     livro_id: PydanticObjectId,
-    offset: int = 0,
-    limit: int = Query(default=10, le=100)
-):  
-    """Retorna os empréstimos de um livro."""
-    livro = await Livro.get(livro_id)
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    campos: Optional[Campos] = Depends(campos_da_query(EmprestimoFull))
+):
+    """Retorna os empréstimos de um livro (`fields` limita os campos e os $lookup)."""
+    # A checagem do livro e a consulta dos empréstimos seguem em paralelo
+    livro, emprestimos = await asyncio.gather(
+        carregador(Livro).carregar(livro_id),
+        buscar_emprestimos(
+            Emprestimo.livro.id == livro_id,
+            offset=offset,
+            limit=limit,
+            cursor=cursor,
+            campos=campos
+        ),
+    )
     if not livro:
         raise HTTPException(status_code=404, detail="Livro não encontrado")
+    definir_proximo_cursor_emprestimos(response, emprestimos, limit)
 
-    emprestimos = await Emprestimo.find(
-        Emprestimo.livro.id == livro_id,
-        fetch_links=True
-    ).skip(offset).limit(limit).to_list()
-
-    return [
-        EmprestimoFull(
-            id=str(emp.id),
-            data_emprestimo=emp.data_emprestimo,
-            data_devolucao_prevista=emp.data_devolucao_prevista,
-            data_devolucao=emp.data_devolucao,
-            aluno=AlunoOut(
-                id=str(emp.aluno.id),
-                nome=emp.aluno.nome,
-                matricula=emp.aluno.matricula,
-                curso=emp.aluno.curso,
-                email=emp.aluno.email
-            ),
-            livro=LivroOut(
-                id=str(emp.livro.id),
-                titulo=emp.livro.titulo,
-                ano=emp.livro.ano,
-                isbn=emp.livro.isbn,
-                categoria=emp.livro.categoria
-            )
-        )
-        for emp in emprestimos
-    ]
+    return resposta_rapida(linhas_emprestimos(emprestimos, campos), response)
 
 
 # Consultas complexas
@@ -162,88 +198,50 @@ async def get_emprestimos_of_livro(
 @router.get("/buscar/query", response_model=List[LivroOut])
 async def buscar_livros(
     q: str = Query(..., description="Termo de busca (título, categoria ou autor)"),
-    offset: int = 0,
-    limit: int = Query(default=10, le=100)
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100)
 ):
-    """Busca livros por título, categoria ou nome do autor."""
-    # Busca por título ou categoria no livro
-    query_livros = Livro.find({
-        "$or": [
-            {"titulo": {"$regex": q, "$options": "i"}},
-            {"categoria": {"$regex": q, "$options": "i"}}
-        ]
-    })
-    livros_titulo_categoria = await query_livros.to_list()
-
-    # Busca por autor
-    autores_matching = await Autor.find({"nome": {"$regex": q, "$options": "i"}}).to_list()
-    autor_ids = [a.id for a in autores_matching]
-    
-    livros_autor = []
-    if autor_ids:
-        livros_autor = await Livro.find({
-            "autores.id": {"$in": autor_ids}
-        }).to_list()
-
-    # Combinar resultados e remover duplicatas
-    seen_ids = set()
-    livros_res = []
-    for livro in livros_titulo_categoria + livros_autor:
-        if str(livro.id) not in seen_ids:
-            livros_res.append(livro)
-            seen_ids.add(str(livro.id))
-            
-    return livros_res[offset : offset + limit]
+    """
+    Busca livros por título, categoria ou nome do autor.
+
+    Usa o índice invertido em memória: ignora acentos, aceita prefixo no último
+    termo e ordena por relevância. A paginação é feita pelo próprio índice.
+    """
+    livro_ids = indice_livros.buscar(q, offset=offset, limit=limit)
+    if not livro_ids:
+        return []
+
+    livros = await Livro.find(In(Livro.id, livro_ids)).to_list()
+    por_id = {livro.id: livro for livro in livros}
+
+    # Preserva a ordem de relevância
+    return [por_id[livro_id] for livro_id in livro_ids if livro_id in por_id]
 
 
 @router.get("/mais-emprestados/ranking", response_model=List[LivroComEstatisticas])
 async def get_livros_mais_emprestados(
-    limit: int = Query(default=10, le=50, description="Número de livros a retornar")
+    limit: int = Query(default=RANKING_LIMIT_PADRAO, ge=1, le=50, description="Número de livros a retornar")
 ):
     """
     Retorna os livros mais emprestados com estatísticas.
+
+    O ranking é calculado em um único pipeline e mantido em cache por alguns
+    segundos; criar, devolver ou remover empréstimos invalida o cache.
     """
-    # Agregação para contar empréstimos por livro
-    pipeline = [
-        {
-            "$group": {
-                "_id": "$livro.$id",
-                "total_emprestimos": {"$sum": 1},
-                "emprestimos_ativos": {
-                    "$sum": {
-                        "$cond": [{"$eq": ["$data_devolucao", None]}, 1, 0]
-                    }
-                }
-            }
-        },
-        {"$sort": {"total_emprestimos": -1}},
-        {"$limit": limit}
-    ]
-    
-    stats = await Emprestimo.aggregate(pipeline).to_list()
-    
-    livros_com_stats = []
-    for stat in stats:
-        if stat["_id"] is None: continue
-        livro = await Livro.get(stat["_id"])
-        if livro:
-            livro_dict = livro.model_dump()
-            livro_dict["id"] = str(livro.id)
-            livro_dict["total_emprestimos"] = stat["total_emprestimos"]
-            livro_dict["emprestimos_ativos"] = stat["emprestimos_ativos"]
-            livros_com_stats.append(LivroComEstatisticas(**livro_dict))
-            
-    return livros_com_stats
+    return resposta_rapida(await obter_ranking(limit))
 
 
 @router.get("/por-categoria/filtrar", response_model=List[LivroOut])
 async def get_livros_por_categoria(
+    response: Response,
     categoria: str = Query(..., description="Nome da categoria"),
-    offset: int = 0,
-    limit: int = Query(default=10, le=100)
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor da próxima página (header X-Next-Cursor)")
 ):
     """Filtra livros por categoria."""
-    livros = await Livro.find(
-        {"categoria": {"$regex": categoria, "$options": "i"}}
-    ).skip(offset).limit(limit).to_list()
+    livros = await paginar(
+        Livro.find({"categoria": {"$regex": categoria, "$options": "i"}}),
+        response, cursor, offset, limit
+    )
     return livros
\ No newline at end of file
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services.metricas import renderizar_metricas
+
+router = APIRouter(
+    prefix="",
+    tags=["metricas"]
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metricas():
+    """Métricas de latência (HTTP e Mongo) e do pool de conexões no formato do Prometheus."""
+    return PlainTextResponse(renderizar_metricas(), media_type=PROMETHEUS_CONTENT_TYPE)
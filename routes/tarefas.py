@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from models.tarefa import StatusTarefa
+from services.serializacao import resposta_rapida
+from services.tarefas import fila_tarefas
+
+router = APIRouter(
+    prefix="/tarefas",
+    tags=["tarefas"]
+)
+
+@router.get("/")
+async def listar_tarefas(
+    status: Optional[StatusTarefa] = None,
+    limit: int = Query(default=100, ge=1, le=1000)
+):
+    """Lista as tarefas em segundo plano mais recentes (pendentes, em execução e finalizadas)."""
+    return resposta_rapida({
+        "fila": fila_tarefas.estatisticas(),
+        "tarefas": fila_tarefas.listar(status, limit),
+    })
+
+@router.get("/{tarefa_id}")
+async def obter_tarefa(tarefa_id: str):
+    """Retorna o status, as tentativas e o último erro de uma tarefa."""
+    registro = await fila_tarefas.obter(tarefa_id)
+    if registro is None:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    return resposta_rapida(registro)
@@ -1,16 +1,25 @@
 import sys
 import io
 import os
+import argparse
 import asyncio
-from datetime import date, timedelta
+import random
+from datetime import date, datetime, time, timedelta
 from beanie import init_beanie
-from motor.motor_asyncio import AsyncIOMotorClient
+from bson import DBRef, ObjectId
 from dotenv import load_dotenv
 
 from models.aluno import Aluno
 from models.autor import Autor
+from models.autoria import Autoria
 from models.livro import Livro
-from models.emprestimo import Emprestimo
+from models.emprestimo import Emprestimo, status_emprestimo
+from models.estatisticas import Estatisticas
+from database import DOCUMENT_MODELS, criar_cliente, sincronizar_indices
+from services.autoria import migrar_para_colecao, usa_colecao
+from services.cache import cache_entidades
+from services.estatisticas import reconciliar
+from services.ranking import ranking_cache
 
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -20,11 +29,12 @@ load_dotenv()
 MONGO_URL = os.getenv("DATABASE_URL", "mongodb://localhost:27017")
 
 
-async def init_db():
-    client = AsyncIOMotorClient(MONGO_URL)
+async def init_db(skip_indexes: bool = False):
+    client = criar_cliente(MONGO_URL)
     await init_beanie(
-        database=client.biblioteca,
-        document_models=[Aluno, Autor, Livro, Emprestimo],
+        database=client[os.getenv("DB_NAME", "biblioteca")],
+        document_models=DOCUMENT_MODELS,
+        skip_indexes=skip_indexes,
     )
 
 
@@ -33,7 +43,12 @@ async def limpar_banco():
     await Emprestimo.delete_all()
     await Livro.delete_all()
     await Autor.delete_all()
+    await Autoria.delete_all()
     await Aluno.delete_all()
+    await Estatisticas.delete_all()
+    # Com CACHE_BACKEND=compartilhado, a API em execução leria os registros antigos
+    cache_entidades.limpar()
+    ranking_cache.clear()
     print("✅ Banco limpo!\n")
 
 
@@ -165,24 +180,274 @@ async def seed_emprestimos(alunos, livros):
     return emprestimos
 
 
-async def main():
+# ============================================================
+# Gerador sintético (modo não interativo, para carga/benchmark)
+# ============================================================
+
+PRIMEIROS_NOMES = [
+    "Ana", "Bruno", "Carla", "Daniel", "Elena", "Felipe", "Gabriela", "Henrique", "Isabel", "João",
+    "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael", "Sofia", "Tiago", "Úrsula", "Vitor",
+]
+SOBRENOMES = [
+    "Silva", "Santos", "Oliveira", "Costa", "Rodrigues", "Almeida", "Lima", "Martins", "Fernandes", "Souza",
+    "Mendes", "Vieira", "Castro", "Ribeiro", "Cardoso", "Pereira", "Gomes", "Barbosa", "Rocha", "Araújo",
+]
+CURSOS = [
+    "Ciência da Computação", "Engenharia de Software", "Sistemas de Informação", "Engenharia de Dados",
+    "Matemática Computacional", "Redes de Computadores",
+]
+NACIONALIDADES = ["Brasil", "Portugal", "Estados Unidos", "Reino Unido", "Canadá", "França", "Alemanha", "Japão"]
+CATEGORIAS = [
+    "Engenharia de Software", "Arquitetura", "Padrões de Projeto", "Algoritmos", "Linguagens",
+    "Banco de Dados", "Redes", "Testes", "Fundamentos", "Inteligência Artificial",
+]
+PALAVRAS_TITULO = [
+    "Introdução", "Fundamentos", "Prática", "Arquitetura", "Sistemas", "Algoritmos", "Dados", "Código",
+    "Projeto", "Teoria", "Padrões", "Redes", "Compiladores", "Distribuídos", "Concorrência", "Software",
+]
+
+# Distribuição do número de autores por livro: (quantidade, probabilidade)
+AUTORES_POR_LIVRO = [(1, 0.7), (2, 0.2), (3, 0.1)]
+
+# Prazo padrão de devolução (dias)
+PRAZO_EMPRESTIMO = 14
+
+
+def _meia_noite(dia: date) -> datetime:
+    """Datas são gravadas pelo Beanie como datetime à meia-noite."""
+    return datetime.combine(dia, time.min)
+
+
+def _lotes(iteravel, tamanho):
+    lote = []
+    for item in iteravel:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+async def _inserir_em_lotes(model, documentos, tamanho_lote, concorrencia, rotulo):
+    """Grava os documentos com insert_many em lotes, mantendo até `concorrencia` lotes em voo."""
+    collection = model.get_pymongo_collection()
+    pendentes = set()
+    total = 0
+
+    for lote in _lotes(documentos, tamanho_lote):
+        if len(pendentes) >= concorrencia:
+            concluidas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+            for tarefa in concluidas:
+                total += tarefa.result()
+            print(f"   {rotulo}: {total} gravados", end="\r")
+        pendentes.add(asyncio.create_task(_inserir_lote(collection, lote)))
+
+    for tarefa in asyncio.as_completed(pendentes):
+        total += await tarefa
+    print(f"✅ {total} {rotulo} criados!" + " " * 20)
+    return total
+
+
+async def _inserir_lote(collection, lote):
+    await collection.insert_many(lote, ordered=False)
+    return len(lote)
+
+
+def _gerar_alunos(rng: random.Random, quantidade: int):
+    ano = date.today().year
+    for i in range(quantidade):
+        nome, sobrenome = rng.choice(PRIMEIROS_NOMES), rng.choice(SOBRENOMES)
+        yield {
+            "_id": ObjectId(),
+            "nome": f"{nome} {sobrenome}",
+            "matricula": f"{ano}{i:07d}",
+            "curso": rng.choice(CURSOS),
+            "email": f"{nome.lower()}.{sobrenome.lower()}.{i}@universidade.br".encode("ascii", "ignore").decode(),
+        }
+
+
+def _gerar_autores_e_livros(rng: random.Random, qtd_autores: int, qtd_livros: int):
+    """Gera autores e livros já com os vínculos dos dois lados (Autor.livros / Livro.autores)."""
+    autores = [
+        {
+            "_id": ObjectId(),
+            "nome": f"{rng.choice(PRIMEIROS_NOMES)} {rng.choice(SOBRENOMES)}",
+            "nacionalidade": rng.choice(NACIONALIDADES),
+            "ano_nascimento": rng.randint(1900, 1995),
+            "livros": [],
+        }
+        for _ in range(qtd_autores)
+    ]
+    quantidades, pesos = zip(*AUTORES_POR_LIVRO)
+
+    livros = []
+    for i in range(qtd_livros):
+        livro_id = ObjectId()
+        n_autores = min(rng.choices(quantidades, weights=pesos)[0], qtd_autores)
+        escolhidos = rng.sample(autores, n_autores) if n_autores else []
+        for autor in escolhidos:
+            autor["livros"].append(DBRef(Livro.get_collection_name(), livro_id))
+        livros.append({
+            "_id": livro_id,
+            "titulo": " ".join(rng.sample(PALAVRAS_TITULO, rng.randint(2, 4))) + f" {i}",
+            "ano": rng.randint(1960, date.today().year),
+            "isbn": f"978-{i:010d}",
+            "categoria": rng.choice(CATEGORIAS),
+            "emprestimos": [],
+            "autores": [DBRef(Autor.get_collection_name(), autor["_id"]) for autor in escolhidos],
+        })
+    return autores, livros
+
+
+def _pesos_zipf(quantidade: int, expoente: float):
+    """Pesos acumulados de uma distribuição de Zipf (o item de posição r tem peso 1/r^s)."""
+    acumulado, total = [], 0.0
+    for r in range(1, quantidade + 1):
+        total += 1.0 / (r ** expoente)
+        acumulado.append(total)
+    return acumulado
+
+
+def _gerar_emprestimos(
+    rng: random.Random,
+    aluno_ids,
+    livro_ids,
+    quantidade: int,
+    fracao_atrasados: float,
+    expoente_zipf: float,
+    dias_historico: int,
+):
+    """
+    Gera empréstimos com popularidade de livros Zipfiana, respeitando
+    "no máximo um empréstimo ativo por (aluno, livro)".
+    """
+    hoje = date.today()
+    # Embaralha para que a popularidade não dependa da ordem de inserção
+    livros_por_popularidade = list(livro_ids)
+    rng.shuffle(livros_por_popularidade)
+    pesos = _pesos_zipf(len(livros_por_popularidade), expoente_zipf)
+    ref_aluno, ref_livro = Aluno.get_collection_name(), Livro.get_collection_name()
+    ativos = set()
+
+    for _ in range(quantidade):
+        aluno_id = rng.choice(aluno_ids)
+        livro_id = rng.choices(livros_por_popularidade, cum_weights=pesos)[0]
+        data_emprestimo = hoje - timedelta(days=rng.randint(0, dias_historico))
+        data_prevista = data_emprestimo + timedelta(days=PRAZO_EMPRESTIMO)
+
+        if data_prevista < hoje:
+            # Prazo vencido: devolvido, ou atrasado com a probabilidade configurada
+            devolvido = rng.random() >= fracao_atrasados
+        else:
+            devolvido = rng.random() < 0.3
+
+        if not devolvido and (aluno_id, livro_id) in ativos:
+            devolvido = True
+
+        data_devolucao = None
+        if devolvido:
+            data_devolucao = min(data_emprestimo + timedelta(days=rng.randint(1, PRAZO_EMPRESTIMO + 7)), hoje)
+        else:
+            ativos.add((aluno_id, livro_id))
+
+        yield {
+            "_id": ObjectId(),
+            "data_emprestimo": _meia_noite(data_emprestimo),
+            "data_devolucao_prevista": _meia_noite(data_prevista),
+            "data_devolucao": _meia_noite(data_devolucao) if data_devolucao else None,
+            "status": status_emprestimo(data_devolucao, data_prevista, hoje),
+            "aluno": DBRef(ref_aluno, aluno_id),
+            "livro": DBRef(ref_livro, livro_id),
+        }
+
+
+async def gerar_dados_sinteticos(args):
+    """Popula o banco com um volume configurável de dados sintéticos e determinísticos."""
+    rng = random.Random(args.seed)
+    print(
+        f"🏭 Gerando {args.alunos} alunos, {args.autores} autores, {args.livros} livros "
+        f"e {args.emprestimos} empréstimos (seed={args.seed})\n"
+    )
+
+    alunos = list(_gerar_alunos(rng, args.alunos))
+    aluno_ids = [aluno["_id"] for aluno in alunos]
+    await _inserir_em_lotes(Aluno, alunos, args.lote, args.concorrencia, "alunos")
+    del alunos
+
+    autores, livros = _gerar_autores_e_livros(rng, args.autores, args.livros)
+    livro_ids = [livro["_id"] for livro in livros]
+    await _inserir_em_lotes(Autor, autores, args.lote, args.concorrencia, "autores")
+    await _inserir_em_lotes(Livro, livros, args.lote, args.concorrencia, "livros")
+    del autores, livros
+
+    if aluno_ids and livro_ids:
+        emprestimos = _gerar_emprestimos(
+            rng,
+            aluno_ids,
+            livro_ids,
+            args.emprestimos,
+            args.fracao_atrasados,
+            args.zipf,
+            args.dias,
+        )
+        await _inserir_em_lotes(Emprestimo, emprestimos, args.lote, args.concorrencia, "empréstimos")
+
+    # Índices e resumo de estatísticas são criados depois da carga, que fica mais rápida sem eles
+    print("\n🗂️  Criando índices...")
+    await sincronizar_indices()
+    print("📊 Reconciliando estatísticas...")
+    await reconciliar()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Popula o banco da biblioteca.")
+    parser.add_argument("--limpar", action="store_true", help="Limpa o banco sem pedir confirmação")
+    parser.add_argument("--gerar", action="store_true", help="Gera dados sintéticos em escala (não interativo)")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do gerador (resultados determinísticos)")
+    parser.add_argument("--alunos", type=int, default=10_000)
+    parser.add_argument("--autores", type=int, default=2_000)
+    parser.add_argument("--livros", type=int, default=20_000)
+    parser.add_argument("--emprestimos", type=int, default=100_000)
+    parser.add_argument("--fracao-atrasados", type=float, default=0.08, help="Fração de empréstimos vencidos ainda não devolvidos")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Expoente da popularidade Zipfiana dos livros")
+    parser.add_argument("--dias", type=int, default=365, help="Janela de histórico dos empréstimos (dias)")
+    parser.add_argument("--lote", type=int, default=5_000, help="Documentos por insert_many")
+    parser.add_argument("--concorrencia", type=int, default=4, help="Lotes gravados em paralelo")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
     print("\n🌱 INICIANDO SEED DO BANCO DE DADOS\n")
-    await init_db()
+    await init_db(skip_indexes=args.gerar)
 
     total_alunos = await Aluno.count()
     if total_alunos > 0:
         print(f"⚠️  O banco já contém {total_alunos} alunos.")
-        resposta = input("Deseja limpar o banco e começar do zero? (s/N): ")
+        if args.limpar or args.gerar:
+            resposta = "s" if args.limpar else "n"
+        else:
+            resposta = input("Deseja limpar o banco e começar do zero? (s/N): ")
         if resposta.lower() in ['s', 'sim', 'y', 'yes']:
             await limpar_banco()
         else:
-            print("❌ Seed cancelado. Banco mantido como está.")
+            print("❌ Seed cancelado. Banco mantido como está." + (" Use --limpar." if args.gerar else ""))
             return
 
-    alunos = await seed_alunos()
-    autores = await seed_autores()
-    livros = await seed_livros(autores)
-    await seed_emprestimos(alunos, livros)
+    if args.gerar:
+        await gerar_dados_sinteticos(args)
+    else:
+        alunos = await seed_alunos()
+        autores = await seed_autores()
+        livros = await seed_livros(autores)
+        await seed_emprestimos(alunos, livros)
+
+    if usa_colecao():
+        # Os geradores gravam os vínculos nos arrays; com AUTORIA_STORAGE=colecao
+        # eles são movidos para a coleção de arestas
+        resultado = await migrar_para_colecao(limpar_arrays=True)
+        print(f"🔗 Vínculos livro-autor movidos para autorias: {resultado['arestas']}\n")
 
     # Exibir estatísticas
     print("=" * 50)
@@ -192,9 +457,9 @@ async def main():
     print(f"✍️  Autores cadastrados: {await Autor.count()}")
     print(f"📚 Livros no acervo: {await Livro.count()}")
     print(f"📋 Total de empréstimos: {await Emprestimo.count()}")
-    emprestimos_ativos = await Emprestimo.find({"data_devolucao": None}).to_list()
-    print(f"🔄 Empréstimos ativos: {len(emprestimos_ativos)}")
-    print(f"✅ Empréstimos finalizados: {await Emprestimo.count() - len(emprestimos_ativos)}")
+    emprestimos_ativos = await Emprestimo.find({"data_devolucao": None}).count()
+    print(f"🔄 Empréstimos ativos: {emprestimos_ativos}")
+    print(f"✅ Empréstimos finalizados: {await Emprestimo.count() - emprestimos_ativos}")
     print("=" * 50)
 
     print("\n🎉 SEED CONCLUÍDO COM SUCESSO!\n")
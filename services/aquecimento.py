@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import os
+from typing import Type
+from beanie import Document
+from pydantic import BaseModel
+from models.autor import Autor, AutorOut
+from models.livro import Livro, LivroOut
+from services.cache import CacheCompartilhado, cache_entidades
+from services.ranking import RANKING_LIMIT_PADRAO, calcular_ranking, ranking_cache
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre reaquecimentos do catálogo; menor que o TTL para não expirar (segundos)
+CACHE_AQUECIMENTO_SEGUNDOS = int(os.getenv("CACHE_AQUECIMENTO_SEGUNDOS", "240"))
+# Documentos lidos por lote (cada lote usa a sua marca de invalidação)
+CACHE_AQUECIMENTO_LOTE = int(os.getenv("CACHE_AQUECIMENTO_LOTE", "1000"))
+
+# Catálogo mantido quente: leituras por id mais frequentes
+CATALOGO = ((Livro, LivroOut), (Autor, AutorOut))
+
+
+async def _aquecer_colecao(model: Type[Document], schema: Type[BaseModel]) -> int:
+    total = 0
+    ultimo_id = None
+    while True:
+        marca = cache_entidades.marca()
+        consulta = model.find(model.id > ultimo_id) if ultimo_id is not None else model.find_all()
+        documentos = await consulta.sort(+model.id).limit(CACHE_AQUECIMENTO_LOTE).to_list()
+        for documento in documentos:
+            cache_entidades.set(model, documento.id, schema.model_validate(documento), marca=marca)
+        total += len(documentos)
+        if len(documentos) < CACHE_AQUECIMENTO_LOTE:
+            return total
+        ultimo_id = documentos[-1].id
+
+
+async def aquecer_catalogo() -> int:
+    """Grava livros, autores e o ranking padrão no cache. Retorna quantas entidades."""
+    total = 0
+    for model, schema in CATALOGO:
+        total += await _aquecer_colecao(model, schema)
+    await calcular_ranking(RANKING_LIMIT_PADRAO)
+    return total
+
+
+async def loop_aquecimento() -> None:
+    """
+    Tarefa de fundo iniciada no lifespan quando CACHE_BACKEND=compartilhado.
+
+    Apenas o worker eleito (trava em `<arquivo>.lider`) reaquece o catálogo,
+    logo ao subir e depois a cada CACHE_AQUECIMENTO_SEGUNDOS; os demais só
+    leem. Se o eleito cair, outro assume na rodada seguinte.
+    """
+    backend = cache_entidades.backend
+    if not isinstance(backend, CacheCompartilhado) or not isinstance(ranking_cache, CacheCompartilhado):
+        return
+
+    while True:
+        try:
+            if backend.tentar_liderar():
+                total = await aquecer_catalogo()
+                logger.info("Cache compartilhado aquecido com %d entidade(s)", total)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha ao aquecer o cache compartilhado")
+        await asyncio.sleep(CACHE_AQUECIMENTO_SEGUNDOS)
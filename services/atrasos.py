@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time
+from typing import Awaitable, Callable, List, Optional
+from beanie import PydanticObjectId
+from bson import ObjectId
+from models.emprestimo import Emprestimo
+from services.cache import cache_entidades
+from services.estatisticas import incrementar
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre varreduras de empréstimos vencidos (segundos)
+ATRASOS_INTERVALO = int(os.getenv("ATRASOS_INTERVALO_SEGUNDOS", "300"))
+# Empréstimos marcados por update_many
+ATRASOS_LOTE = int(os.getenv("ATRASOS_LOTE", "1000"))
+
+# Recebe os ids dos empréstimos que acabaram de ficar atrasados
+Assinante = Callable[[List[PydanticObjectId]], Awaitable[None]]
+
+_assinantes: List[Assinante] = []
+
+
+def _meia_noite(dia: Optional[date]) -> datetime:
+    """Datas são gravadas como datetime à meia-noite."""
+    return datetime.combine(dia or date.today(), time.min)
+
+
+def ao_atrasar(assinante: Assinante) -> Assinante:
+    """Registra quem processa os empréstimos recém-atrasados (pode ser usado como decorator)."""
+    _assinantes.append(assinante)
+    return assinante
+
+
+async def _emitir(ids: List[PydanticObjectId]) -> None:
+    for assinante in _assinantes:
+        try:
+            await assinante(ids)
+        except Exception:
+            logger.exception("Falha ao processar empréstimos atrasados em %s", getattr(assinante, "__name__", assinante))
+
+
+async def preencher_status(hoje: Optional[date] = None) -> int:
+    """
+    Preenche o status dos empréstimos gravados antes da existência do campo.
+    Retorna quantos foram atualizados.
+    """
+    colecao = Emprestimo.get_pymongo_collection()
+    inicio = _meia_noite(hoje)
+    sem_status = {"status": {"$exists": False}}
+    total = 0
+    for filtro, status in (
+        ({"data_devolucao": {"$ne": None}}, "devolvido"),
+        ({"data_devolucao": None, "data_devolucao_prevista": {"$lt": inicio}}, "atrasado"),
+        ({"data_devolucao": None}, "ativo"),
+    ):
+        resultado = await colecao.update_many({**sem_status, **filtro}, {"$set": {"status": status}})
+        total += resultado.modified_count
+    return total
+
+
+async def varrer_atrasados(hoje: Optional[date] = None) -> List[PydanticObjectId]:
+    """
+    Marca como "atrasado" os empréstimos ativos com prazo vencido, em lotes de
+    ATRASOS_LOTE (um find pelo índice status_prevista + um update_many por lote).
+
+    Atualiza o contador de atrasados do resumo, invalida o cache dos empréstimos
+    alterados e entrega os ids de cada lote aos assinantes de `ao_atrasar`.
+
+    Cada lote grava um token em `varredura` junto com o status; só os ids
+    relidos com esse token são emitidos. Assim, um empréstimo devolvido entre
+    o find e o update, ou marcado pela varredura de outro worker, não é
+    entregue aos assinantes.
+    """
+    colecao = Emprestimo.get_pymongo_collection()
+    vencidos = {"status": "ativo", "data_devolucao_prevista": {"$lt": _meia_noite(hoje)}}
+    marcados: List[PydanticObjectId] = []
+
+    while True:
+        cursor = colecao.find(vencidos, {"_id": 1}).limit(ATRASOS_LOTE)
+        ids = [doc["_id"] async for doc in cursor]
+        if not ids:
+            break
+
+        # O filtro é repetido para não sobrescrever devoluções feitas entre o find e o update
+        token = ObjectId()
+        resultado = await colecao.update_many(
+            {"_id": {"$in": ids}, **vencidos},
+            {"$set": {"status": "atrasado", "varredura": token}},
+        )
+        if resultado.modified_count:
+            alterados = [doc["_id"] async for doc in colecao.find({"_id": {"$in": ids}, "varredura": token}, {"_id": 1})]
+            await incrementar(emprestimos_atrasados=len(alterados))
+            cache_entidades.invalidar(Emprestimo, *alterados)
+            marcados += alterados
+            await _emitir(alterados)
+
+        if len(ids) < ATRASOS_LOTE:
+            break
+
+    if marcados:
+        logger.info("%d empréstimo(s) marcado(s) como atrasado(s)", len(marcados))
+    return marcados
+
+
+async def loop_atrasos() -> None:
+    """Tarefa de fundo iniciada no lifespan: preenche o status e varre os atrasos periodicamente."""
+    try:
+        preenchidos = await preencher_status()
+        if preenchidos:
+            logger.info("Status preenchido em %d empréstimo(s)", preenchidos)
+    except Exception:
+        logger.exception("Falha ao preencher o status dos empréstimos")
+
+    while True:
+        try:
+            await varrer_atrasados()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha na varredura de empréstimos atrasados")
+        await asyncio.sleep(ATRASOS_INTERVALO)
@@ -0,0 +1,166 @@
+import asyncio
+import os
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from beanie import PydanticObjectId
+from beanie.operators import In
+from bson import DBRef
+from fastapi import Response
+from pymongo import UpdateOne
+from models.autor import Autor
+from models.autoria import Autoria, id_autoria
+from models.livro import Livro
+from services.carregador import carregador
+from services.paginacao import definir_proximo_cursor, encode_cursor, filtro_cursor_id, paginar
+
+# Onde ficam os vínculos livro-autor:
+#   "embutido" -> arrays Livro.autores / Autor.livros (padrão)
+#   "colecao"  -> coleção de arestas `autorias` (ver models/autoria.py)
+MODO_EMBUTIDO = "embutido"
+MODO_COLECAO = "colecao"
+AUTORIA_STORAGE = os.getenv("AUTORIA_STORAGE", MODO_EMBUTIDO)
+
+# Documentos por bulk_write nas migrações
+MIGRACAO_LOTE = 1000
+
+
+def usa_colecao() -> bool:
+    return AUTORIA_STORAGE == MODO_COLECAO
+
+
+# Leitura
+
+async def livros_do_autor(
+    autor_id: PydanticObjectId,
+    response: Response,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 10,
+) -> List[Livro]:
+    """
+    Livros de um autor ordenados por _id, no mesmo formato de paginação de
+    `paginar` (o cursor é o _id do último livro nos dois modos).
+
+    No modo coleção, a página é lida do índice (autor_id, livro_id) e os
+    livros são buscados com um único $in.
+    """
+    if not usa_colecao():
+        return await paginar(Livro.find(Livro.autores.id == autor_id), response, cursor, offset, limit)
+
+    filtro = {"autor_id": autor_id}
+    if cursor:
+        filtro["livro_id"] = filtro_cursor_id(cursor)["_id"]
+        offset = 0
+    arestas = Autoria.get_pymongo_collection().find(filtro, {"_id": 0, "livro_id": 1}).sort("livro_id", 1)
+    if offset:
+        arestas = arestas.skip(offset)
+    livro_ids = [aresta["livro_id"] async for aresta in arestas.limit(limit)]
+
+    if len(livro_ids) == limit:
+        definir_proximo_cursor(response, encode_cursor(livro_ids[-1]))
+    if not livro_ids:
+        return []
+    return await Livro.find(In(Livro.id, livro_ids)).sort("+_id").to_list()
+
+
+async def autores_do_livro(livro_id: PydanticObjectId) -> Optional[List[Dict[str, Any]]]:
+    """
+    Autores de um livro (documentos crus, ordenados por _id), ou None se o
+    livro não existir. Os autores são resolvidos pelo carregador da requisição.
+    """
+    if usa_colecao():
+        livro, arestas = await asyncio.gather(
+            carregador(Livro).carregar(livro_id),
+            Autoria.get_pymongo_collection().find({"livro_id": livro_id}, {"_id": 0, "autor_id": 1}).to_list(),
+        )
+        if livro is None:
+            return None
+        autor_ids = [aresta["autor_id"] for aresta in arestas]
+    else:
+        livro = await Livro.get_pymongo_collection().find_one({"_id": livro_id}, {"autores": 1})
+        if livro is None:
+            return None
+        autor_ids = [ref.id for ref in livro.get("autores") or []]
+
+    autores = await carregador(Autor).carregar_varios(sorted(set(autor_ids)))
+    return [autor for autor in autores if autor is not None]
+
+
+async def mapa_autores_por_livro() -> Dict[PydanticObjectId, List[PydanticObjectId]]:
+    """{livro_id: [autor_id, ...]} a partir da coleção de arestas (para o índice de busca)."""
+    mapa: Dict[PydanticObjectId, List[PydanticObjectId]] = defaultdict(list)
+    async for aresta in Autoria.get_pymongo_collection().find({}, {"_id": 0, "livro_id": 1, "autor_id": 1}):
+        mapa[aresta["livro_id"]].append(aresta["autor_id"])
+    return mapa
+
+
+# Migração entre os modos
+
+async def _gravar_em_lotes(colecao, operacoes) -> int:
+    total = 0
+    lote = []
+    for operacao in operacoes:
+        lote.append(operacao)
+        if len(lote) >= MIGRACAO_LOTE:
+            await colecao.bulk_write(lote, ordered=False)
+            total += len(lote)
+            lote = []
+    if lote:
+        await colecao.bulk_write(lote, ordered=False)
+        total += len(lote)
+    return total
+
+
+async def migrar_para_colecao(limpar_arrays: bool = False) -> Dict[str, int]:
+    """
+    Copia os vínculos dos arrays embutidos (dos dois lados) para `autorias`.
+
+    É idempotente (upsert por par). Com `limpar_arrays`, esvazia depois
+    `Livro.autores` e `Autor.livros`.
+    """
+    pares = set()
+    async for doc in Livro.get_pymongo_collection().find({"autores.0": {"$exists": True}}, {"autores": 1}):
+        pares.update((doc["_id"], ref.id) for ref in doc["autores"])
+    async for doc in Autor.get_pymongo_collection().find({"livros.0": {"$exists": True}}, {"livros": 1}):
+        pares.update((ref.id, doc["_id"]) for ref in doc["livros"])
+
+    arestas = await _gravar_em_lotes(
+        Autoria.get_pymongo_collection(),
+        (
+            UpdateOne(
+                {"livro_id": livro_id, "autor_id": autor_id},
+                {"$setOnInsert": {"_id": id_autoria(livro_id, autor_id)}},
+                upsert=True,
+            )
+            for livro_id, autor_id in pares
+        ),
+    )
+
+    if limpar_arrays:
+        await Livro.get_pymongo_collection().update_many({"autores.0": {"$exists": True}}, {"$set": {"autores": []}})
+        await Autor.get_pymongo_collection().update_many({"livros.0": {"$exists": True}}, {"$set": {"livros": []}})
+
+    return {"arestas": arestas}
+
+
+async def migrar_para_embutido() -> Dict[str, int]:
+    """Reconstrói `Livro.autores` e `Autor.livros` a partir de `autorias`."""
+    autores_por_livro: Dict[PydanticObjectId, List[DBRef]] = defaultdict(list)
+    livros_por_autor: Dict[PydanticObjectId, List[DBRef]] = defaultdict(list)
+    colecao_autores = Autor.get_collection_name()
+    colecao_livros = Livro.get_collection_name()
+
+    arestas = Autoria.get_pymongo_collection().find({}, {"_id": 0}).sort([("livro_id", 1), ("autor_id", 1)])
+    async for aresta in arestas:
+        autores_por_livro[aresta["livro_id"]].append(DBRef(colecao_autores, aresta["autor_id"]))
+        livros_por_autor[aresta["autor_id"]].append(DBRef(colecao_livros, aresta["livro_id"]))
+
+    livros = await _gravar_em_lotes(
+        Livro.get_pymongo_collection(),
+        (UpdateOne({"_id": livro_id}, {"$set": {"autores": refs}}) for livro_id, refs in autores_por_livro.items()),
+    )
+    autores = await _gravar_em_lotes(
+        Autor.get_pymongo_collection(),
+        (UpdateOne({"_id": autor_id}, {"$set": {"livros": refs}}) for autor_id, refs in livros_por_autor.items()),
+    )
+    return {"livros": livros, "autores": autores}
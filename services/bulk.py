@@ -0,0 +1,140 @@
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple, Type
+from beanie import Document, PydanticObjectId
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from pymongo.errors import BulkWriteError
+from models.bulk import BulkErro, BulkResultado
+
+# Quantidade de linhas validadas e gravadas por insert_many
+BULK_CHUNK = int(os.getenv("BULK_CHUNK", "1000"))
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# (número da linha, objeto validado)
+Linha = Tuple[int, BaseModel]
+Preparar = Callable[[List[Linha]], Awaitable[Tuple[List[Tuple[int, Document]], List[BulkErro]]]]
+
+
+async def _linhas_ndjson(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    """Lê o corpo NDJSON em streaming, sem carregá-lo inteiro na memória."""
+    buffer = b""
+    numero = 0
+
+    def _decodificar(linha: bytes):
+        try:
+            return json.loads(linha)
+        except ValueError as e:
+            return e
+
+    async for pedaco in request.stream():
+        buffer += pedaco
+        *linhas, buffer = buffer.split(b"\n")
+        for linha in linhas:
+            if linha.strip():
+                yield numero, _decodificar(linha)
+                numero += 1
+    if buffer.strip():
+        yield numero, _decodificar(buffer)
+
+
+async def ler_linhas(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    """Itera sobre as linhas de um corpo JSON (array) ou NDJSON."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_CONTENT_TYPES:
+        async for item in _linhas_ndjson(request):
+            yield item
+        return
+
+    try:
+        corpo = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Corpo da requisição não é um JSON válido")
+    if not isinstance(corpo, list):
+        raise HTTPException(status_code=400, detail="O corpo deve ser um array JSON ou NDJSON")
+    for numero, item in enumerate(corpo):
+        yield numero, item
+
+
+def _erro_validacao(e: Exception) -> str:
+    if isinstance(e, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+        )
+    return str(e)
+
+
+async def _preparar_padrao(model: Type[Document], linhas: List[Linha]):
+    return [(numero, model(**obj.model_dump())) for numero, obj in linhas], []
+
+
+async def _gravar(model: Type[Document], documentos: List[Tuple[int, Document]]) -> Tuple[List[Document], List[BulkErro]]:
+    """insert_many não ordenado; mapeia os erros de escrita de volta para as linhas."""
+    if not documentos:
+        return [], []
+
+    # Ids atribuídos antes da escrita para que os documentos inseridos possam ser usados depois
+    for _, doc in documentos:
+        doc.id = PydanticObjectId()
+
+    falhas = {}
+    try:
+        await model.insert_many([doc for _, doc in documentos], ordered=False)
+    except BulkWriteError as e:
+        for erro in e.details.get("writeErrors", []):
+            falhas[erro["index"]] = erro.get("errmsg", "Erro de escrita")
+
+    inseridos = [doc for i, (_, doc) in enumerate(documentos) if i not in falhas]
+    erros = [BulkErro(linha=documentos[i][0], erro=msg) for i, msg in falhas.items()]
+    return inseridos, erros
+
+
+async def importar_em_lote(
+    request: Request,
+    schema: Type[BaseModel],
+    model: Type[Document],
+    preparar: Optional[Preparar] = None,
+    ao_inserir: Optional[Callable[[List[Document]], Awaitable[None]]] = None,
+    tamanho_chunk: int = BULK_CHUNK,
+) -> BulkResultado:
+    """
+    Valida e insere as linhas do corpo em blocos de `tamanho_chunk`.
+
+    `preparar` converte as linhas válidas de um bloco em documentos (podendo
+    rejeitar algumas); `ao_inserir` recebe os documentos efetivamente gravados.
+    Linhas inválidas não interrompem a importação: voltam em `erros`.
+    """
+    resultado = BulkResultado(inseridos=0, erros=[])
+    chunk: List[Linha] = []
+
+    async def _processar(chunk: List[Linha]):
+        if preparar is not None:
+            documentos, erros = await preparar(chunk)
+        else:
+            documentos, erros = await _preparar_padrao(model, chunk)
+        inseridos, erros_escrita = await _gravar(model, documentos)
+        resultado.inseridos += len(inseridos)
+        resultado.erros += erros + erros_escrita
+        if inseridos and ao_inserir is not None:
+            await ao_inserir(inseridos)
+
+    async for numero, item in ler_linhas(request):
+        if isinstance(item, Exception):
+            resultado.erros.append(BulkErro(linha=numero, erro=f"JSON inválido: {item}"))
+            continue
+        try:
+            chunk.append((numero, schema.model_validate(item)))
+        except ValidationError as e:
+            resultado.erros.append(BulkErro(linha=numero, erro=_erro_validacao(e)))
+            continue
+
+        if len(chunk) >= tamanho_chunk:
+            await _processar(chunk)
+            chunk = []
+
+    if chunk:
+        await _processar(chunk)
+
+    resultado.erros.sort(key=lambda erro: erro.linha)
+    return resultado
@@ -0,0 +1,236 @@
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from beanie import Link, PydanticObjectId
+from models.autor import Autor
+from models.livro import Livro
+from services.autoria import mapa_autores_por_livro, usa_colecao
+from services.tarefas import tarefa
+
+# Peso de cada campo na relevância
+PESO_TITULO = 3.0
+PESO_AUTOR = 2.0
+PESO_CATEGORIA = 1.0
+
+# Termos que casam apenas por prefixo valem menos que termos exatos
+FATOR_PREFIXO = 0.5
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalizar(texto: Optional[str]) -> str:
+    """Remove acentos e converte para minúsculas ("Memórias" -> "memorias")."""
+    if not texto:
+        return ""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(normalizar(texto))
+
+
+def _link_id(link) -> PydanticObjectId:
+    """Retorna o id de um Link ou de um documento já resolvido."""
+    return link.ref.id if isinstance(link, Link) else link.id
+
+
+class IndiceBusca:
+    """
+    Índice invertido em memória sobre `titulo`, `categoria` e o `nome` dos autores.
+
+    É construído na inicialização (`reconstruir`) e mantido pelas rotas de escrita
+    de livros, autores e vínculos. A busca ignora acentos, aceita prefixos no
+    último termo e ordena por relevância (peso do campo x idf).
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[PydanticObjectId, float]] = defaultdict(dict)
+        self._vocabulario: List[str] = []
+        self._livros: Dict[PydanticObjectId, Dict] = {}
+        self._autores: Dict[PydanticObjectId, str] = {}
+        self._livros_do_autor: Dict[PydanticObjectId, Set[PydanticObjectId]] = defaultdict(set)
+
+    # Construção e manutenção
+
+    async def reconstruir(self) -> None:
+        """
+        Recarrega o índice inteiro a partir do banco. O novo índice é montado à
+        parte e só então substitui o atual, para que as buscas em andamento não
+        vejam um índice pela metade.
+        """
+        novo = IndiceBusca()
+        await novo._carregar()
+        self.__dict__.update(novo.__dict__)
+
+    async def _carregar(self) -> None:
+        async for doc in Autor.get_pymongo_collection().find({}, {"nome": 1}):
+            self._autores[doc["_id"]] = doc.get("nome") or ""
+
+        arestas = await mapa_autores_por_livro() if usa_colecao() else None
+        projection = {"titulo": 1, "categoria": 1, "autores": 1}
+        async for doc in Livro.get_pymongo_collection().find({}, projection):
+            if arestas is not None:
+                autor_ids = arestas.get(doc["_id"], [])
+            else:
+                autor_ids = [ref.id for ref in doc.get("autores") or []]
+            self._registrar_livro(doc["_id"], doc.get("titulo"), doc.get("categoria"), autor_ids)
+
+    def indexar_livro(self, livro: Livro) -> None:
+        """Indexa (ou reindexa) um livro após criação ou atualização."""
+        if usa_colecao():
+            # Os autores ficam em `autorias`; mantém os já conhecidos pelo índice
+            dados = self._livros.get(livro.id)
+            autor_ids = list(dados["autores"]) if dados else []
+        else:
+            autor_ids = [_link_id(link) for link in livro.autores or []]
+        self.remover_livro(livro.id)
+        self._registrar_livro(livro.id, livro.titulo, livro.categoria, autor_ids)
+
+    def remover_livro(self, livro_id: PydanticObjectId) -> None:
+        dados = self._livros.pop(livro_id, None)
+        if dados is None:
+            return
+        for autor_id in dados["autores"]:
+            self._livros_do_autor[autor_id].discard(livro_id)
+        self._remover_postings(livro_id, dados["termos"])
+
+    def indexar_autor(self, autor: Autor) -> None:
+        """Atualiza o nome de um autor e reindexa os livros vinculados a ele."""
+        self.sincronizar_autor({"_id": autor.id, "nome": autor.nome})
+
+    def remover_autor(self, autor_id: PydanticObjectId) -> None:
+        self._autores.pop(autor_id, None)
+        for livro_id in list(self._livros_do_autor.pop(autor_id, ())):
+            self._livros[livro_id]["autores"].remove(autor_id)
+            self._reindexar(livro_id)
+
+    def sincronizar_livro(self, doc: Dict) -> None:
+        """Reindexa um livro a partir do documento cru (alteração feita por outro processo)."""
+        if usa_colecao():
+            dados = self._livros.get(doc["_id"])
+            autor_ids = list(dados["autores"]) if dados else []
+        else:
+            autor_ids = [ref.id for ref in doc.get("autores") or []]
+        self.remover_livro(doc["_id"])
+        self._registrar_livro(doc["_id"], doc.get("titulo"), doc.get("categoria"), autor_ids)
+
+    def sincronizar_autor(self, doc: Dict) -> None:
+        """Atualiza o nome de um autor a partir do documento cru."""
+        self._autores[doc["_id"]] = doc.get("nome") or ""
+        for livro_id in list(self._livros_do_autor.get(doc["_id"], ())):
+            self._reindexar(livro_id)
+
+    def vincular(self, livro_id: PydanticObjectId, autor_id: PydanticObjectId) -> None:
+        dados = self._livros.get(livro_id)
+        if dados is None or autor_id in dados["autores"]:
+            return
+        dados["autores"].append(autor_id)
+        self._livros_do_autor[autor_id].add(livro_id)
+        self._reindexar(livro_id)
+
+    def desvincular(self, livro_id: PydanticObjectId, autor_id: PydanticObjectId) -> None:
+        dados = self._livros.get(livro_id)
+        if dados is None or autor_id not in dados["autores"]:
+            return
+        dados["autores"].remove(autor_id)
+        self._livros_do_autor[autor_id].discard(livro_id)
+        self._reindexar(livro_id)
+
+    # Consulta
+
+    def buscar(self, q: str, offset: int = 0, limit: int = 10) -> List[PydanticObjectId]:
+        """
+        Retorna os ids dos livros que contêm todos os termos de `q`, do mais
+        relevante para o menos relevante, já paginados.
+        """
+        termos = tokenizar(q)
+        if not termos:
+            return []
+
+        total = max(len(self._livros), 1)
+        scores: Optional[Dict[PydanticObjectId, float]] = None
+        for i, termo in enumerate(termos):
+            # Apenas o último termo é tratado como prefixo (busca enquanto digita)
+            candidatos = self._expandir(termo) if i == len(termos) - 1 else [termo]
+            parcial: Dict[PydanticObjectId, float] = defaultdict(float)
+            for token in candidatos:
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + total / len(postings))
+                fator = 1.0 if token == termo else FATOR_PREFIXO
+                for livro_id, peso in postings.items():
+                    parcial[livro_id] += peso * idf * fator
+
+            if scores is None:
+                scores = parcial
+            else:
+                scores = {k: v + parcial[k] for k, v in scores.items() if k in parcial}
+            if not scores:
+                return []
+
+        melhores = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], str(item[0])))
+        return [livro_id for livro_id, _ in melhores[offset:offset + limit]]
+
+    # Internos
+
+    def _expandir(self, prefixo: str) -> Iterable[str]:
+        inicio = bisect.bisect_left(self._vocabulario, prefixo)
+        for token in self._vocabulario[inicio:]:
+            if not token.startswith(prefixo):
+                break
+            yield token
+
+    def _termos(self, titulo: Optional[str], categoria: Optional[str], autor_ids: List[PydanticObjectId]) -> Dict[str, float]:
+        termos: Dict[str, float] = defaultdict(float)
+        campos: List[Tuple[Optional[str], float]] = [(titulo, PESO_TITULO), (categoria, PESO_CATEGORIA)]
+        campos += [(self._autores.get(autor_id), PESO_AUTOR) for autor_id in autor_ids]
+        for texto, peso in campos:
+            for token in tokenizar(texto):
+                termos[token] += peso
+        return termos
+
+    def _registrar_livro(self, livro_id, titulo, categoria, autor_ids) -> None:
+        termos = self._termos(titulo, categoria, autor_ids)
+        self._livros[livro_id] = {
+            "titulo": titulo,
+            "categoria": categoria,
+            "autores": list(autor_ids),
+            "termos": termos,
+        }
+        for autor_id in autor_ids:
+            self._livros_do_autor[autor_id].add(livro_id)
+        for token, peso in termos.items():
+            if token not in self._postings:
+                bisect.insort(self._vocabulario, token)
+            self._postings[token][livro_id] = peso
+
+    def _reindexar(self, livro_id: PydanticObjectId) -> None:
+        dados = self._livros[livro_id]
+        self._remover_postings(livro_id, dados["termos"])
+        self._registrar_livro(livro_id, dados["titulo"], dados["categoria"], dados["autores"])
+
+    def _remover_postings(self, livro_id: PydanticObjectId, termos: Dict[str, float]) -> None:
+        for token in termos:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(livro_id, None)
+            if not postings:
+                del self._postings[token]
+                indice = bisect.bisect_left(self._vocabulario, token)
+                if indice < len(self._vocabulario) and self._vocabulario[indice] == token:
+                    self._vocabulario.pop(indice)
+
+
+indice_livros = IndiceBusca()
+
+
+@tarefa("reconstruir_indice_busca")
+async def reconstruir_indice_busca() -> None:
+    await indice_livros.reconstruir()
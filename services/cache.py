@@ -0,0 +1,644 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Optional, Sequence, Type
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel
+from models.aluno import AlunoOut
+from models.autor import AutorOut
+from models.emprestimo import EmprestimoOut
+from models.livro import LivroOut
+
+_AUSENTE = object()
+
+
+class CacheBackend:
+    """Interface dos backends de cache (em memória, compartilhado, etc.)."""
+
+    def get(self, chave: Hashable, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, chave: Hashable, valor: Any, ttl: Optional[float] = None, marca: Optional[int] = None) -> None:
+        """
+        `marca` é o valor de `marca()` lido antes de consultar o banco: se a
+        chave foi invalidada depois dele, o valor (já velho) é descartado.
+        """
+        raise NotImplementedError
+
+    def invalidate(self, chave: Hashable) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def marca(self) -> Optional[int]:
+        return None
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {}
+
+
+class CacheTTL(CacheBackend):
+    """
+    Cache em memória com expiração por tempo (TTL) e tamanho máximo.
+
+    Quando cheio, descarta a entrada usada há mais tempo (LRU). Mantém
+    contadores de acertos, falhas e remoções.
+
+    Como o compartilhado, guarda para cada chave invalidada o valor de um
+    relógio (até `maxsize` delas; as mais antigas viram `_limpo_em`): um
+    `set` cuja `marca` seja anterior é descartado.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 128):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._dados: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._relogio = 0
+        self._limpo_em = 0
+        self._invalidadas: "OrderedDict[Hashable, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chave: Hashable, default: Any = None) -> Any:
+        item = self._dados.get(chave, _AUSENTE)
+        if item is _AUSENTE:
+            self.misses += 1
+            return default
+        expira_em, valor = item
+        if expira_em <= time.monotonic():
+            del self._dados[chave]
+            self.misses += 1
+            return default
+        self._dados.move_to_end(chave)
+        self.hits += 1
+        return valor
+
+    def set(self, chave: Hashable, valor: Any, ttl: Optional[float] = None, marca: Optional[int] = None) -> None:
+        if marca is not None and (marca < self._limpo_em or marca < self._invalidadas.get(chave, 0)):
+            return
+        self._dados[chave] = (time.monotonic() + (self.ttl if ttl is None else ttl), valor)
+        self._dados.move_to_end(chave)
+        while len(self._dados) > self.maxsize:
+            self._dados.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, chave: Hashable) -> None:
+        self._dados.pop(chave, None)
+        self._relogio += 1
+        self._invalidadas[chave] = self._relogio
+        self._invalidadas.move_to_end(chave)
+        if len(self._invalidadas) > self.maxsize:
+            _, versao = self._invalidadas.popitem(last=False)
+            self._limpo_em = max(self._limpo_em, versao)
+
+    def clear(self) -> None:
+        self._dados.clear()
+        self._relogio += 1
+        self._limpo_em = self._relogio
+        self._invalidadas.clear()
+
+    def marca(self) -> int:
+        return self._relogio
+
+    def estatisticas(self) -> Dict[str, Any]:
+        consultas = self.hits + self.misses
+        return {
+            "tamanho": len(self._dados),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / consultas, 4) if consultas else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._dados)
+
+
+# Cache compartilhado entre processos
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")  # "memoria" ou "compartilhado"
+CACHE_COMPARTILHADO_DIR = os.getenv("CACHE_COMPARTILHADO_DIR") or (
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+CACHE_COMPARTILHADO_PREFIXO = os.getenv("CACHE_COMPARTILHADO_PREFIXO", "biblioteca")
+
+# magic, versão do layout, geração, slots, fim dos dados, ocupados, vivos, limpezas, relógio, limpo_em
+_CABECALHO = struct.Struct("<4sIQQQQQQQQ")
+_TAMANHO_CABECALHO = 128
+# seq, hash, offset, tamanho, estado, versão, expira_em
+_SLOT = struct.Struct("<QQQIIQd")
+_SEQ = struct.Struct("<Q")
+_CHAVE = struct.Struct("<I")
+_MAGIC = b"BCC1"
+_LAYOUT = 1
+
+_VAZIO, _USADO, _REMOVIDO = 0, 1, 2
+_OUTRA_CHAVE = object()
+
+# Ocupação máxima da tabela (vivos + removidos) antes de uma limpeza
+_CARGA_MAXIMA = 0.7
+# Releituras de um slot que mudou durante a leitura antes de desistir (conta como falha)
+_TENTATIVAS_LEITURA = 3
+
+
+class CacheCompartilhado(CacheBackend):
+    """
+    Cache com TTL em um arquivo mapeado em memória (por padrão em /dev/shm),
+    lido e escrito por todos os workers da API: cada registro existe uma única
+    vez na máquina e o aquecimento feito por um worker vale para os demais.
+
+    O arquivo tem um cabeçalho, uma tabela hash de endereçamento aberto e uma
+    área de dados onde os registros (chave + valor em pickle) são acrescentados
+    em sequência. Quando a área de dados ou a tabela enchem, o cache é limpo.
+
+    Leituras não usam trava: cada slot tem um contador de versão (seqlock),
+    ímpar enquanto é escrito, e o cabeçalho uma geração, ímpar durante a
+    limpeza. A leitura desserializa direto do mapa (sem cópia) e só vale se
+    ambos não mudaram nesse intervalo. As escritas são serializadas entre
+    processos com flock no próprio arquivo.
+
+    Invalidações deixam no slot o valor de um relógio global; `set` com uma
+    `marca` anterior a ele é descartado, para que um valor lido do banco antes
+    da invalidação não volte ao cache depois dela.
+    """
+
+    def __init__(self, arquivo: str, ttl: float, maxsize: int, tamanho: int):
+        self.arquivo = arquivo
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.tamanho = tamanho
+        self.hits = 0
+        self.misses = 0
+        self._pid: Optional[int] = None
+        self._fd: Optional[int] = None
+        self._mapa: Optional[mmap.mmap] = None
+        self._visao: Optional[memoryview] = None
+        self._slots = 0
+        self._inicio_dados = 0
+        self._fd_lider: Optional[int] = None
+
+    # Abertura e layout
+
+    def _abrir(self) -> memoryview:
+        # Após um fork o descritor (e o flock) seriam compartilhados com o pai
+        if self._pid == os.getpid():
+            return self._visao
+        self._pid = os.getpid()
+        self._fd_lider = None
+        self._fd = os.open(self.arquivo, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            slots = self._slots_existentes()
+            if slots is None:
+                slots = 1 << max(4, (int(self.maxsize / _CARGA_MAXIMA) - 1).bit_length())
+                total = _TAMANHO_CABECALHO + slots * _SLOT.size + self.tamanho
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, total)
+                self._mapear(slots)
+                self._gravar_cabecalho(geracao=0, fim=self._inicio_dados, ocupados=0, vivos=0, limpezas=0, relogio=0, limpo_em=0)
+            else:
+                self._mapear(slots)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return self._visao
+
+    def _slots_existentes(self) -> Optional[int]:
+        """Slots de um arquivo já inicializado por outro processo (None se vazio ou incompatível)."""
+        bruto = os.pread(self._fd, _CABECALHO.size, 0)
+        if len(bruto) < _CABECALHO.size:
+            return None
+        magic, layout, _, slots, *_ = _CABECALHO.unpack(bruto)
+        if magic != _MAGIC or layout != _LAYOUT or slots == 0:
+            return None
+        if os.fstat(self._fd).st_size <= _TAMANHO_CABECALHO + slots * _SLOT.size:
+            return None
+        return slots
+
+    def _mapear(self, slots: int) -> None:
+        self._mapa = mmap.mmap(self._fd, 0)
+        self._visao = memoryview(self._mapa)
+        self._slots = slots
+        self._inicio_dados = _TAMANHO_CABECALHO + slots * _SLOT.size
+
+    def fechar(self) -> None:
+        if self._visao is not None:
+            self._visao.release()
+            self._mapa.close()
+            os.close(self._fd)
+        if self._fd_lider is not None:
+            os.close(self._fd_lider)
+        self._visao = self._mapa = self._fd = self._fd_lider = self._pid = None
+
+    def _cabecalho(self) -> dict:
+        _, _, geracao, _, fim, ocupados, vivos, limpezas, relogio, limpo_em = _CABECALHO.unpack_from(self._visao, 0)
+        return {
+            "geracao": geracao,
+            "fim": fim,
+            "ocupados": ocupados,
+            "vivos": vivos,
+            "limpezas": limpezas,
+            "relogio": relogio,
+            "limpo_em": limpo_em,
+        }
+
+    def _gravar_cabecalho(self, **campos: int) -> None:
+        atual = {**self._cabecalho(), **campos}
+        _CABECALHO.pack_into(
+            self._visao, 0, _MAGIC, _LAYOUT, atual["geracao"], self._slots, atual["fim"],
+            atual["ocupados"], atual["vivos"], atual["limpezas"], atual["relogio"], atual["limpo_em"],
+        )
+
+    # Eleição do worker que mantém o cache aquecido
+
+    def tentar_liderar(self) -> bool:
+        """
+        Tenta ser o processo que reaquece o cache (flock não bloqueante em
+        `<arquivo>.lider`). A trava dura até o processo terminar; se ele cair,
+        outro worker assume na próxima tentativa.
+        """
+        self._abrir()
+        if self._fd_lider is not None:
+            return True
+        fd = os.open(self.arquivo + ".lider", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd_lider = fd
+        return True
+
+    @property
+    def lider(self) -> bool:
+        return self._fd_lider is not None and self._pid == os.getpid()
+
+    # Tabela hash
+
+    @staticmethod
+    def _serializar_chave(chave: Hashable) -> bytes:
+        return repr(chave).encode()
+
+    @staticmethod
+    def _hash(chave_bytes: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(chave_bytes, digest_size=8).digest(), "little")
+
+    def _posicao(self, indice: int) -> int:
+        return _TAMANHO_CABECALHO + indice * _SLOT.size
+
+    def _sondar(self, h: int):
+        """Posições dos slots na ordem de sondagem linear da chave."""
+        inicio = h & (self._slots - 1)
+        for i in range(self._slots):
+            yield self._posicao((inicio + i) & (self._slots - 1))
+
+    # Leitura (sem trava)
+
+    def get(self, chave: Hashable, default: Any = None) -> Any:
+        visao = self._abrir()
+        chave_bytes = self._serializar_chave(chave)
+        h = self._hash(chave_bytes)
+        for posicao in self._sondar(h):
+            valor = self._ler_slot(visao, posicao, h, chave_bytes)
+            if valor is _OUTRA_CHAVE:
+                continue
+            if valor is not _AUSENTE:
+                self.hits += 1
+                return valor
+            break
+        self.misses += 1
+        return default
+
+    def _ler_slot(self, visao: memoryview, posicao: int, h: int, chave_bytes: bytes) -> Any:
+        """
+        Valor do slot, _AUSENTE (vazio, removido, expirado ou em escrita) ou
+        _OUTRA_CHAVE (a sondagem continua no próximo slot).
+        """
+        for _ in range(_TENTATIVAS_LEITURA):
+            (geracao,) = _SEQ.unpack_from(visao, 8)
+            seq, slot_hash, offset, tamanho, estado, _, expira_em = _SLOT.unpack_from(visao, posicao)
+            if geracao & 1 or seq & 1:
+                continue
+            if estado == _VAZIO:
+                valor = _AUSENTE
+            elif slot_hash != h:
+                valor = _OUTRA_CHAVE
+            elif estado != _USADO or expira_em <= time.time():
+                valor = _AUSENTE
+            else:
+                try:
+                    (tamanho_chave,) = _CHAVE.unpack_from(visao, offset)
+                    inicio = offset + _CHAVE.size
+                    if visao[inicio:inicio + tamanho_chave] != chave_bytes:
+                        valor = _AUSENTE
+                    else:
+                        valor = pickle.loads(visao[inicio + tamanho_chave:offset + tamanho])
+                except Exception:
+                    # Registro sobrescrito durante a leitura: lê de novo
+                    continue
+            if _SEQ.unpack_from(visao, posicao)[0] == seq and _SEQ.unpack_from(visao, 8)[0] == geracao:
+                return valor
+        return _AUSENTE
+
+    # Escrita (serializada entre processos)
+
+    @contextmanager
+    def _escrita(self):
+        self._abrir()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _localizar(self, h: int) -> Optional[int]:
+        """Slot da chave (usado ou removido) ou o primeiro vazio; None se a tabela estiver cheia."""
+        for posicao in self._sondar(h):
+            _, slot_hash, _, _, estado, _, _ = _SLOT.unpack_from(self._visao, posicao)
+            if estado == _VAZIO or slot_hash == h:
+                return posicao
+        return None
+
+    def _gravar_slot(self, posicao: int, *campos) -> None:
+        (seq,) = _SEQ.unpack_from(self._visao, posicao)
+        _SEQ.pack_into(self._visao, posicao, seq + 1)
+        _SLOT.pack_into(self._visao, posicao, seq + 1, *campos)
+        _SEQ.pack_into(self._visao, posicao, seq + 2)
+
+    def set(self, chave: Hashable, valor: Any, ttl: Optional[float] = None, marca: Optional[int] = None) -> None:
+        chave_bytes = self._serializar_chave(chave)
+        h = self._hash(chave_bytes)
+        registro = _CHAVE.pack(len(chave_bytes)) + chave_bytes + pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        expira_em = time.time() + (self.ttl if ttl is None else ttl)
+
+        with self._escrita():
+            if len(registro) > self.tamanho // 4:
+                return
+            cabecalho = self._cabecalho()
+            if marca is not None and marca < cabecalho["limpo_em"]:
+                return
+            posicao = self._localizar(h)
+            if not self._cabe(cabecalho, posicao, len(registro)):
+                self._compactar()
+                cabecalho = self._cabecalho()
+                # A compactação descarta marcas de invalidação: limpo_em protege o que foi perdido
+                if marca is not None and marca < cabecalho["limpo_em"]:
+                    return
+                posicao = self._localizar(h)
+                if not self._cabe(cabecalho, posicao, len(registro)):
+                    return
+            novo = _SLOT.unpack_from(self._visao, posicao)[4] == _VAZIO
+
+            _, _, _, _, estado, versao, _ = _SLOT.unpack_from(self._visao, posicao)
+            if marca is not None and versao > marca:
+                return
+            fim = cabecalho["fim"]
+            self._visao[fim:fim + len(registro)] = registro
+            self._gravar_slot(posicao, h, fim, len(registro), _USADO, versao, expira_em)
+            self._gravar_cabecalho(
+                fim=fim + len(registro),
+                ocupados=cabecalho["ocupados"] + (1 if novo else 0),
+                vivos=cabecalho["vivos"] + (0 if estado == _USADO else 1),
+            )
+
+    def _cabe(self, cabecalho: dict, posicao: Optional[int], tamanho: int) -> bool:
+        """Há espaço na área de dados e, para uma chave nova, na tabela?"""
+        if posicao is None or cabecalho["fim"] + tamanho > len(self._visao):
+            return False
+        novo = _SLOT.unpack_from(self._visao, posicao)[4] == _VAZIO
+        return not novo or cabecalho["ocupados"] + 1 <= self._slots * _CARGA_MAXIMA
+
+    def invalidate(self, chave: Hashable) -> None:
+        h = self._hash(self._serializar_chave(chave))
+        with self._escrita():
+            cabecalho = self._cabecalho()
+            relogio = cabecalho["relogio"] + 1
+            posicao = self._localizar(h)
+            if posicao is None or (
+                _SLOT.unpack_from(self._visao, posicao)[4] == _VAZIO
+                and cabecalho["ocupados"] + 1 > self._slots * _CARGA_MAXIMA
+            ):
+                # Sem espaço para registrar a invalidação: limpar também a cobre
+                self._limpar(relogio)
+                return
+            _, _, _, _, estado, _, _ = _SLOT.unpack_from(self._visao, posicao)
+            # Mesmo sem entrada, o slot removido guarda a versão da invalidação
+            self._gravar_slot(posicao, h, 0, 0, _REMOVIDO, relogio, 0.0)
+            self._gravar_cabecalho(
+                relogio=relogio,
+                ocupados=cabecalho["ocupados"] + (1 if estado == _VAZIO else 0),
+                vivos=cabecalho["vivos"] - (1 if estado == _USADO else 0),
+            )
+
+    def clear(self) -> None:
+        with self._escrita():
+            self._limpar(self._cabecalho()["relogio"] + 1)
+
+    def _limpar(self, limpo_em: int, registros: Optional[list] = None) -> None:
+        """
+        Zera a tabela e a área de dados e regrava `registros` (hash, bytes,
+        versão, expira_em). Valores com marca anterior a `limpo_em` passam a
+        ser recusados: uma limpeza explícita invalida tudo o que veio antes.
+        """
+        cabecalho = self._cabecalho()
+        self._gravar_cabecalho(geracao=cabecalho["geracao"] + 1)
+        self._visao[_TAMANHO_CABECALHO:self._inicio_dados] = bytes(self._inicio_dados - _TAMANHO_CABECALHO)
+        fim = self._inicio_dados
+        for h, registro, versao, expira_em in registros or ():
+            posicao = self._localizar(h)
+            self._visao[fim:fim + len(registro)] = registro
+            _SLOT.pack_into(self._visao, posicao, 0, h, fim, len(registro), _USADO, versao, expira_em)
+            fim += len(registro)
+        relogio = max(cabecalho["relogio"], limpo_em)
+        self._gravar_cabecalho(
+            geracao=cabecalho["geracao"] + 2,
+            fim=fim,
+            ocupados=len(registros or ()),
+            vivos=len(registros or ()),
+            limpezas=cabecalho["limpezas"] + (0 if registros else 1),
+            relogio=relogio,
+            limpo_em=max(cabecalho["limpo_em"], limpo_em),
+        )
+
+    def _compactar(self) -> None:
+        """
+        Área de dados ou tabela cheia: regrava apenas os registros vivos e
+        ainda válidos. As marcas de invalidação (slots removidos e expirados)
+        são descartadas, e limpo_em avança até a maior delas, para que um
+        `set` com marca anterior não traga de volta um valor invalidado.
+        Se os vivos ocupam mais da metade do espaço, limpa tudo.
+        """
+        agora = time.time()
+        cabecalho = self._cabecalho()
+        vivos = []
+        perdida = 0
+        usados = 0
+        for indice in range(self._slots):
+            _, h, offset, tamanho, estado, versao, expira_em = _SLOT.unpack_from(self._visao, self._posicao(indice))
+            if estado == _USADO and expira_em > agora:
+                vivos.append((h, bytes(self._visao[offset:offset + tamanho]), versao, expira_em))
+                usados += tamanho
+            elif estado != _VAZIO:
+                perdida = max(perdida, versao)
+
+        area = len(self._visao) - self._inicio_dados
+        if usados > area // 2 or len(vivos) > self._slots * _CARGA_MAXIMA / 2:
+            # Sem ganho suficiente: descarta tudo, mas sem recusar quem leu depois da última invalidação
+            self._limpar(cabecalho["relogio"])
+        else:
+            self._limpar(perdida, vivos)
+
+    def marca(self) -> int:
+        self._abrir()
+        return self._cabecalho()["relogio"]
+
+    def estatisticas(self) -> Dict[str, Any]:
+        self._abrir()
+        cabecalho = self._cabecalho()
+        consultas = self.hits + self.misses
+        return {
+            "tamanho": cabecalho["vivos"],
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": cabecalho["limpezas"],
+            "hit_ratio": round(self.hits / consultas, 4) if consultas else 0.0,
+            "arquivo": self.arquivo,
+            "slots": self._slots,
+            "slots_ocupados": cabecalho["ocupados"],
+            "bytes_usados": cabecalho["fim"] - self._inicio_dados,
+            "bytes_total": len(self._visao) - self._inicio_dados,
+            "lider": self.lider,
+        }
+
+    def __len__(self) -> int:
+        self._abrir()
+        return self._cabecalho()["vivos"]
+
+
+def versao_esquemas(esquemas: Sequence[Type[BaseModel]]) -> str:
+    """
+    Impressão digital do layout do arquivo e dos modelos guardados em pickle.
+    Muda a cada deploy que altera um deles, e com ela o nome do arquivo.
+    """
+    conteudo = json.dumps([_LAYOUT, pickle.HIGHEST_PROTOCOL, *(esquema.model_json_schema() for esquema in esquemas)], sort_keys=True)
+    return hashlib.blake2b(conteudo.encode(), digest_size=6).hexdigest()
+
+
+def criar_cache(
+    nome: str,
+    ttl: float,
+    maxsize: int,
+    tamanho_mb: int,
+    esquemas: Sequence[Type[BaseModel]] = (),
+) -> CacheBackend:
+    """
+    Backend escolhido por CACHE_BACKEND: "memoria" (um cache por processo) ou
+    "compartilhado" (um arquivo `<prefixo>-<nome>-<versão>.cache` em
+    CACHE_COMPARTILHADO_DIR usado por todos os workers da máquina).
+
+    `esquemas` são os modelos dos valores guardados: a versão no nome do
+    arquivo vem deles, de modo que workers de um deploy novo não leem
+    pickles de uma definição antiga (nem a sobrescrevem enquanto os
+    workers antigos ainda a mapeiam).
+    """
+    if CACHE_BACKEND == "compartilhado":
+        arquivo = os.path.join(
+            CACHE_COMPARTILHADO_DIR,
+            f"{CACHE_COMPARTILHADO_PREFIXO}-{nome}-{versao_esquemas(esquemas)}.cache",
+        )
+        return CacheCompartilhado(arquivo, ttl=ttl, maxsize=maxsize, tamanho=tamanho_mb * 1024 * 1024)
+    return CacheTTL(ttl=ttl, maxsize=maxsize)
+
+
+# Cache de entidades (leituras por id)
+
+ENTIDADES_CACHE_TTL = float(os.getenv("ENTIDADES_CACHE_TTL", "300"))
+ENTIDADES_CACHE_MAXSIZE = int(os.getenv("ENTIDADES_CACHE_MAXSIZE", "10000"))
+# Área de dados do backend compartilhado (MB)
+ENTIDADES_CACHE_MB = int(os.getenv("ENTIDADES_CACHE_MB", "64"))
+
+
+class CacheEntidades:
+    """
+    Cache read-through das respostas de leitura por id, com chave (modelo, id).
+
+    Guarda os modelos de saída (AlunoOut, LivroOut, ...), nunca os documentos,
+    para que alterações locais em um documento não vazem para o cache. As rotas
+    de escrita invalidam explicitamente as entradas afetadas.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    def configurar_backend(self, backend: CacheBackend) -> None:
+        self.backend = backend
+
+    @staticmethod
+    def _chave(model: Type[Document], entidade_id: PydanticObjectId) -> tuple:
+        return (model.__name__, str(entidade_id))
+
+    def get(self, model: Type[Document], entidade_id: PydanticObjectId) -> Any:
+        return self.backend.get(self._chave(model, entidade_id))
+
+    def set(
+        self,
+        model: Type[Document],
+        entidade_id: PydanticObjectId,
+        valor: BaseModel,
+        marca: Optional[int] = None,
+    ) -> None:
+        self.backend.set(self._chave(model, entidade_id), valor, marca=marca)
+
+    def invalidar(self, model: Type[Document], *entidade_ids: PydanticObjectId) -> None:
+        for entidade_id in entidade_ids:
+            self.backend.invalidate(self._chave(model, entidade_id))
+
+    def limpar(self) -> None:
+        self.backend.clear()
+
+    def marca(self) -> Optional[int]:
+        return self.backend.marca()
+
+    async def obter(
+        self,
+        model: Type[Document],
+        entidade_id: PydanticObjectId,
+        schema: Type[BaseModel],
+    ) -> Optional[BaseModel]:
+        """Lê do cache; em caso de falha, carrega do banco e converte para `schema`."""
+        valor = self.get(model, entidade_id)
+        if valor is not None:
+            return valor
+
+        marca = self.marca()
+        documento = await model.get(entidade_id)
+        if documento is None:
+            return None
+        valor = schema.model_validate(documento)
+        self.set(model, entidade_id, valor, marca=marca)
+        return valor
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return self.backend.estatisticas()
+
+
+cache_entidades = CacheEntidades(criar_cache(
+    "entidades",
+    ENTIDADES_CACHE_TTL,
+    ENTIDADES_CACHE_MAXSIZE,
+    ENTIDADES_CACHE_MB,
+    esquemas=(AlunoOut, AutorOut, EmprestimoOut, LivroOut),
+))
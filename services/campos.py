@@ -0,0 +1,63 @@
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+from beanie import PydanticObjectId
+from fastapi import HTTPException, Query
+from pydantic import BaseModel, Field, create_model
+
+# Campos pedidos em `?fields=`, na ordem do modelo de saída
+Campos = Tuple[str, ...]
+
+
+def validar_campos(schema: Type[BaseModel], fields: Optional[str]) -> Optional[Campos]:
+    """
+    Valida `fields` ("id,titulo") contra os campos de `schema`. Retorna None
+    quando o parâmetro não foi informado (resposta completa); campos
+    desconhecidos resultam em 400.
+    """
+    if fields is None:
+        return None
+    pedidos = {campo.strip() for campo in fields.split(",") if campo.strip()}
+    if not pedidos:
+        raise HTTPException(status_code=400, detail="Informe ao menos um campo em fields")
+    invalidos = sorted(pedidos - schema.model_fields.keys())
+    if invalidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campo(s) inválido(s) em fields: {', '.join(invalidos)}. Disponíveis: {', '.join(schema.model_fields)}",
+        )
+    return tuple(campo for campo in schema.model_fields if campo in pedidos)
+
+
+def campos_da_query(schema: Type[BaseModel]) -> Callable[..., Optional[Campos]]:
+    """Dependência que lê `?fields=` das rotas de listagem que retornam `schema`."""
+    def dependencia(
+        fields: Optional[str] = Query(
+            default=None,
+            description=f"Campos retornados, separados por vírgula ({', '.join(schema.model_fields)})",
+        ),
+    ) -> Optional[Campos]:
+        return validar_campos(schema, fields)
+    return dependencia
+
+
+@lru_cache(maxsize=256)
+def modelo_projecao(schema: Type[BaseModel], campos: Optional[Campos] = None) -> Type[BaseModel]:
+    """
+    Modelo de projeção do Beanie (`find().project(...)`) com apenas `campos`
+    de `schema` (todos, se None). O _id é sempre lido, pois a paginação
+    por cursor depende dele, mas só é devolvido se pedido.
+    """
+    campos = campos or tuple(schema.model_fields)
+    definicoes: Dict[str, Any] = {"id": (PydanticObjectId, Field(validation_alias="_id"))}
+    for nome in campos:
+        if nome != "id":
+            definicoes[nome] = (schema.model_fields[nome].annotation, schema.model_fields[nome])
+    modelo = create_model(f"{schema.__name__}Projecao", **definicoes)
+    modelo.Settings = type("Settings", (), {"projection": {"_id": 1, **{nome: 1 for nome in campos if nome != "id"}}})
+    return modelo
+
+
+def projetar(documentos: Iterable[BaseModel], schema: Type[BaseModel], campos: Optional[Campos]) -> List[Dict[str, Any]]:
+    """Linhas da resposta rápida a partir dos modelos de projeção."""
+    incluir = set(campos or schema.model_fields)
+    return [documento.model_dump(include=incluir) for documento in documentos]
@@ -0,0 +1,153 @@
+import asyncio
+import os
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Type
+from beanie import Document, PydanticObjectId
+from pymongo import monitoring
+from models.aluno import Aluno, AlunoOut
+from models.autor import Autor, AutorOut
+from models.livro import Livro, LivroOut
+
+# Inclui o header X-Mongo-Consultas (comandos enviados ao Mongo) nas respostas
+QUERY_COUNT_HEADER = os.getenv("QUERY_COUNT_HEADER", "false").lower() in ("1", "true", "sim")
+CONSULTAS_HEADER = "x-mongo-consultas"
+
+# Campos carregados por modelo: os do modelo de saída (o suficiente para as
+# respostas e para checar existência, sem os arrays de vínculos)
+SAIDAS: Dict[Type[Document], type] = {Aluno: AlunoOut, Autor: AutorOut, Livro: LivroOut}
+
+
+def _projection(model: Type[Document]) -> Optional[Dict[str, int]]:
+    saida = SAIDAS.get(model)
+    if saida is None:
+        return None
+    return {"_id" if campo == "id" else campo: 1 for campo in saida.model_fields}
+
+
+class Carregador:
+    """
+    DataLoader de um modelo, com escopo de requisição.
+
+    Os ids pedidos no mesmo ciclo do event loop (ex.: dentro de um
+    asyncio.gather) são resolvidos juntos em uma única consulta $in, sem
+    repetições. Cada id é consultado no máximo uma vez por requisição; o
+    resultado é o documento cru (dict) ou None se não existir.
+    """
+
+    def __init__(self, model: Type[Document]):
+        self.model = model
+        self.projection = _projection(model)
+        self._resultados: Dict[PydanticObjectId, asyncio.Future] = {}
+        self._pendentes: Dict[PydanticObjectId, asyncio.Future] = {}
+
+    async def carregar(self, documento_id: PydanticObjectId) -> Optional[Dict[str, Any]]:
+        futuro = self._resultados.get(documento_id)
+        if futuro is None:
+            loop = asyncio.get_running_loop()
+            futuro = loop.create_future()
+            self._resultados[documento_id] = futuro
+            if not self._pendentes:
+                loop.call_soon(self._despachar)
+            self._pendentes[documento_id] = futuro
+        # shield: o cancelamento de quem espera não cancela o resultado compartilhado
+        return await asyncio.shield(futuro)
+
+    async def carregar_varios(self, ids: Iterable[PydanticObjectId]) -> List[Optional[Dict[str, Any]]]:
+        """Vários ids de uma vez (uma consulta), na ordem pedida."""
+        return list(await asyncio.gather(*(self.carregar(documento_id) for documento_id in ids)))
+
+    def _despachar(self) -> None:
+        pendentes, self._pendentes = self._pendentes, {}
+        asyncio.get_running_loop().create_task(self._resolver(pendentes))
+
+    async def _resolver(self, pendentes: Dict[PydanticObjectId, asyncio.Future]) -> None:
+        try:
+            cursor = self.model.get_pymongo_collection().find({"_id": {"$in": list(pendentes)}}, self.projection)
+            encontrados = {doc["_id"]: doc async for doc in cursor}
+        except Exception as e:
+            for documento_id, futuro in pendentes.items():
+                # Falhas não ficam em cache: uma nova chamada tenta de novo
+                self._resultados.pop(documento_id, None)
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        for documento_id, futuro in pendentes.items():
+            if not futuro.done():
+                futuro.set_result(encontrados.get(documento_id))
+
+
+class ContextoCarregadores:
+    """Carregadores e contadores de uma requisição."""
+
+    def __init__(self):
+        self.carregadores: Dict[Type[Document], Carregador] = {}
+        # Comandos enviados ao Mongo durante a requisição, por nome
+        self.consultas: Counter = Counter()
+
+    def carregador(self, model: Type[Document]) -> Carregador:
+        if model not in self.carregadores:
+            self.carregadores[model] = Carregador(model)
+        return self.carregadores[model]
+
+    @property
+    def total_consultas(self) -> int:
+        return sum(self.consultas.values())
+
+
+_contexto: ContextVar[Optional[ContextoCarregadores]] = ContextVar("carregadores", default=None)
+
+
+def carregador(model: Type[Document]) -> Carregador:
+    """Carregador do modelo na requisição atual (fora de uma requisição, um avulso)."""
+    contexto = _contexto.get()
+    return contexto.carregador(model) if contexto is not None else Carregador(model)
+
+
+class ContadorConsultas(monitoring.CommandListener):
+    """Soma os comandos enviados ao Mongo no contexto da requisição que os emitiu."""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        contexto = _contexto.get()
+        if contexto is not None:
+            contexto.consultas[event.command_name] += 1
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+contador_consultas = ContadorConsultas()
+
+
+class MiddlewareCarregadores:
+    """
+    Middleware ASGI que cria os carregadores de cada requisição. Com
+    QUERY_COUNT_HEADER, informa no header X-Mongo-Consultas quantos comandos
+    a requisição enviou ao Mongo (útil para detectar N+1 nos testes).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        contexto = ContextoCarregadores()
+
+        async def send_com_contagem(mensagem):
+            if QUERY_COUNT_HEADER and mensagem["type"] == "http.response.start":
+                headers = list(mensagem.get("headers", []))
+                headers.append((CONSULTAS_HEADER.encode(), str(contexto.total_consultas).encode()))
+                mensagem = {**mensagem, "headers": headers}
+            await send(mensagem)
+
+        token = _contexto.set(contexto)
+        try:
+            await self.app(scope, receive, send_com_contagem)
+        finally:
+            _contexto.reset(token)
@@ -0,0 +1,186 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from bson import json_util
+from pymongo import AsyncMongoClient, monitoring
+from pymongo.errors import PyMongoError
+from services.metricas import ROTA_FORA_DE_REQUISICAO, rota_atual
+
+logger = logging.getLogger(__name__)
+
+# Comandos acima deste tempo (ms) são registrados
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "50"))
+# Reexecuta as consultas lentas com explain("executionStats") em segundo plano
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() in ("1", "true", "sim")
+# Quantas consultas lentas ficam guardadas (as mais antigas são descartadas)
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "200"))
+
+# Comandos que o explain aceita sem efeitos colaterais
+COMANDOS_EXPLICAVEIS = {"find", "aggregate", "count", "distinct"}
+
+# Campos de sessão/transporte que não fazem parte da consulta
+CAMPOS_INTERNOS = {"lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "autocommit", "startTransaction"}
+
+
+def _para_json(valor: Any) -> Any:
+    """Converte tipos do BSON (ObjectId, datetime, DBRef) em JSON estendido relaxado."""
+    return json.loads(json_util.dumps(valor, json_options=json_util.RELAXED_JSON_OPTIONS))
+
+
+def _consulta(nome: str, comando: Dict[str, Any]) -> Any:
+    """Extrai do comando apenas o filtro ou pipeline (nunca os documentos inseridos)."""
+    if nome == "find":
+        return {chave: comando[chave] for chave in ("filter", "sort", "projection") if chave in comando}
+    if nome == "aggregate":
+        return comando.get("pipeline")
+    if nome in ("count", "distinct", "findAndModify"):
+        return comando.get("query")
+    if nome == "update":
+        return [update.get("q") for update in comando.get("updates", [])[:10]]
+    if nome == "delete":
+        return [delete.get("q") for delete in comando.get("deletes", [])[:10]]
+    return None
+
+
+def _retornados(nome: str, resposta: Dict[str, Any]) -> Optional[int]:
+    cursor = resposta.get("cursor")
+    if isinstance(cursor, dict):
+        lote = cursor.get("firstBatch", cursor.get("nextBatch"))
+        return len(lote) if lote is not None else None
+    if nome == "distinct":
+        return len(resposta.get("values", []))
+    return resposta.get("n")
+
+
+def _estagios(plano: Any) -> List[str]:
+    """Todos os estágios ("COLLSCAN", "IXSCAN", ...) presentes em um explain."""
+    estagios = []
+    if isinstance(plano, dict):
+        if isinstance(plano.get("stage"), str):
+            estagios.append(plano["stage"])
+        for chave, valor in plano.items():
+            if chave != "rejectedPlans":
+                estagios += _estagios(valor)
+    elif isinstance(plano, list):
+        for item in plano:
+            estagios += _estagios(item)
+    return estagios
+
+
+def _documentos_examinados(plano: Any) -> Optional[int]:
+    """Soma os totalDocsExamined do explain (no topo ou dentro do $cursor de uma agregação)."""
+    if isinstance(plano, dict):
+        if "totalDocsExamined" in plano:
+            return plano["totalDocsExamined"]
+        valores = [_documentos_examinados(valor) for chave, valor in plano.items() if chave != "rejectedPlans"]
+    elif isinstance(plano, list):
+        valores = [_documentos_examinados(item) for item in plano]
+    else:
+        return None
+    valores = [valor for valor in valores if valor is not None]
+    return sum(valores) if valores else None
+
+
+class RegistroConsultasLentas(monitoring.CommandListener):
+    """
+    Registra os comandos emitidos pelas rotas que passam de SLOW_QUERY_MS.
+
+    Cada registro guarda a rota de origem, a coleção, o filtro ou pipeline e a
+    quantidade de documentos retornados. Com SLOW_QUERY_EXPLAIN, a consulta é
+    reexecutada com explain("executionStats") em uma task separada para
+    preencher os documentos examinados e indicar se o plano usou COLLSCAN.
+    """
+
+    def __init__(self, limiar_ms: float, explain: bool, tamanho: int):
+        self.limiar_ms = limiar_ms
+        self.explain = explain
+        self.registros: deque = deque(maxlen=tamanho)
+        self.cliente: Optional[AsyncMongoClient] = None
+        # (conexão, request_id) -> (rota, banco, comando) dos comandos em andamento
+        self._pendentes: Dict[tuple, Tuple[str, str, Dict[str, Any]]] = {}
+        self._explains: Set[asyncio.Task] = set()
+
+    def configurar(self, cliente: Optional[AsyncMongoClient]) -> None:
+        """Cliente usado para os explains (definido em init_db)."""
+        self.cliente = cliente
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        rota = rota_atual()
+        if rota != ROTA_FORA_DE_REQUISICAO:
+            self._pendentes[(event.connection_id, event.request_id)] = (rota, event.database_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pendente = self._pendentes.pop((event.connection_id, event.request_id), None)
+        if pendente is not None and event.duration_micros / 1000 >= self.limiar_ms:
+            self._registrar(event, *pendente, resposta=event.reply)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pendente = self._pendentes.pop((event.connection_id, event.request_id), None)
+        if pendente is not None and event.duration_micros / 1000 >= self.limiar_ms:
+            self._registrar(event, *pendente, resposta=None)
+
+    def _registrar(self, event, rota: str, banco: str, comando: Dict[str, Any], resposta: Optional[Dict[str, Any]]) -> None:
+        nome = event.command_name
+        colecao = comando.get(nome)
+        registro = {
+            "momento": datetime.now().isoformat(timespec="milliseconds"),
+            "rota": rota,
+            "banco": banco,
+            "colecao": colecao if isinstance(colecao, str) else None,
+            "comando": nome,
+            "duracao_ms": round(event.duration_micros / 1000, 3),
+            "consulta": _para_json(_consulta(nome, comando)),
+            "documentos_retornados": _retornados(nome, resposta) if resposta is not None else None,
+            "documentos_examinados": None,
+            "estagios": None,
+            "collscan": None,
+            "erro": None if resposta is not None else str(event.failure.get("errmsg", event.failure)),
+        }
+        self.registros.append(registro)
+        logger.warning(
+            "Consulta lenta (%.1f ms) em %s: %s.%s %s",
+            registro["duracao_ms"], rota, registro["colecao"], nome, json.dumps(registro["consulta"], ensure_ascii=False),
+        )
+
+        if self.explain and self.cliente is not None and nome in COMANDOS_EXPLICAVEIS:
+            # Contexto vazio: o explain não é atribuído à rota nem registrado de novo
+            tarefa = asyncio.get_running_loop().create_task(
+                self._explicar(registro, banco, comando),
+                context=contextvars.Context(),
+            )
+            self._explains.add(tarefa)
+            tarefa.add_done_callback(self._explains.discard)
+
+    async def _explicar(self, registro: Dict[str, Any], banco: str, comando: Dict[str, Any]) -> None:
+        consulta = {chave: valor for chave, valor in comando.items() if chave not in CAMPOS_INTERNOS}
+        try:
+            plano = await self.cliente[banco].command({"explain": consulta, "verbosity": "executionStats"})
+        except PyMongoError as e:
+            registro["erro"] = f"explain falhou: {e}"
+            return
+
+        estagios = _estagios(plano)
+        registro["estagios"] = sorted(set(estagios))
+        registro["collscan"] = "COLLSCAN" in estagios
+        registro["documentos_examinados"] = _documentos_examinados(plano)
+        if registro["collscan"]:
+            logger.warning(
+                "Consulta lenta em %s fez COLLSCAN em %s (%s documentos examinados)",
+                registro["rota"], registro["colecao"], registro["documentos_examinados"],
+            )
+
+    def listar(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Registros do mais recente para o mais antigo."""
+        registros = list(reversed(self.registros))
+        return registros[:limit] if limit else registros
+
+    def limpar(self) -> None:
+        self.registros.clear()
+
+
+consultas_lentas = RegistroConsultasLentas(SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN, SLOW_QUERY_BUFFER)
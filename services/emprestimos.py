@@ -0,0 +1,308 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from beanie import Document, PydanticObjectId
+from bson import DBRef
+from bson.errors import InvalidId
+from fastapi import HTTPException, Response
+from pymongo.errors import DuplicateKeyError
+from models.aluno import Aluno, AlunoOut
+from models.livro import Livro, LivroOut
+from models.bulk import BulkErro
+from models.emprestimo import Emprestimo, EmprestimoCreate, EmprestimoFull, EmprestimoOut
+from services.cache import cache_entidades
+from services.carregador import carregador
+from services.paginacao import definir_proximo_cursor, encode_cursor, filtro_cursor_emprestimo
+from services.serializacao import para_date
+
+# Campos necessários para montar AlunoOut / LivroOut
+ALUNO_PROJECTION = {"_id": 1, "nome": 1, "matricula": 1, "curso": 1, "email": 1}
+LIVRO_PROJECTION = {"_id": 1, "titulo": 1, "ano": 1, "isbn": 1, "categoria": 1}
+
+EMPRESTIMO_PROJECTION = {
+    "_id": 1,
+    "data_emprestimo": 1,
+    "data_devolucao_prevista": 1,
+    "data_devolucao": 1,
+    "status": 1,
+}
+
+# Ordenação estável usada tanto no modo offset quanto no keyset
+EMPRESTIMO_SORT = {"data_emprestimo": 1, "_id": 1}
+
+ERRO_EMPRESTIMO_ATIVO = "Já existe um empréstimo ativo para este livro e aluno"
+
+
+def _lookup(campo: str, colecao: str, projection: Dict[str, int]) -> List[Dict[str, Any]]:
+    """
+    Estágios $lookup + $unwind que trazem apenas os campos projetados do documento vinculado.
+
+    Empréstimos cujo aluno ou livro foi removido são mantidos (sem o campo):
+    como os estágios rodam depois do $limit, descartá-los aqui deixaria a
+    página com menos de `limit` itens e interromperia a paginação.
+    """
+    return [
+        {
+            "$lookup": {
+                "from": colecao,
+                "localField": f"{campo}.$id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": projection}],
+                "as": campo,
+            }
+        },
+        {"$unwind": {"path": f"${campo}", "preserveNullAndEmptyArrays": True}},
+    ]
+
+
+def pipeline_emprestimos(
+    sort: Optional[Dict[str, int]] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    incluir_aluno: bool = True,
+    campos: Optional[Iterable[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Monta os estágios $sort -> $skip -> $limit -> $lookup(alunos) -> $lookup(livros).
+
+    O $match é gerado pelo Beanie a partir dos filtros passados ao `find()`.
+    Com `campos` (nomes do modelo de saída), o $project só mantém esses campos
+    (além da chave do cursor) e os $lookup de aluno/livro não pedidos são omitidos.
+    """
+    pipeline: List[Dict[str, Any]] = [{"$sort": sort or EMPRESTIMO_SORT}]
+    if offset:
+        pipeline.append({"$skip": offset})
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+
+    if campos is None:
+        projection = dict(EMPRESTIMO_PROJECTION)
+        incluir_livro = True
+    else:
+        campos = set(campos)
+        # _id e data_emprestimo formam o cursor da próxima página
+        projection = {campo: 1 for campo in EMPRESTIMO_PROJECTION if campo in campos or campo in ("_id", "data_emprestimo")}
+        incluir_aluno = incluir_aluno and "aluno" in campos
+        incluir_livro = "livro" in campos
+    if incluir_aluno:
+        pipeline += _lookup("aluno", Aluno.get_collection_name(), ALUNO_PROJECTION)
+        projection["aluno"] = 1
+    if incluir_livro:
+        pipeline += _lookup("livro", Livro.get_collection_name(), LIVRO_PROJECTION)
+        projection["livro"] = 1
+    pipeline.append({"$project": projection})
+
+    return pipeline
+
+
+async def buscar_emprestimos(
+    *filtros: Any,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    incluir_aluno: bool = True,
+    campos: Optional[Iterable[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Executa a consulta de empréstimos com aluno e livro resolvidos em uma única agregação.
+
+    Com `cursor`, pagina por keyset em (data_emprestimo, _id) e ignora `offset`.
+    """
+    if cursor:
+        filtros = (*filtros, filtro_cursor_emprestimo(cursor))
+        offset = 0
+    pipeline = pipeline_emprestimos(offset=offset, limit=limit, incluir_aluno=incluir_aluno, campos=campos)
+    return await Emprestimo.find(*filtros).aggregate(pipeline).to_list()
+
+
+def definir_proximo_cursor_emprestimos(
+    response: Response,
+    emprestimos: List[Dict[str, Any]],
+    limit: int,
+) -> None:
+    """Define o header X-Next-Cursor a partir do último empréstimo da página."""
+    if emprestimos and len(emprestimos) == limit:
+        ultimo = emprestimos[-1]
+        definir_proximo_cursor(response, encode_cursor(ultimo["data_emprestimo"], ultimo["_id"]))
+
+
+# Os documentos vêm do banco e já foram validados na escrita: os modelos de
+# saída são montados com model_construct, sem revalidar campos como EmailStr.
+
+def _aluno_out(doc: Dict[str, Any]) -> AlunoOut:
+    return AlunoOut.model_construct(
+        id=PydanticObjectId(doc["_id"]),
+        nome=doc["nome"],
+        matricula=doc["matricula"],
+        curso=doc["curso"],
+        email=doc["email"],
+    )
+
+
+def _livro_out(doc: Dict[str, Any]) -> LivroOut:
+    return LivroOut.model_construct(
+        id=PydanticObjectId(doc["_id"]),
+        titulo=doc["titulo"],
+        ano=doc["ano"],
+        isbn=doc["isbn"],
+        categoria=doc.get("categoria"),
+    )
+
+
+def serializar_emprestimo(doc: Dict[str, Any]) -> EmprestimoFull:
+    """Converte um documento da agregação em EmprestimoFull."""
+    return EmprestimoFull.model_construct(
+        id=PydanticObjectId(doc["_id"]),
+        data_emprestimo=para_date(doc["data_emprestimo"]),
+        data_devolucao_prevista=para_date(doc["data_devolucao_prevista"]),
+        data_devolucao=para_date(doc.get("data_devolucao")),
+        status=doc.get("status"),
+        aluno=_aluno_out(doc["aluno"]) if "aluno" in doc else None,
+        livro=_livro_out(doc["livro"]) if "livro" in doc else None,
+    )
+
+
+async def obter_emprestimo(emprestimo_id: PydanticObjectId) -> Optional[EmprestimoFull]:
+    """
+    Lê um empréstimo pelo id usando o cache de entidades.
+
+    O empréstimo é guardado como EmprestimoOut (datas + ids) e composto com o
+    AlunoOut/LivroOut em cache, de modo que atualizar um aluno ou livro invalida
+    apenas a entrada dele. Em caso de falha, uma única agregação popula as três.
+    """
+    base = cache_entidades.get(Emprestimo, emprestimo_id)
+    if base is not None:
+        aluno = await cache_entidades.obter(Aluno, base.aluno_id, AlunoOut)
+        livro = await cache_entidades.obter(Livro, base.livro_id, LivroOut)
+        if aluno is not None and livro is not None:
+            return EmprestimoFull.model_construct(
+                id=base.id,
+                data_emprestimo=base.data_emprestimo,
+                data_devolucao_prevista=base.data_devolucao_prevista,
+                data_devolucao=base.data_devolucao,
+                status=base.status,
+                aluno=aluno,
+                livro=livro,
+            )
+
+    marca = cache_entidades.marca()
+    docs = await buscar_emprestimos(Emprestimo.id == emprestimo_id, limit=1)
+    if not docs:
+        return None
+
+    emprestimo = serializar_emprestimo(docs[0])
+    if emprestimo.aluno is None or emprestimo.livro is None:
+        # Aluno ou livro removido: não há ids para compor a entrada em cache
+        return emprestimo
+    cache_entidades.set(Emprestimo, emprestimo.id, EmprestimoOut.model_construct(
+        id=emprestimo.id,
+        data_emprestimo=emprestimo.data_emprestimo,
+        data_devolucao_prevista=emprestimo.data_devolucao_prevista,
+        data_devolucao=emprestimo.data_devolucao,
+        status=emprestimo.status,
+        aluno_id=emprestimo.aluno.id,
+        livro_id=emprestimo.livro.id,
+    ), marca=marca)
+    cache_entidades.set(Aluno, emprestimo.aluno.id, emprestimo.aluno, marca=marca)
+    cache_entidades.set(Livro, emprestimo.livro.id, emprestimo.livro, marca=marca)
+    return emprestimo
+
+
+# Criação em lote
+
+async def _ids_existentes(model: type[Document], ids: Iterable[PydanticObjectId]) -> Set[PydanticObjectId]:
+    """Uma consulta $in que retorna apenas os _id encontrados."""
+    cursor = model.get_pymongo_collection().find({"_id": {"$in": list(ids)}}, {"_id": 1})
+    return {doc["_id"] async for doc in cursor}
+
+
+async def verificar_aluno_e_livro(
+    aluno_id: Optional[PydanticObjectId] = None,
+    livro_id: Optional[PydanticObjectId] = None,
+) -> None:
+    """
+    Confere a existência do aluno e do livro com os carregadores da requisição
+    (consultas simultâneas). Levanta 404 para o primeiro que não existir; None
+    é ignorado.
+    """
+    checagens = [(model, documento_id) for model, documento_id in ((Aluno, aluno_id), (Livro, livro_id)) if documento_id is not None]
+    documentos = await asyncio.gather(*(carregador(model).carregar(documento_id) for model, documento_id in checagens))
+    for (model, _), documento in zip(checagens, documentos):
+        if documento is None:
+            raise HTTPException(status_code=404, detail=f"{model.__name__} não encontrado")
+
+
+@contextmanager
+def emprestimo_ativo_unico():
+    """
+    Converte a violação do índice parcial `ativo_aluno_livro_unique` no 400
+    de empréstimo ativo duplicado.
+    """
+    try:
+        yield
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=ERRO_EMPRESTIMO_ATIVO)
+
+
+async def _pares_ativos(
+    aluno_ids: Iterable[PydanticObjectId],
+    livro_ids: Iterable[PydanticObjectId],
+) -> Set[Tuple[PydanticObjectId, PydanticObjectId]]:
+    """Pares (aluno, livro) que já possuem empréstimo ativo."""
+    cursor = Emprestimo.get_pymongo_collection().find(
+        {
+            "aluno.$id": {"$in": list(aluno_ids)},
+            "livro.$id": {"$in": list(livro_ids)},
+            "data_devolucao": None,
+        },
+        {"aluno": 1, "livro": 1},
+    )
+    return {(doc["aluno"].id, doc["livro"].id) async for doc in cursor}
+
+
+async def preparar_lote_emprestimos(
+    linhas: List[Tuple[int, EmprestimoCreate]],
+) -> Tuple[List[Tuple[int, Emprestimo]], List[BulkErro]]:
+    """
+    Converte um bloco de EmprestimoCreate em documentos, resolvendo a existência
+    de alunos e livros e os empréstimos ativos com uma consulta $in cada.
+    """
+    erros: List[BulkErro] = []
+    validas = []
+    for numero, dados in linhas:
+        try:
+            validas.append((numero, dados, PydanticObjectId(dados.aluno_id), PydanticObjectId(dados.livro_id)))
+        except InvalidId:
+            erros.append(BulkErro(linha=numero, erro="aluno_id ou livro_id inválido"))
+
+    aluno_ids = {aluno_id for _, _, aluno_id, _ in validas}
+    livro_ids = {livro_id for _, _, _, livro_id in validas}
+    alunos, livros, ativos = await asyncio.gather(
+        _ids_existentes(Aluno, aluno_ids),
+        _ids_existentes(Livro, livro_ids),
+        _pares_ativos(aluno_ids, livro_ids),
+    )
+
+    documentos: List[Tuple[int, Emprestimo]] = []
+    for numero, dados, aluno_id, livro_id in validas:
+        if aluno_id not in alunos:
+            erros.append(BulkErro(linha=numero, erro="Aluno não encontrado"))
+            continue
+        if livro_id not in livros:
+            erros.append(BulkErro(linha=numero, erro="Livro não encontrado"))
+            continue
+        if dados.data_devolucao is None:
+            if (aluno_id, livro_id) in ativos:
+                erros.append(BulkErro(linha=numero, erro=ERRO_EMPRESTIMO_ATIVO))
+                continue
+            ativos.add((aluno_id, livro_id))
+
+        documentos.append((numero, Emprestimo(
+            aluno=DBRef(Aluno.get_collection_name(), aluno_id),
+            livro=DBRef(Livro.get_collection_name(), livro_id),
+            data_emprestimo=dados.data_emprestimo,
+            data_devolucao_prevista=dados.data_devolucao_prevista,
+            data_devolucao=dados.data_devolucao
+        )))
+
+    return documentos, erros
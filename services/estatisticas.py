@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from models.aluno import Aluno
+from models.autor import Autor
+from models.livro import Livro
+from models.emprestimo import Emprestimo
+from models.estatisticas import Estatisticas, RESUMO_ID
+from services.tarefas import tarefa
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre reconciliações completas do resumo (segundos)
+INTERVALO_RECONCILIACAO = int(os.getenv("ESTATISTICAS_RECONCILIACAO_SEGUNDOS", "300"))
+
+
+def _inicio_do_dia(dia: date) -> datetime:
+    """Datas são gravadas como datetime à meia-noite; pipelines crus precisam do mesmo formato."""
+    return datetime.combine(dia, time.min)
+
+
+# Atualização incremental (chamada pelas rotas de escrita)
+
+async def incrementar(**delta: int) -> None:
+    """Aplica um $inc atômico no documento de resumo."""
+    delta = {campo: valor for campo, valor in delta.items() if valor}
+    if not delta:
+        return
+    await Estatisticas.get_pymongo_collection().update_one(
+        {"_id": RESUMO_ID},
+        {"$inc": delta},
+        upsert=True,
+    )
+
+
+def contribuicao_emprestimo(emprestimo: Emprestimo) -> Dict[str, int]:
+    """Quanto um empréstimo soma em cada contador do resumo."""
+    ativo = emprestimo.data_devolucao is None
+    atrasado = ativo and emprestimo.status == "atrasado"
+    return {
+        "total_emprestimos": 1,
+        "emprestimos_ativos": int(ativo),
+        "emprestimos_atrasados": int(atrasado),
+    }
+
+
+async def registrar_emprestimo(emprestimo: Emprestimo, sinal: int = 1) -> None:
+    """Soma (sinal=1) ou subtrai (sinal=-1) um empréstimo dos contadores."""
+    await registrar_emprestimos([emprestimo], sinal)
+
+
+async def registrar_emprestimos(emprestimos: List[Emprestimo], sinal: int = 1) -> None:
+    """Versão em lote de `registrar_emprestimo`: um único $inc para todos."""
+    delta: Dict[str, int] = defaultdict(int)
+    for emprestimo in emprestimos:
+        for campo, valor in contribuicao_emprestimo(emprestimo).items():
+            delta[campo] += sinal * valor
+    await incrementar(**delta)
+
+
+async def atualizar_emprestimo(antes: Dict[str, int], depois: Emprestimo) -> None:
+    """Aplica a diferença entre a contribuição antiga e a nova de um empréstimo."""
+    nova = contribuicao_emprestimo(depois)
+    await incrementar(**{campo: nova[campo] - antes.get(campo, 0) for campo in nova})
+
+
+# Cálculo completo
+
+async def _estatisticas_emprestimos() -> Dict[str, Any]:
+    """Calcula todos os números de empréstimos em um único pipeline $facet."""
+    def _mais_frequente(campo: str, colecao: str, atributo: str):
+        return [
+            {"$group": {"_id": f"${campo}.$id", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+            {"$limit": 1},
+            {"$lookup": {
+                "from": colecao,
+                "localField": "_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {atributo: 1}}],
+                "as": "doc",
+            }},
+            {"$project": {"_id": 0, "valor": {"$arrayElemAt": [f"$doc.{atributo}", 0]}}},
+        ]
+
+    pipeline = [
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "ativos": [{"$match": {"data_devolucao": None}}, {"$count": "n"}],
+            "atrasados": [{"$match": {"status": "atrasado"}}, {"$count": "n"}],
+            "livro": _mais_frequente("livro", Livro.get_collection_name(), "titulo"),
+            "aluno": _mais_frequente("aluno", Aluno.get_collection_name(), "nome"),
+        }}
+    ]
+    resultado = (await Emprestimo.aggregate(pipeline).to_list())[0]
+
+    def _contagem(chave: str) -> int:
+        return resultado[chave][0]["n"] if resultado[chave] else 0
+
+    def _valor(chave: str) -> Optional[str]:
+        return resultado[chave][0].get("valor") if resultado[chave] else None
+
+    return {
+        "total_emprestimos": _contagem("total"),
+        "emprestimos_ativos": _contagem("ativos"),
+        "emprestimos_atrasados": _contagem("atrasados"),
+        "livro_mais_emprestado": _valor("livro"),
+        "aluno_mais_ativo": _valor("aluno"),
+    }
+
+
+async def calcular_estatisticas() -> Dict[str, Any]:
+    """Recalcula as estatísticas a partir das coleções, com as consultas em paralelo."""
+    total_alunos, total_autores, total_livros, emprestimos = await asyncio.gather(
+        Aluno.count(),
+        Autor.count(),
+        Livro.count(),
+        _estatisticas_emprestimos(),
+    )
+    return {
+        "total_alunos": total_alunos,
+        "total_autores": total_autores,
+        "total_livros": total_livros,
+        **emprestimos,
+    }
+
+
+@tarefa("reconciliar_estatisticas")
+async def reconciliar() -> Dict[str, Any]:
+    """Recalcula o resumo e sobrescreve o documento, corrigindo qualquer divergência."""
+    dados = await calcular_estatisticas()
+    dados["atualizado_em"] = datetime.now()
+    await Estatisticas.get_pymongo_collection().update_one(
+        {"_id": RESUMO_ID},
+        {"$set": dados},
+        upsert=True,
+    )
+    return dados
+
+
+async def ler_resumo() -> Dict[str, Any]:
+    """Lê o resumo pré-calculado (uma leitura por _id); reconcilia se ainda não existir."""
+    resumo = await Estatisticas.get(RESUMO_ID)
+    if resumo is None or resumo.atualizado_em is None:
+        return await reconciliar()
+    return resumo.model_dump()
+
+
+async def loop_reconciliacao() -> None:
+    """Tarefa de fundo iniciada no lifespan: reconcilia o resumo periodicamente."""
+    while True:
+        try:
+            await reconciliar()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha ao reconciliar estatísticas")
+        await asyncio.sleep(INTERVALO_RECONCILIACAO)
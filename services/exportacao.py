@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, time
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, Optional, Type
+from beanie import Document
+from bson import DBRef, ObjectId
+from fastapi.responses import StreamingResponse
+
+# Documentos trazidos do servidor por lote do cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Linhas acumuladas antes de enviar um pedaço da resposta
+LINHAS_POR_PEDACO = 500
+
+FormatoExportacao = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Colunas exportadas por recurso: nome de saída -> caminho no documento
+CAMPOS_ALUNO = {"id": "_id", "nome": "nome", "matricula": "matricula", "curso": "curso", "email": "email"}
+CAMPOS_AUTOR = {"id": "_id", "nome": "nome", "nacionalidade": "nacionalidade", "ano_nascimento": "ano_nascimento"}
+CAMPOS_LIVRO = {"id": "_id", "titulo": "titulo", "ano": "ano", "isbn": "isbn", "categoria": "categoria"}
+CAMPOS_EMPRESTIMO = {
+    "id": "_id",
+    "data_emprestimo": "data_emprestimo",
+    "data_devolucao_prevista": "data_devolucao_prevista",
+    "data_devolucao": "data_devolucao",
+    "status": "status",
+    "aluno_id": "aluno",
+    "livro_id": "livro",
+}
+
+
+def _valor(valor: Any) -> Any:
+    """Converte tipos do BSON para valores serializáveis em JSON/CSV."""
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, DBRef):
+        return str(valor.id)
+    if isinstance(valor, datetime):
+        # Datas do modelo são gravadas como datetime à meia-noite
+        return valor.date().isoformat() if valor.time() == time.min else valor.isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return valor
+
+
+def _linha(doc: Dict[str, Any], campos: Dict[str, str]) -> Dict[str, Any]:
+    """Monta a linha de saída; `campos` mapeia nome de saída -> caminho no documento."""
+    linha = {}
+    for saida, caminho in campos.items():
+        valor = doc
+        for parte in caminho.split("."):
+            valor = valor.get(parte) if isinstance(valor, dict) else None
+            if valor is None:
+                break
+        linha[saida] = _valor(valor)
+    return linha
+
+
+async def _ndjson(cursor, campos: Dict[str, str]) -> AsyncIterator[str]:
+    pedaco: List[str] = []
+    async for doc in cursor:
+        pedaco.append(json.dumps(_linha(doc, campos), ensure_ascii=False))
+        if len(pedaco) >= LINHAS_POR_PEDACO:
+            yield "\n".join(pedaco) + "\n"
+            pedaco = []
+    if pedaco:
+        yield "\n".join(pedaco) + "\n"
+
+
+async def _csv(cursor, campos: Dict[str, str]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(campos))
+    writer.writeheader()
+    linhas = 0
+    async for doc in cursor:
+        writer.writerow(_linha(doc, campos))
+        linhas += 1
+        if linhas >= LINHAS_POR_PEDACO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            linhas = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def filtro_emprestimos(
+    status: Optional[str] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+) -> Dict[str, Any]:
+    """Filtro cru dos empréstimos exportados (status e intervalo de data_emprestimo)."""
+    filtro: Dict[str, Any] = {}
+    if status == "ativo":
+        filtro["data_devolucao"] = None
+    elif status == "atrasado":
+        filtro["status"] = "atrasado"
+    elif status == "devolvido":
+        filtro["data_devolucao"] = {"$ne": None}
+
+    intervalo = {}
+    if data_inicio is not None:
+        intervalo["$gte"] = datetime.combine(data_inicio, time.min)
+    if data_fim is not None:
+        intervalo["$lte"] = datetime.combine(data_fim, time.min)
+    if intervalo:
+        filtro["data_emprestimo"] = intervalo
+    return filtro
+
+
+def exportar(
+    model: Type[Document],
+    campos: Dict[str, str],
+    formato: FormatoExportacao,
+    filtro: Optional[Dict[str, Any]] = None,
+) -> StreamingResponse:
+    """
+    Transmite a coleção de `model` como NDJSON ou CSV.
+
+    Itera o cursor do servidor em lotes de EXPORT_BATCH_SIZE, com memória
+    constante independentemente do tamanho da coleção.
+    """
+    projection = {caminho.split(".")[0]: 1 for caminho in campos.values()}
+    cursor = model.get_pymongo_collection().find(
+        filtro or {},
+        projection,
+        batch_size=EXPORT_BATCH_SIZE,
+    )
+    gerador: Callable = _ndjson if formato == "ndjson" else _csv
+    nome_arquivo = f"{model.get_collection_name()}.{formato}"
+    return StreamingResponse(
+        gerador(cursor, campos),
+        media_type=MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'},
+    )
@@ -0,0 +1,60 @@
+import os
+from typing import Any, Callable, Dict, Iterable, List
+from beanie import Document, PydanticObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Query
+from services.carregador import carregador
+
+# Máximo de ids por requisição (GET ou POST)
+LOTE_MAX_IDS = int(os.getenv("LOTE_MAX_IDS", "1000"))
+
+
+def validar_ids(valores: Iterable[str]) -> List[PydanticObjectId]:
+    """
+    Converte os ids recebidos, sem repetições e na ordem em que foram pedidos.
+    Ids malformados ou listas acima de LOTE_MAX_IDS resultam em 400.
+    """
+    ids: Dict[PydanticObjectId, None] = {}
+    for valor in valores:
+        valor = valor.strip()
+        if not valor:
+            continue
+        try:
+            ids[PydanticObjectId(valor)] = None
+        except InvalidId:
+            raise HTTPException(status_code=400, detail=f"Id inválido: {valor}")
+    if not ids:
+        raise HTTPException(status_code=400, detail="Informe ao menos um id")
+    if len(ids) > LOTE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {LOTE_MAX_IDS} ids por requisição")
+    return list(ids)
+
+
+def ids_da_query(
+    ids: str = Query(..., description="Ids separados por vírgula (use o POST para listas longas)"),
+) -> List[PydanticObjectId]:
+    """Dependência das rotas GET /lote."""
+    return validar_ids(ids.split(","))
+
+
+def montar_lote(
+    ids: List[PydanticObjectId],
+    documentos: Iterable[Dict[str, Any]],
+    para_dict: Callable[[Dict[str, Any]], Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Ordena os documentos encontrados conforme `ids` e lista os ausentes."""
+    por_id = {doc["_id"]: doc for doc in documentos}
+    return {
+        "itens": [para_dict(por_id[i]) for i in ids if i in por_id],
+        "nao_encontrados": [str(i) for i in ids if i not in por_id],
+    }
+
+
+async def buscar_lote(
+    model: type[Document],
+    ids: List[PydanticObjectId],
+    para_dict: Callable[[Dict[str, Any]], Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Lê todos os `ids` com o carregador da requisição (uma única consulta $in)."""
+    documentos = await carregador(model).carregar_varios(ids)
+    return montar_lote(ids, [doc for doc in documentos if doc is not None], para_dict)
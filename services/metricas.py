@@ -0,0 +1,263 @@
+import bisect
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import Request
+from pymongo import monitoring
+from services.pool import BUCKETS_CHECKOUT, metricas_pool
+
+# Comandos emitidos fora de uma requisição (tarefas de fundo, inicialização)
+ROTA_FORA_DE_REQUISICAO = "-"
+# Requisições que não casaram com nenhuma rota (404, 405)
+ROTA_DESCONHECIDA = "<sem rota>"
+
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_MONGO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+Rotulos = Tuple[str, ...]
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(nomes: Iterable[str], valores: Iterable[str], extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+# Tipos de métrica (formato texto do Prometheus)
+
+class Contador:
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...]):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, rotulos
+        self.valores: Dict[Rotulos, float] = defaultdict(float)
+
+    def inc(self, *rotulos: str, valor: float = 1) -> None:
+        self.valores[rotulos] += valor
+
+    def renderizar(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        for rotulos, valor in sorted(self.valores.items()):
+            linhas.append(f"{self.nome}{_rotulos(self.rotulos, rotulos)} {_numero(valor)}")
+        return linhas
+
+
+class Medidor(Contador):
+    def dec(self, *rotulos: str, valor: float = 1) -> None:
+        self.valores[rotulos] -= valor
+
+    def set(self, *rotulos: str, valor: float) -> None:
+        self.valores[rotulos] = valor
+
+    def renderizar(self) -> List[str]:
+        linhas = super().renderizar()
+        linhas[1] = f"# TYPE {self.nome} gauge"
+        return linhas
+
+
+class Histograma:
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.nome, self.ajuda, self.rotulos, self.buckets = nome, ajuda, rotulos, buckets
+        # Por série: contagens por bucket (não cumulativas, +Inf no fim) e soma
+        self.series: Dict[Rotulos, Tuple[List[int], List[float]]] = {}
+
+    def observar(self, *rotulos: str, valor: float) -> None:
+        serie = self.series.get(rotulos)
+        if serie is None:
+            serie = self.series[rotulos] = ([0] * (len(self.buckets) + 1), [0.0])
+        contagens, soma = serie
+        contagens[bisect.bisect_left(self.buckets, valor)] += 1
+        soma[0] += valor
+
+    def renderizar(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        for rotulos, (contagens, soma) in sorted(self.series.items()):
+            linhas += _linhas_histograma(self.nome, self.rotulos, rotulos, self.buckets, contagens, soma[0])
+        return linhas
+
+
+def _linhas_histograma(nome, nomes_rotulos, rotulos, buckets, contagens, soma) -> List[str]:
+    linhas = []
+    acumulado = 0
+    for limite, contagem in zip((*buckets, float("inf")), contagens):
+        acumulado += contagem
+        le = "+Inf" if limite == float("inf") else _numero(limite)
+        extra = f'le="{le}"'
+        linhas.append(f"{nome}_bucket{_rotulos(nomes_rotulos, rotulos, extra)} {acumulado}")
+    linhas.append(f"{nome}_sum{_rotulos(nomes_rotulos, rotulos)} {_numero(soma)}")
+    linhas.append(f"{nome}_count{_rotulos(nomes_rotulos, rotulos)} {acumulado}")
+    return linhas
+
+
+# Métricas HTTP
+
+http_requisicoes = Contador(
+    "http_requests_total", "Requisições HTTP atendidas.", ("method", "route", "status"))
+http_latencia = Histograma(
+    "http_request_duration_seconds", "Latência das requisições HTTP.", ("method", "route"), BUCKETS_HTTP)
+http_em_andamento = Medidor(
+    "http_requests_in_flight", "Requisições HTTP em andamento.", ("method", "route"))
+
+# Métricas do Mongo
+
+mongo_latencia = Histograma(
+    "mongo_command_duration_seconds",
+    "Latência dos comandos do Mongo por rota de origem, coleção e comando.",
+    ("route", "collection", "command"),
+    BUCKETS_MONGO,
+)
+mongo_falhas = Contador(
+    "mongo_command_failures_total",
+    "Comandos do Mongo que falharam.",
+    ("route", "collection", "command"),
+)
+
+
+def _colecao(comando: dict, nome_comando: str) -> str:
+    """Coleção alvo: o valor da primeira chave do comando (ex.: {"find": "livros"})."""
+    alvo = comando.get(nome_comando)
+    return alvo if isinstance(alvo, str) else ""
+
+
+class MetricasComandos(monitoring.CommandListener):
+    """
+    Mede cada comando enviado ao Mongo e o rotula com a rota HTTP de origem.
+
+    O pymongo assíncrono chama os listeners na mesma task que executa a
+    operação, então `rota_atual()` ainda devolve a rota da requisição.
+    """
+
+    def __init__(self):
+        # (conexão, request_id) -> (rota, coleção) dos comandos em andamento
+        self._pendentes: Dict[tuple, Tuple[str, str]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self._pendentes[(event.connection_id, event.request_id)] = (
+            rota_atual(),
+            _colecao(event.command, event.command_name),
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        rota, colecao = self._pendentes.pop((event.connection_id, event.request_id), (rota_atual(), ""))
+        mongo_latencia.observar(rota, colecao, event.command_name, valor=event.duration_micros / 1_000_000)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        rota, colecao = self._pendentes.pop((event.connection_id, event.request_id), (rota_atual(), ""))
+        mongo_latencia.observar(rota, colecao, event.command_name, valor=event.duration_micros / 1_000_000)
+        mongo_falhas.inc(rota, colecao, event.command_name)
+
+
+metricas_comandos = MetricasComandos()
+
+
+# Rota da requisição em andamento
+
+class _RotaRequisicao:
+    """Estado por requisição, criado pelo middleware e preenchido após o roteamento."""
+
+    __slots__ = ("metodo", "rota", "contada")
+
+    def __init__(self, metodo: str):
+        self.metodo = metodo
+        self.rota = ROTA_DESCONHECIDA
+        self.contada = False
+
+
+_requisicao: ContextVar[Optional[_RotaRequisicao]] = ContextVar("requisicao_metricas", default=None)
+
+
+def rota_atual() -> str:
+    """Template da rota em andamento (ex.: "/livros/{livro_id}"), usado como rótulo."""
+    requisicao = _requisicao.get()
+    return requisicao.rota if requisicao is not None else ROTA_FORA_DE_REQUISICAO
+
+
+async def registrar_rota(request: Request) -> None:
+    """
+    Dependência global do app: roda depois do roteamento e antes da rota, então
+    os comandos do Mongo emitidos pela rota já saem com o template como rótulo.
+    """
+    requisicao = _requisicao.get()
+    route = request.scope.get("route")
+    if requisicao is None or route is None:
+        return
+    requisicao.rota = route.path
+    requisicao.contada = True
+    http_em_andamento.inc(requisicao.metodo, requisicao.rota)
+
+
+# Middleware
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que mede a latência e o status de cada requisição, rotulados
+    pelo template da rota (e não pelo caminho com os ids).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requisicao = _RotaRequisicao(scope["method"])
+        status = 500
+
+        async def send_com_status(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        token = _requisicao.set(requisicao)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_com_status)
+        finally:
+            http_latencia.observar(requisicao.metodo, requisicao.rota, valor=time.perf_counter() - inicio)
+            http_requisicoes.inc(requisicao.metodo, requisicao.rota, str(status))
+            if requisicao.contada:
+                http_em_andamento.dec(requisicao.metodo, requisicao.rota)
+            _requisicao.reset(token)
+
+
+# Exposição
+
+def _metricas_pool() -> List[str]:
+    pool = metricas_pool
+    gauges = [
+        ("mongo_pool_connections_open", "Conexões abertas no pool.", pool.abertas),
+        ("mongo_pool_connections_checked_out", "Conexões em uso.", pool.em_uso),
+        ("mongo_pool_wait_queue_length", "Operações aguardando uma conexão do pool.", pool.aguardando),
+    ]
+    linhas = []
+    for nome, ajuda, valor in gauges:
+        linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} gauge", f"{nome} {valor}"]
+
+    nome = "mongo_pool_checkout_failures_total"
+    linhas += [f"# HELP {nome} Checkouts que falharam, por motivo.", f"# TYPE {nome} counter"]
+    linhas += [f"{nome}{_rotulos(('reason',), (motivo,))} {total}" for motivo, total in sorted(pool.falhas.items())]
+
+    nome = "mongo_pool_checkout_duration_seconds"
+    linhas += [f"# HELP {nome} Tempo para obter uma conexão do pool.", f"# TYPE {nome} histogram"]
+    linhas += _linhas_histograma(nome, (), (), BUCKETS_CHECKOUT, pool.latencia_buckets, pool.latencia_soma)
+    return linhas
+
+
+def renderizar_metricas() -> str:
+    """Todas as métricas no formato texto de exposição do Prometheus."""
+    linhas: List[str] = []
+    for metrica in (http_requisicoes, http_latencia, http_em_andamento, mongo_latencia, mongo_falhas):
+        linhas += metrica.renderizar()
+    linhas += _metricas_pool()
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,465 @@
+import asyncio
+import logging
+import os
+import socket
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, monitoring
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+from models.aluno import Aluno
+from models.autor import Autor
+from models.autoria import Autoria, id_autoria, par_da_autoria
+from models.emprestimo import Emprestimo
+from models.livro import Livro
+from services.busca import indice_livros
+from services.cache import cache_entidades
+from services.ranking import descartar_ranking
+from services.tarefas import fila_tarefas
+
+logger = logging.getLogger(__name__)
+
+# "auto" (change stream se houver replica set, senão polling), "change_stream", "polling" ou "desligado"
+OBSERVADOR_MODO = os.getenv("OBSERVADOR_MODO", "auto")
+# Espera máxima por eventos / intervalo do polling (segundos)
+OBSERVADOR_INTERVALO = float(os.getenv("OBSERVADOR_INTERVALO", "2"))
+# Eventos aplicados de uma vez
+OBSERVADOR_LOTE = int(os.getenv("OBSERVADOR_LOTE", "500"))
+# Identifica o resume token salvo (o mesmo para todos os workers da API)
+OBSERVADOR_NOME = os.getenv("OBSERVADOR_NOME", "api")
+# Intervalo mínimo entre gravações do resume token (segundos)
+OBSERVADOR_SALVAR_TOKEN = float(os.getenv("OBSERVADOR_SALVAR_TOKEN", "5"))
+# Tamanho da coleção capped usada no polling (MB)
+OBSERVADOR_JOURNAL_MB = int(os.getenv("OBSERVADOR_JOURNAL_MB", "16"))
+# Change stream: por quanto tempo uma escrita deste processo espera o seu evento (segundos)
+OBSERVADOR_PROPRIOS_SEGUNDOS = float(os.getenv("OBSERVADOR_PROPRIOS_SEGUNDOS", "60"))
+
+COLECAO_TOKENS = "observador"
+COLECAO_JOURNAL = "invalidacoes"
+
+# Folga na leitura do journal para gravações de outros processos que chegam
+# com um relógio um pouco atrasado (as repetidas são descartadas pelo _id)
+MARGEM_POLLING = timedelta(seconds=5)
+
+# Código do servidor quando o resume token já saiu do oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Operações que não identificam os documentos afetados
+OPERACOES_COLECAO = {"drop", "rename", "dropDatabase", "invalidate"}
+
+# (coleção, operação, _id ou None se desconhecido, documento completo se disponível)
+Evento = Tuple[str, str, Optional[ObjectId], Optional[Dict[str, Any]]]
+
+
+def _ids_do_filtro(filtro: Any, autoria: bool = False) -> Optional[List[Any]]:
+    """
+    Ids de um filtro {_id: x} ou {_id: {$in: [...]}} (ou, em `autorias`, pelo
+    par {livro_id, autor_id}); None se o filtro não identificar os documentos.
+    """
+    if not isinstance(filtro, dict):
+        return None
+    valor = filtro.get("_id")
+    if isinstance(valor, dict):
+        return list(valor["$in"]) if isinstance(valor.get("$in"), list) else None
+    if valor is not None:
+        return [valor]
+    if autoria and isinstance(filtro.get("livro_id"), ObjectId) and isinstance(filtro.get("autor_id"), ObjectId):
+        return [id_autoria(filtro["livro_id"], filtro["autor_id"])]
+    return None
+
+
+class ObservadorMudancas(monitoring.CommandListener):
+    """
+    Mantém os caches em memória de cada processo coerentes com as escritas
+    feitas pelos outros workers da API.
+
+    Com replica set, assina um change stream do banco filtrado pelas coleções
+    observadas e grava o resume token em `observador` para retomar de onde
+    parou. Em um mongod isolado, cai para o polling: como listener de
+    comandos, anota os ids escritos por este processo, publica-os na coleção
+    capped `invalidacoes` e lê a cada OBSERVADOR_INTERVALO o que os outros
+    publicaram.
+
+    Em ambos os modos os eventos invalidam o cache de entidades, descartam o
+    ranking e atualizam o índice de busca. As escritas do próprio processo já
+    foram aplicadas pelas rotas e são ignoradas: no polling pela origem; no
+    change stream pelos _ids que o listener viu este processo gravar.
+
+    Para testar localmente com change streams, basta um replica set de um nó:
+    `mongod --replSet rs0` seguido de `rs.initiate()` no mongosh, com
+    `?replicaSet=rs0` (ou `directConnection=true`) na DATABASE_URL.
+    """
+
+    def __init__(self, modo: str):
+        self.modo_configurado = modo
+        self.modo: Optional[str] = None
+        self.origem = f"{socket.gethostname()}:{os.getpid()}:{ObjectId()}"
+        self._db = None
+        self._colecoes: Dict[str, type] = {}
+        self._tarefa: Optional[asyncio.Task] = None
+        self._token_salvo_em = datetime.min
+        # Polling: ids escritos por este processo ainda não publicados
+        self._saida: List[Dict[str, Any]] = []
+        self._visto_ate: Optional[datetime] = None
+        self._vistos: deque = deque(maxlen=10_000)
+        self._vistos_set: Set[ObjectId] = set()
+        # Change stream: escritas deste processo aguardando a resposta do servidor
+        # (por request_id) e, confirmadas, aguardando o seu evento
+        self._escritas_em_curso: Dict[int, List[Tuple[str, Any]]] = {}
+        self._proprios: Dict[Tuple[str, Any], deque] = {}
+        self.eventos_aplicados = 0
+        self.eventos_proprios = 0
+
+    # Ciclo de vida (lifespan)
+
+    async def iniciar(self) -> None:
+        await self.preparar()
+        if self.modo == "desligado":
+            return
+        if self.modo == "polling":
+            self._tarefa = asyncio.create_task(self._loop_polling())
+        else:
+            self._tarefa = asyncio.create_task(self._loop_change_stream())
+        logger.info("Observador de mudanças iniciado em modo %s", self.modo)
+
+    async def preparar(self) -> None:
+        """Escolhe o modo e prepara o journal, sem iniciar o loop (usado também nos testes)."""
+        self._db = Livro.get_pymongo_collection().database
+        self._colecoes = {model.get_collection_name(): model for model in (Aluno, Autor, Autoria, Emprestimo, Livro)}
+        self.modo = await self._escolher_modo()
+        if self.modo == "polling":
+            await self._preparar_journal()
+
+    async def parar(self) -> None:
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+        self.modo = None
+
+    async def _escolher_modo(self) -> str:
+        if self.modo_configurado != "auto":
+            return self.modo_configurado
+        hello = await self._db.client.admin.command("hello")
+        if "setName" in hello or hello.get("msg") == "isdbgrid":
+            return "change_stream"
+        logger.warning("MongoDB sem replica set: invalidação entre processos por polling")
+        return "polling"
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "modo": self.modo,
+            "origem": self.origem,
+            "eventos_aplicados": self.eventos_aplicados,
+            "eventos_proprios_ignorados": self.eventos_proprios,
+            "pendentes_publicacao": len(self._saida),
+        }
+
+    # Aplicação dos eventos (comum aos dois modos)
+
+    async def _aplicar(self, eventos: List[Evento]) -> None:
+        livros = self._colecao(Livro)
+        autores = self._colecao(Autor)
+        recarregar: Dict[str, Set[ObjectId]] = defaultdict(set)
+        ranking = reconstruir = limpar_cache = False
+
+        for colecao, operacao, documento_id, doc in eventos:
+            model = self._colecoes.get(colecao)
+            if model is None:
+                continue
+            if colecao in (livros, self._colecao(Emprestimo)):
+                ranking = True
+
+            if documento_id is None or operacao in OPERACOES_COLECAO:
+                limpar_cache = True
+                reconstruir = reconstruir or colecao in (livros, autores, self._colecao(Autoria))
+                continue
+
+            if model is Autoria:
+                # O par vem do próprio _id; arestas antigas (ObjectId) só o trazem no documento
+                par = par_da_autoria(documento_id) or (doc and (doc["livro_id"], doc["autor_id"]))
+                if not par:
+                    reconstruir = True
+                    continue
+                livro_id, autor_id = par
+                if operacao == "delete":
+                    indice_livros.desvincular(livro_id, autor_id)
+                else:
+                    indice_livros.vincular(livro_id, autor_id)
+                cache_entidades.invalidar(Livro, livro_id)
+                cache_entidades.invalidar(Autor, autor_id)
+                continue
+
+            cache_entidades.invalidar(model, documento_id)
+            if colecao not in (livros, autores):
+                continue
+            if operacao == "delete":
+                if model is Livro:
+                    indice_livros.remover_livro(documento_id)
+                else:
+                    indice_livros.remover_autor(documento_id)
+            elif doc is not None:
+                self._sincronizar(model, doc)
+            else:
+                recarregar[colecao].add(documento_id)
+
+        # Atualizações sem o documento completo: uma consulta $in por coleção
+        for colecao, ids in recarregar.items():
+            model = self._colecoes[colecao]
+            projection = {"titulo": 1, "categoria": 1, "autores": 1} if model is Livro else {"nome": 1}
+            encontrados = set()
+            async for doc in model.get_pymongo_collection().find({"_id": {"$in": list(ids)}}, projection):
+                encontrados.add(doc["_id"])
+                self._sincronizar(model, doc)
+            for documento_id in ids - encontrados:
+                if model is Livro:
+                    indice_livros.remover_livro(documento_id)
+                else:
+                    indice_livros.remover_autor(documento_id)
+
+        if limpar_cache:
+            cache_entidades.limpar()
+        if ranking:
+            # Só descarta: o recálculo fica com a próxima leitura (ou com o worker que escreveu)
+            descartar_ranking()
+        if reconstruir:
+            await fila_tarefas.enfileirar("reconstruir_indice_busca", chave="reconstruir_indice_busca")
+        self.eventos_aplicados += len(eventos)
+
+    def _colecao(self, model: type) -> str:
+        return model.get_collection_name()
+
+    @staticmethod
+    def _sincronizar(model: type, doc: Dict[str, Any]) -> None:
+        if model is Livro:
+            indice_livros.sincronizar_livro(doc)
+        else:
+            indice_livros.sincronizar_autor(doc)
+
+    async def _resincronizar(self) -> None:
+        """Eventos perdidos: descarta todos os caches e reconstrói o índice."""
+        cache_entidades.limpar()
+        descartar_ranking()
+        await fila_tarefas.enfileirar("reconstruir_indice_busca", chave="reconstruir_indice_busca")
+
+    # Change stream
+
+    async def _loop_change_stream(self) -> None:
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": list(self._colecoes)}}},
+            {"$project": {"operationType": 1, "ns": 1, "documentKey": 1, "fullDocument": 1}},
+        ]
+        token = await self._carregar_token()
+        while True:
+            try:
+                async with await self._db.watch(
+                    pipeline,
+                    resume_after=token,
+                    max_await_time_ms=int(OBSERVADOR_INTERVALO * 1000),
+                ) as stream:
+                    while stream.alive:
+                        lote = []
+                        evento = await stream.try_next()
+                        while evento is not None:
+                            evento = self._evento_change_stream(evento)
+                            if not self._proprio(evento):
+                                lote.append(evento)
+                            if len(lote) >= OBSERVADOR_LOTE:
+                                break
+                            evento = await stream.try_next()
+                        if lote:
+                            await self._aplicar(lote)
+                        token = stream.resume_token
+                        await self._salvar_token(token)
+                # Stream invalidado (ex.: banco removido): recomeça do ponto atual
+                token = None
+                await self._resincronizar()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Resume token fora do oplog: recomeçando o change stream e descartando os caches")
+                    token = None
+                    await self._resincronizar()
+                else:
+                    logger.exception("Falha no change stream")
+                    await asyncio.sleep(OBSERVADOR_INTERVALO)
+            except Exception:
+                logger.exception("Falha no change stream")
+                await asyncio.sleep(OBSERVADOR_INTERVALO)
+
+    @staticmethod
+    def _evento_change_stream(evento: Dict[str, Any]) -> Evento:
+        chave = evento.get("documentKey") or {}
+        return (
+            (evento.get("ns") or {}).get("coll", ""),
+            evento["operationType"],
+            chave.get("_id"),
+            evento.get("fullDocument"),
+        )
+
+    def _proprio(self, evento: Evento) -> bool:
+        """Consome a escrita deste processo que gerou `evento`, se houver uma pendente."""
+        colecao, operacao, documento_id, _ = evento
+        if documento_id is None or operacao in OPERACOES_COLECAO:
+            return False
+        instantes = self._proprios.get((colecao, documento_id))
+        if not instantes:
+            return False
+        limite = datetime.now() - timedelta(seconds=OBSERVADOR_PROPRIOS_SEGUNDOS)
+        while instantes and instantes[0] < limite:
+            instantes.popleft()
+        proprio = bool(instantes)
+        if proprio:
+            instantes.popleft()
+            self.eventos_proprios += 1
+        if not instantes:
+            del self._proprios[(colecao, documento_id)]
+        return proprio
+
+    async def _carregar_token(self) -> Optional[Dict[str, Any]]:
+        doc = await self._db[COLECAO_TOKENS].find_one({"_id": OBSERVADOR_NOME})
+        return doc.get("token") if doc else None
+
+    async def _salvar_token(self, token: Optional[Dict[str, Any]]) -> None:
+        agora = datetime.now()
+        if token is None or (agora - self._token_salvo_em).total_seconds() < OBSERVADOR_SALVAR_TOKEN:
+            return
+        self._token_salvo_em = agora
+        try:
+            await self._db[COLECAO_TOKENS].update_one(
+                {"_id": OBSERVADOR_NOME},
+                {"$set": {"token": token, "atualizado_em": agora}},
+                upsert=True,
+            )
+        except PyMongoError:
+            logger.exception("Falha ao salvar o resume token")
+
+    # Escritas deste processo (listener de comandos)
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if self.modo not in ("polling", "change_stream") or event.database_name != self._db.name:
+            return
+        nome = event.command_name
+        colecao = event.command.get(nome)
+        if colecao not in self._colecoes:
+            return
+
+        autoria = colecao == self._colecao(Autoria)
+        if nome == "insert":
+            escritas = [("insert", [doc.get("_id") for doc in event.command.get("documents", [])])]
+        elif nome == "update":
+            escritas = [("update", _ids_do_filtro(u.get("q"), autoria)) for u in event.command.get("updates", [])]
+        elif nome == "delete":
+            escritas = [("delete", _ids_do_filtro(d.get("q"), autoria)) for d in event.command.get("deletes", [])]
+        elif nome == "findAndModify":
+            operacao = "delete" if event.command.get("remove") else "update"
+            escritas = [(operacao, _ids_do_filtro(event.command.get("query"), autoria))]
+        else:
+            return
+
+        if self.modo == "change_stream":
+            self._anotar_escrita(event, colecao, escritas)
+            return
+
+        agora = datetime.now()
+        for operacao, ids in escritas:
+            for documento_id in ids if ids is not None else [None]:
+                self._saida.append({
+                    "origem": self.origem,
+                    "colecao": colecao,
+                    "operacao": operacao,
+                    "documento_id": documento_id,
+                    "criada_em": agora,
+                })
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        chaves = self._escritas_em_curso.pop(event.request_id, None)
+        if chaves is None:
+            return
+        resposta = event.reply
+        if event.command_name == "update":
+            gravados = resposta.get("nModified", 0) + len(resposta.get("upserted", ()))
+        else:
+            gravados = resposta.get("n", 0)
+        # Só espera eventos quando cada id anotado gerou exatamente uma escrita
+        if gravados != len(chaves) or resposta.get("writeErrors"):
+            return
+        agora = datetime.now()
+        for chave in chaves:
+            self._proprios.setdefault(chave, deque()).append(agora)
+        if len(self._proprios) > 10_000:
+            limite = agora - timedelta(seconds=OBSERVADOR_PROPRIOS_SEGUNDOS)
+            self._proprios = {chave: instantes for chave, instantes in self._proprios.items() if instantes[-1] >= limite}
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._escritas_em_curso.pop(event.request_id, None)
+
+    def _anotar_escrita(self, event: monitoring.CommandStartedEvent, colecao: str, escritas: List[Tuple[str, Optional[List[Any]]]]) -> None:
+        """
+        Change stream: guarda os _ids de uma escrita até a resposta. Ficam de
+        fora as escritas sem ids conhecidos, as de findAndModify (a resposta
+        não diz se algo mudou) e as de transações (podem ser abortadas).
+        """
+        if event.command_name == "findAndModify" or event.command.get("autocommit") is False:
+            return
+        chaves = []
+        for _, ids in escritas:
+            if ids is None:
+                return
+            chaves.extend((colecao, documento_id) for documento_id in ids)
+        if chaves:
+            self._escritas_em_curso[event.request_id] = chaves
+
+    # Polling (mongod sem replica set)
+
+    async def _preparar_journal(self) -> None:
+        try:
+            await self._db.create_collection(COLECAO_JOURNAL, capped=True, size=OBSERVADOR_JOURNAL_MB * 1024 * 1024)
+        except CollectionInvalid:
+            pass
+        await self._db[COLECAO_JOURNAL].create_index([("criada_em", ASCENDING)], name="criada_em")
+        self._visto_ate = datetime.now()
+
+    async def _loop_polling(self) -> None:
+        while True:
+            try:
+                await self._sincronizar_journal()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Falha no polling de invalidações")
+            await asyncio.sleep(OBSERVADOR_INTERVALO)
+
+    async def _sincronizar_journal(self) -> None:
+        """Publica as escritas locais e aplica as dos outros processos."""
+        journal = self._db[COLECAO_JOURNAL]
+        if self._saida:
+            saida, self._saida = self._saida, []
+            await journal.insert_many(saida, ordered=False)
+
+        cursor = journal.find(
+            {"criada_em": {"$gt": self._visto_ate - MARGEM_POLLING}, "origem": {"$ne": self.origem}},
+        ).sort("criada_em", ASCENDING)
+        eventos: List[Evento] = []
+        async for entrada in cursor:
+            self._visto_ate = max(self._visto_ate, entrada["criada_em"])
+            if entrada["_id"] in self._vistos_set:
+                continue
+            self._lembrar(entrada["_id"])
+            eventos.append((entrada["colecao"], entrada["operacao"], entrada.get("documento_id"), None))
+            if len(eventos) >= OBSERVADOR_LOTE:
+                await self._aplicar(eventos)
+                eventos = []
+        if eventos:
+            await self._aplicar(eventos)
+
+    def _lembrar(self, entrada_id: ObjectId) -> None:
+        if len(self._vistos) == self._vistos.maxlen:
+            self._vistos_set.discard(self._vistos[0])
+        self._vistos.append(entrada_id)
+        self._vistos_set.add(entrada_id)
+
+
+observador = ObservadorMudancas(OBSERVADOR_MODO)
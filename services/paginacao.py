@@ -0,0 +1,87 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+from beanie import PydanticObjectId
+from beanie.odm.queries.find import FindMany
+from bson.errors import InvalidId
+from fastapi import HTTPException, Response
+
+# Header com o cursor da próxima página (ausente quando não há mais itens)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*valores: Any) -> str:
+    """Gera um cursor opaco a partir dos valores da chave de ordenação."""
+    serializaveis = [v.isoformat() if isinstance(v, datetime) else str(v) for v in valores]
+    return base64.urlsafe_b64encode(json.dumps(serializaveis).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[str]:
+    """Decodifica um cursor gerado por `encode_cursor`."""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(valores, list) or not valores:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return valores
+
+
+def filtro_cursor_id(cursor: str) -> dict:
+    """Filtro keyset para coleções ordenadas por _id."""
+    try:
+        ultimo_id = PydanticObjectId(decode_cursor(cursor)[0])
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return {"_id": {"$gt": ultimo_id}}
+
+
+def filtro_cursor_emprestimo(cursor: str) -> dict:
+    """Filtro keyset para empréstimos ordenados por (data_emprestimo, _id)."""
+    valores = decode_cursor(cursor)
+    try:
+        data = datetime.fromisoformat(valores[0])
+        ultimo_id = PydanticObjectId(valores[1])
+    except (IndexError, ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return {
+        "$or": [
+            {"data_emprestimo": {"$gt": data}},
+            {"data_emprestimo": data, "_id": {"$gt": ultimo_id}},
+        ]
+    }
+
+
+def definir_proximo_cursor(response: Response, proximo: Optional[str]) -> None:
+    """Expõe o cursor da próxima página no header da resposta."""
+    if proximo:
+        response.headers[NEXT_CURSOR_HEADER] = proximo
+
+
+async def paginar(
+    query: FindMany,
+    response: Response,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 10,
+) -> list:
+    """
+    Pagina uma consulta ordenada por _id.
+
+    Com `cursor`, usa keyset (`_id > último`) e ignora `offset`; sem ele,
+    mantém o modo legado com `skip(offset)`. Em ambos os modos o cursor da
+    próxima página é devolvido no header `X-Next-Cursor`.
+    """
+    if cursor:
+        query = query.find(filtro_cursor_id(cursor))
+    elif offset:
+        query = query.skip(offset)
+
+    documentos = await query.sort("+_id").limit(limit).to_list()
+
+    if len(documentos) == limit:
+        definir_proximo_cursor(response, encode_cursor(documentos[-1].id))
+    return documentos
@@ -0,0 +1,95 @@
+import bisect
+from collections import defaultdict
+from typing import Any, Dict, Optional
+from pymongo import monitoring
+
+# Limites (segundos) do histograma de latência de checkout
+BUCKETS_CHECKOUT = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class MetricasPool(monitoring.ConnectionPoolListener):
+    """
+    Medidores do pool de conexões alimentados pelos eventos do pymongo.
+
+    Mantém, somados sobre todos os servidores: conexões abertas, conexões em
+    uso (checked out), requisições aguardando na fila do pool e a latência de
+    checkout (tempo entre pedir e obter uma conexão).
+    """
+
+    def __init__(self):
+        self.abertas = 0
+        self.em_uso = 0
+        self.aguardando = 0
+        self.checkouts = 0
+        self.falhas: Dict[str, int] = defaultdict(int)
+        self.limpezas = 0
+        self.latencia_soma = 0.0
+        self.latencia_max = 0.0
+        self.latencia_buckets = [0] * (len(BUCKETS_CHECKOUT) + 1)
+
+    def _registrar_latencia(self, duracao: Optional[float]) -> None:
+        if duracao is None:
+            return
+        self.latencia_soma += duracao
+        self.latencia_max = max(self.latencia_max, duracao)
+        self.latencia_buckets[bisect.bisect_left(BUCKETS_CHECKOUT, duracao)] += 1
+
+    # Eventos do pool
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        pass
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        self.limpezas += 1
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        pass
+
+    # Eventos de conexão
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        self.abertas += 1
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:
+        pass
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        self.abertas = max(0, self.abertas - 1)
+
+    def connection_check_out_started(self, event: monitoring.ConnectionCheckOutStartedEvent) -> None:
+        self.aguardando += 1
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        self.aguardando = max(0, self.aguardando - 1)
+        self.falhas[event.reason] += 1
+        self._registrar_latencia(event.duration)
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        self.aguardando = max(0, self.aguardando - 1)
+        self.em_uso += 1
+        self.checkouts += 1
+        self._registrar_latencia(event.duration)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        self.em_uso = max(0, self.em_uso - 1)
+
+    # Leitura
+
+    def estatisticas(self) -> Dict[str, Any]:
+        medicoes = sum(self.latencia_buckets)
+        return {
+            "conexoes_abertas": self.abertas,
+            "em_uso": self.em_uso,
+            "fila_espera": self.aguardando,
+            "checkouts": self.checkouts,
+            "falhas_checkout": dict(self.falhas),
+            "limpezas": self.limpezas,
+            "checkout_latencia_media_ms": round(self.latencia_soma / medicoes * 1000, 3) if medicoes else 0.0,
+            "checkout_latencia_max_ms": round(self.latencia_max * 1000, 3),
+        }
+
+
+metricas_pool = MetricasPool()
@@ -0,0 +1,109 @@
+import os
+import time
+from typing import Any, Dict, List
+from models.livro import Livro, LivroComEstatisticas
+from models.emprestimo import Emprestimo
+from services.cache import criar_cache
+from services.serializacao import livro_dict
+from services.tarefas import fila_tarefas, tarefa
+
+# Tempo de vida do ranking em cache (segundos)
+RANKING_CACHE_TTL = float(os.getenv("RANKING_CACHE_TTL", "60"))
+
+ranking_cache = criar_cache("ranking", RANKING_CACHE_TTL, maxsize=64, tamanho_mb=4, esquemas=(LivroComEstatisticas,))
+
+# Tamanho padrão do ranking na rota; é o que a tarefa recalcula após uma escrita
+RANKING_LIMIT_PADRAO = 10
+
+# Momento (time.monotonic) do último recálculo agendado por invalidar_ranking
+_recalculo_agendado_em = float("-inf")
+
+
+def pipeline_ranking(limit: int) -> list:
+    """Conta empréstimos por livro e resolve os dados do livro no mesmo pipeline."""
+    return [
+        {
+            "$group": {
+                "_id": "$livro.$id",
+                "total_emprestimos": {"$sum": 1},
+                "emprestimos_ativos": {
+                    "$sum": {
+                        "$cond": [{"$eq": ["$data_devolucao", None]}, 1, 0]
+                    }
+                }
+            }
+        },
+        {"$match": {"_id": {"$ne": None}}},
+        {"$sort": {"total_emprestimos": -1, "_id": 1}},
+        # O $unwind descarta livros já removidos; vem antes do $limit para
+        # que eles não ocupem lugares do ranking
+        {
+            "$lookup": {
+                "from": Livro.get_collection_name(),
+                "localField": "_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"titulo": 1, "ano": 1, "isbn": 1, "categoria": 1}}],
+                "as": "livro"
+            }
+        },
+        {"$unwind": "$livro"},
+        {"$limit": limit},
+    ]
+
+
+async def obter_ranking(limit: int) -> List[Dict[str, Any]]:
+    """
+    Retorna o ranking dos livros mais emprestados, usando o cache quando possível.
+
+    As linhas já saem no formato de LivroComEstatisticas, prontas para a
+    resposta rápida, sem instanciar modelos a cada leitura.
+    """
+    ranking = ranking_cache.get(limit)
+    if ranking is not None:
+        return ranking
+    return await calcular_ranking(limit)
+
+
+async def calcular_ranking(limit: int) -> List[Dict[str, Any]]:
+    """Executa o pipeline e grava o resultado no cache, a menos que tenha sido invalidado no meio."""
+    marca = ranking_cache.marca()
+    stats = await Emprestimo.aggregate(pipeline_ranking(limit)).to_list()
+    ranking = [
+        {
+            **livro_dict({**stat["livro"], "_id": stat["_id"]}),
+            "total_emprestimos": stat["total_emprestimos"],
+            "emprestimos_ativos": stat["emprestimos_ativos"],
+        }
+        for stat in stats
+    ]
+    ranking_cache.set(limit, ranking, marca=marca)
+    return ranking
+
+
+@tarefa("recalcular_ranking")
+async def recalcular_ranking(limit: int = RANKING_LIMIT_PADRAO) -> None:
+    await obter_ranking(limit)
+
+
+def descartar_ranking() -> None:
+    """Descarta o ranking em cache sem agendar o recálculo (a próxima leitura recalcula)."""
+    ranking_cache.clear()
+
+
+async def invalidar_ranking() -> None:
+    """
+    Descarta o ranking em cache (empréstimos criados, devolvidos ou removidos)
+    e agenda o recálculo em segundo plano, para que a próxima leitura não
+    pague a agregação.
+
+    O recálculo é agendado no máximo uma vez por RANKING_CACHE_TTL: sob
+    escritas contínuas, as invalidações seguintes apenas limpam o cache e a
+    próxima leitura recalcula sob demanda.
+    """
+    global _recalculo_agendado_em
+    descartar_ranking()
+    agora = time.monotonic()
+    if agora - _recalculo_agendado_em < RANKING_CACHE_TTL:
+        return
+    _recalculo_agendado_em = agora
+    await fila_tarefas.enfileirar("recalcular_ranking", chave="recalcular_ranking")
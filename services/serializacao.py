@@ -0,0 +1,137 @@
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from bson import ObjectId
+from fastapi import Response
+from pydantic_core import to_json
+
+# Caminho rápido de resposta para dados lidos direto do Mongo.
+#
+# Os documentos já foram validados na escrita, então as linhas são montadas como
+# dicts simples (sem instanciar modelos Pydantic) e codificadas pelo encoder do
+# pydantic-core. Retornar um Response pula a validação do `response_model`, que
+# continua declarado nas rotas apenas para a documentação OpenAPI.
+
+
+def _fallback(valor: Any) -> Any:
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+class RespostaRapida(Response):
+    """Response JSON que codifica o conteúdo sem passar por modelos Pydantic."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content, fallback=_fallback)
+
+
+def resposta_rapida(conteudo: Any, response: Optional[Response] = None) -> RespostaRapida:
+    """
+    Monta a resposta rápida preservando os headers já definidos na `response`
+    injetada pelo FastAPI (ex.: X-Next-Cursor), que seriam descartados ao
+    retornar um Response diretamente.
+    """
+    headers = None
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    return RespostaRapida(conteudo, headers=headers)
+
+
+def data(valor: Optional[datetime]) -> Optional[str]:
+    """Datas são gravadas como datetime à meia-noite; a API expõe apenas a data."""
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        valor = valor.date()
+    return valor.isoformat() if isinstance(valor, date) else valor
+
+
+def para_date(valor: Optional[datetime]) -> Optional[date]:
+    """Mesma conversão de `data`, mas retornando `date` para uso em model_construct."""
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+# Linhas no formato dos modelos de saída
+
+def aluno_dict(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(doc["_id"]),
+        "nome": doc["nome"],
+        "matricula": doc["matricula"],
+        "curso": doc["curso"],
+        "email": doc["email"],
+    }
+
+
+def autor_dict(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(doc["_id"]),
+        "nome": doc["nome"],
+        "nacionalidade": doc.get("nacionalidade"),
+        "ano_nascimento": doc.get("ano_nascimento"),
+    }
+
+
+def livro_dict(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(doc["_id"]),
+        "titulo": doc["titulo"],
+        "ano": doc["ano"],
+        "isbn": doc["isbn"],
+        "categoria": doc.get("categoria"),
+    }
+
+
+def emprestimo_com_livro_dict(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Linha no formato de EmprestimoWithLivroOut."""
+    return {
+        "id": str(doc["_id"]),
+        "data_emprestimo": data(doc["data_emprestimo"]),
+        "data_devolucao_prevista": data(doc["data_devolucao_prevista"]),
+        "data_devolucao": data(doc.get("data_devolucao")),
+        "status": doc.get("status"),
+        "livro": livro_dict(doc["livro"]) if "livro" in doc else None,
+    }
+
+
+def emprestimo_full_dict(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Linha no formato de EmprestimoFull."""
+    return {
+        "id": str(doc["_id"]),
+        "data_emprestimo": data(doc["data_emprestimo"]),
+        "data_devolucao_prevista": data(doc["data_devolucao_prevista"]),
+        "data_devolucao": data(doc.get("data_devolucao")),
+        "status": doc.get("status"),
+        "aluno": aluno_dict(doc["aluno"]) if "aluno" in doc else None,
+        "livro": livro_dict(doc["livro"]) if "livro" in doc else None,
+    }
+
+
+# Conversão campo a campo, para as listagens de empréstimos com `?fields=`
+CONVERSORES_EMPRESTIMO: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "id": lambda doc: str(doc["_id"]),
+    "data_emprestimo": lambda doc: data(doc["data_emprestimo"]),
+    "data_devolucao_prevista": lambda doc: data(doc["data_devolucao_prevista"]),
+    "data_devolucao": lambda doc: data(doc.get("data_devolucao")),
+    "status": lambda doc: doc.get("status"),
+    "aluno": lambda doc: aluno_dict(doc["aluno"]) if "aluno" in doc else None,
+    "livro": lambda doc: livro_dict(doc["livro"]) if "livro" in doc else None,
+}
+
+
+def emprestimo_parcial_dict(doc: Dict[str, Any], campos: Iterable[str]) -> Dict[str, Any]:
+    """Linha de empréstimo apenas com `campos` (já validados contra o modelo de saída)."""
+    return {campo: CONVERSORES_EMPRESTIMO[campo](doc) for campo in campos}
+
+
+def linhas_emprestimos(
+    docs: Iterable[Dict[str, Any]],
+    campos: Optional[Iterable[str]] = None,
+    para_dict: Callable[[Dict[str, Any]], Dict[str, Any]] = emprestimo_full_dict,
+) -> List[Dict[str, Any]]:
+    """Linhas completas (`para_dict`) ou apenas com os `campos` pedidos em `?fields=`."""
+    if campos is None:
+        return [para_dict(doc) for doc in docs]
+    return [emprestimo_parcial_dict(doc, campos) for doc in docs]
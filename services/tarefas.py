@@ -0,0 +1,341 @@
+import asyncio
+import logging
+import os
+import socket
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from models.tarefa import Tarefa
+
+logger = logging.getLogger(__name__)
+
+# Tarefas executadas ao mesmo tempo
+TAREFAS_WORKERS = int(os.getenv("TAREFAS_WORKERS", "4"))
+# Tentativas por tarefa antes de marcá-la como "falhou"
+TAREFAS_TENTATIVAS = int(os.getenv("TAREFAS_TENTATIVAS", "3"))
+# Espera antes da 1ª repetição (segundos); dobra a cada nova tentativa
+TAREFAS_ESPERA = float(os.getenv("TAREFAS_ESPERA", "1"))
+# Tamanho máximo da fila; cheia, a tarefa roda na própria requisição
+TAREFAS_FILA_MAX = int(os.getenv("TAREFAS_FILA_MAX", "10000"))
+# Tarefas finalizadas mantidas em memória para consulta
+TAREFAS_HISTORICO = int(os.getenv("TAREFAS_HISTORICO", "1000"))
+# Grava as tarefas na coleção `tarefas` e recarrega as pendentes ao iniciar
+TAREFAS_PERSISTIR = os.getenv("TAREFAS_PERSISTIR", "false").lower() in ("1", "true", "sim")
+# Espera máxima, ao desligar, para os workers esvaziarem a fila (segundos)
+TAREFAS_DRENAR_SEGUNDOS = float(os.getenv("TAREFAS_DRENAR_SEGUNDOS", "10"))
+# Persistência: validade da posse de uma tarefa pelo processo que a enfileirou
+# ou assumiu; renovada a cada terço dela enquanto o processo vive (segundos)
+TAREFAS_LEASE_SEGUNDOS = float(os.getenv("TAREFAS_LEASE_SEGUNDOS", "60"))
+
+Executor = Callable[..., Awaitable[Any]]
+
+_executores: Dict[str, Executor] = {}
+
+
+def tarefa(nome: str) -> Callable[[Executor], Executor]:
+    """Decorator que registra a função assíncrona executada para as tarefas `nome`."""
+    def registrar(executor: Executor) -> Executor:
+        _executores[nome] = executor
+        return executor
+    return registrar
+
+
+class FilaTarefas:
+    """
+    Fila de tarefas em segundo plano com um pool fixo de workers.
+
+    As rotas de escrita enfileiram o trabalho pesado (limpeza de vínculos,
+    recálculo do ranking, reconciliação) e respondem sem esperar por ele.
+    Cada tarefa é repetida até `tentativas` vezes, com espera exponencial.
+    Tarefas com a mesma `chave` ainda pendentes são agrupadas em uma só.
+
+    Com `persistir`, as tarefas são gravadas no Mongo com o processo dono
+    (`dono`) e a validade da posse (`lease_ate`), renovada enquanto ele vive.
+    Cada processo assume, com um find_one_and_update por tarefa, apenas as que
+    perderam o dono (lease vencido): ao iniciar e depois periodicamente. Com
+    vários workers da API, cada tarefa roda em um só (execução "ao menos uma
+    vez" apenas se o dono cair).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        tentativas: int,
+        espera: float,
+        tamanho: int,
+        historico: int,
+        persistir: bool,
+        drenar: float,
+        lease: float,
+    ):
+        self.quantidade_workers = workers
+        self.tentativas = tentativas
+        self.espera = espera
+        self.tamanho = tamanho
+        self.historico = historico
+        self.persistir = persistir
+        self.drenar = drenar
+        self.lease = lease
+        self.origem = f"{socket.gethostname()}:{os.getpid()}:{ObjectId()}"
+        self._manutencao: Optional[asyncio.Task] = None
+        self._fila: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._registros: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._por_chave: Dict[str, str] = {}
+
+    @property
+    def ativa(self) -> bool:
+        return self._fila is not None
+
+    # Ciclo de vida (lifespan)
+
+    async def iniciar(self) -> None:
+        self._fila = asyncio.Queue(maxsize=self.tamanho)
+        if self.persistir:
+            await self._assumir_abandonadas()
+            self._manutencao = asyncio.create_task(self._loop_manutencao())
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.quantidade_workers)]
+
+    async def parar(self) -> None:
+        """
+        Espera até `drenar` segundos pela fila esvaziar e então cancela os
+        workers. Sem persistência, o que não terminou a tempo é perdido (e
+        registrado no log); com ela, roda no próximo início.
+        """
+        if self._fila is not None and self._workers:
+            try:
+                await asyncio.wait_for(self._fila.join(), timeout=self.drenar)
+            except asyncio.TimeoutError:
+                restantes = [r for r in self._registros.values() if r["status"] in ("pendente", "executando")]
+                if self.persistir:
+                    logger.warning("%d tarefa(s) não terminaram ao desligar; serão retomadas no próximo início", len(restantes))
+                else:
+                    logger.error(
+                        "%d tarefa(s) descartadas ao desligar: %s",
+                        len(restantes), ", ".join(f"{r['nome']} ({r['id']})" for r in restantes),
+                    )
+        if self._manutencao is not None:
+            self._manutencao.cancel()
+            await asyncio.gather(self._manutencao, return_exceptions=True)
+            self._manutencao = None
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._fila = None
+        if self.persistir:
+            await self._liberar()
+
+    # Enfileiramento e consulta
+
+    async def enfileirar(self, nome: str, chave: Optional[str] = None, **argumentos: Any) -> str:
+        """
+        Enfileira `nome(**argumentos)` e retorna o id da tarefa. Sem workers
+        (fora da API) ou com a fila cheia, executa na hora.
+        """
+        if nome not in _executores:
+            raise ValueError(f"Tarefa desconhecida: {nome}")
+        if chave is not None and chave in self._por_chave:
+            return self._por_chave[chave]
+
+        registro = {
+            "id": str(ObjectId()),
+            "nome": nome,
+            "argumentos": argumentos,
+            "chave": chave,
+            "status": "pendente",
+            "tentativas": 0,
+            "erro": None,
+            "criada_em": datetime.now(),
+            "iniciada_em": None,
+            "concluida_em": None,
+        }
+        if self._fila is None or self._fila.full():
+            self._guardar(registro)
+            await self._executar(registro)
+            return registro["id"]
+
+        if self.persistir:
+            await Tarefa.get_pymongo_collection().insert_one(
+                {**self._documento(registro), "dono": self.origem, "lease_ate": self._validade()},
+            )
+        self._guardar(registro)
+        if chave is not None:
+            self._por_chave[chave] = registro["id"]
+        self._fila.put_nowait(registro["id"])
+        return registro["id"]
+
+    async def obter(self, tarefa_id: str) -> Optional[Dict[str, Any]]:
+        registro = self._registros.get(tarefa_id)
+        if registro is None and self.persistir:
+            try:
+                doc = await Tarefa.get_pymongo_collection().find_one({"_id": ObjectId(tarefa_id)})
+            except InvalidId:
+                return None
+            registro = self._registro(doc) if doc else None
+        return registro
+
+    def listar(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Tarefas em memória, das mais recentes para as mais antigas."""
+        registros = (r for r in reversed(self._registros.values()) if status is None or r["status"] == status)
+        return [registro for registro, _ in zip(registros, range(limit))]
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "ativa": self.ativa,
+            "workers": len(self._workers),
+            "na_fila": self._fila.qsize() if self._fila is not None else 0,
+            "persistir": self.persistir,
+            "por_status": dict(Counter(registro["status"] for registro in self._registros.values())),
+        }
+
+    # Posse das tarefas persistidas
+
+    def _validade(self) -> datetime:
+        return datetime.now() + timedelta(seconds=self.lease)
+
+    async def _assumir_abandonadas(self) -> int:
+        """
+        Enfileira as tarefas não finalizadas cujo lease venceu (dono parado ou
+        caído), assumindo cada uma atomicamente: se dois processos disputam a
+        mesma, só um find_one_and_update a encontra ainda vencida.
+        """
+        colecao = Tarefa.get_pymongo_collection()
+        assumidas = 0
+        while self._fila is not None and not self._fila.full():
+            doc = await colecao.find_one_and_update(
+                {
+                    "status": {"$in": ["pendente", "executando"]},
+                    "$or": [{"lease_ate": {"$lt": datetime.now()}}, {"lease_ate": None}],
+                },
+                {"$set": {"status": "executando", "dono": self.origem, "lease_ate": self._validade()}},
+                sort=[("criada_em", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is None:
+                break
+            registro = self._registro(doc)
+            registro["status"] = "pendente"
+            self._guardar(registro)
+            if registro.get("chave") is not None:
+                self._por_chave[registro["chave"]] = registro["id"]
+            self._fila.put_nowait(registro["id"])
+            assumidas += 1
+        if assumidas:
+            logger.info("%d tarefa(s) pendente(s) assumida(s)", assumidas)
+        return assumidas
+
+    async def _loop_manutencao(self) -> None:
+        """Renova o lease das tarefas deste processo e assume as de processos que caíram."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await Tarefa.get_pymongo_collection().update_many(
+                    {"dono": self.origem, "status": {"$in": ["pendente", "executando"]}},
+                    {"$set": {"lease_ate": self._validade()}},
+                )
+                await self._assumir_abandonadas()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Falha ao renovar o lease das tarefas")
+
+    async def _liberar(self) -> None:
+        """Ao desligar, vence o lease do que não terminou para outro processo assumir já."""
+        try:
+            await Tarefa.get_pymongo_collection().update_many(
+                {"dono": self.origem, "status": {"$in": ["pendente", "executando"]}},
+                {"$set": {"lease_ate": datetime.now()}},
+            )
+        except Exception:
+            logger.exception("Falha ao liberar as tarefas pendentes")
+
+    # Execução
+
+    async def _worker(self) -> None:
+        while True:
+            tarefa_id = await self._fila.get()
+            try:
+                registro = self._registros.get(tarefa_id)
+                if registro is not None:
+                    await self._executar(registro)
+            except Exception:
+                logger.exception("Falha inesperada no worker de tarefas")
+            finally:
+                self._fila.task_done()
+
+    async def _executar(self, registro: Dict[str, Any]) -> None:
+        if registro.get("chave") is not None:
+            # A partir daqui, uma nova tarefa com a mesma chave não é mais agrupada com esta
+            self._por_chave.pop(registro["chave"], None)
+        executor = _executores[registro["nome"]]
+        registro["status"] = "executando"
+        registro["iniciada_em"] = datetime.now()
+        await self._atualizar(registro)
+
+        while True:
+            registro["tentativas"] += 1
+            try:
+                await executor(**registro["argumentos"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                registro["erro"] = f"{type(e).__name__}: {e}"
+                if registro["tentativas"] >= self.tentativas:
+                    registro["status"] = "falhou"
+                    logger.exception("Tarefa %s (%s) falhou após %d tentativas", registro["nome"], registro["id"], registro["tentativas"])
+                    break
+                await asyncio.sleep(self.espera * 2 ** (registro["tentativas"] - 1))
+            else:
+                registro["status"] = "concluida"
+                registro["erro"] = None
+                break
+
+        registro["concluida_em"] = datetime.now()
+        await self._atualizar(registro)
+
+    # Armazenamento
+
+    def _guardar(self, registro: Dict[str, Any]) -> None:
+        self._registros[registro["id"]] = registro
+        # Descarta as finalizadas mais antigas; pendentes nunca saem antes de rodar
+        excedente = len(self._registros) - self.historico
+        if excedente > 0:
+            for tarefa_id in [t for t, r in self._registros.items() if r["status"] in ("concluida", "falhou")][:excedente]:
+                del self._registros[tarefa_id]
+
+    async def _atualizar(self, registro: Dict[str, Any]) -> None:
+        if not self.persistir or self._fila is None:
+            return
+        campos = {campo: registro[campo] for campo in ("status", "tentativas", "erro", "iniciada_em", "concluida_em")}
+        try:
+            await Tarefa.get_pymongo_collection().update_one({"_id": ObjectId(registro["id"])}, {"$set": campos})
+        except Exception:
+            logger.exception("Falha ao gravar o status da tarefa %s", registro["id"])
+
+    @staticmethod
+    def _documento(registro: Dict[str, Any]) -> Dict[str, Any]:
+        doc = {campo: valor for campo, valor in registro.items() if campo != "id"}
+        doc["_id"] = ObjectId(registro["id"])
+        return doc
+
+    @staticmethod
+    def _registro(doc: Dict[str, Any]) -> Dict[str, Any]:
+        registro = {campo: valor for campo, valor in doc.items() if campo not in ("_id", "dono", "lease_ate")}
+        registro["id"] = str(doc["_id"])
+        return registro
+
+
+fila_tarefas = FilaTarefas(
+    TAREFAS_WORKERS,
+    TAREFAS_TENTATIVAS,
+    TAREFAS_ESPERA,
+    TAREFAS_FILA_MAX,
+    TAREFAS_HISTORICO,
+    TAREFAS_PERSISTIR,
+    TAREFAS_DRENAR_SEGUNDOS,
+    TAREFAS_LEASE_SEGUNDOS,
+)
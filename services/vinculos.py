@@ -0,0 +1,239 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Tuple, Type, TypeVar
+from beanie import Document, PydanticObjectId
+from bson import DBRef
+from fastapi import HTTPException
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.errors import DuplicateKeyError
+from models.autor import Autor
+from models.autoria import Autoria, id_autoria
+from models.livro import Livro
+from services.autoria import usa_colecao
+from services.tarefas import tarefa
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+NAO_ENCONTRADO = {
+    Autor: "Autor não encontrado",
+    Livro: "Livro não encontrado",
+}
+
+# Resultado da verificação de suporte a transações, por cliente
+_suporte_transacoes: dict = {}
+
+
+async def _suporta_transacoes(cliente: AsyncMongoClient) -> bool:
+    """Transações exigem replica set ou mongos; um mongod isolado não as aceita."""
+    chave = id(cliente)
+    if chave not in _suporte_transacoes:
+        hello = await cliente.admin.command("hello")
+        suporta = "setName" in hello or hello.get("msg") == "isdbgrid"
+        if not suporta:
+            logger.warning("MongoDB sem replica set: vínculos livro-autor serão gravados sem transação")
+        _suporte_transacoes[chave] = suporta
+    return _suporte_transacoes[chave]
+
+
+async def executar_atomicamente(operacao: Callable[[Optional[AsyncClientSession]], Awaitable[T]]) -> T:
+    """
+    Executa `operacao(sessao)` dentro de uma transação (com os retries de
+    with_transaction). Sem suporte a transações, executa com `sessao=None`.
+    """
+    cliente = Livro.get_pymongo_collection().database.client
+    if not await _suporta_transacoes(cliente):
+        return await operacao(None)
+    async with cliente.start_session() as sessao:
+        return await sessao.with_transaction(operacao)
+
+
+def _lado(model: Type[Document]) -> Tuple[str, Type[Document]]:
+    """Campo do array de vínculos e o modelo do outro lado."""
+    return ("livros", Livro) if model is Autor else ("autores", Autor)
+
+
+def _ref(model: Type[Document], documento_id: PydanticObjectId) -> DBRef:
+    """DBRef no mesmo formato gravado pelo Beanie para um Link."""
+    return DBRef(model.get_collection_name(), documento_id)
+
+
+async def _existe(model: Type[Document], documento_id: PydanticObjectId, sessao: Optional[AsyncClientSession]) -> bool:
+    doc = await model.get_pymongo_collection().find_one({"_id": documento_id}, {"_id": 1}, session=sessao)
+    return doc is not None
+
+
+def _nao_encontrado(model: Type[Document]) -> HTTPException:
+    return HTTPException(status_code=404, detail=NAO_ENCONTRADO[model])
+
+
+def _par(principal: Type[Document], principal_id: PydanticObjectId, outro_id: PydanticObjectId) -> dict:
+    """Chave da aresta em `autorias` para o par (livro, autor)."""
+    if principal is Livro:
+        return {"livro_id": principal_id, "autor_id": outro_id}
+    return {"livro_id": outro_id, "autor_id": principal_id}
+
+
+async def _verificar_existencia(principal: Type[Document], principal_id: PydanticObjectId, outro_id: PydanticObjectId) -> None:
+    _, outro = _lado(principal)
+    existe_principal, existe_outro = await asyncio.gather(
+        _existe(principal, principal_id, None),
+        _existe(outro, outro_id, None),
+    )
+    if not existe_principal:
+        raise _nao_encontrado(principal)
+    if not existe_outro:
+        raise _nao_encontrado(outro)
+
+
+async def _vincular_aresta(
+    principal: Type[Document],
+    principal_id: PydanticObjectId,
+    outro_id: PydanticObjectId,
+    erro_ja_vinculado: str,
+) -> None:
+    """Um único insert; o índice único (livro_id, autor_id) impede duplicatas."""
+    await _verificar_existencia(principal, principal_id, outro_id)
+    par = _par(principal, principal_id, outro_id)
+    try:
+        await Autoria.get_pymongo_collection().insert_one({"_id": id_autoria(par["livro_id"], par["autor_id"]), **par})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=erro_ja_vinculado)
+
+
+async def _desvincular_aresta(
+    principal: Type[Document],
+    principal_id: PydanticObjectId,
+    outro_id: PydanticObjectId,
+    erro_nao_vinculado: Optional[str],
+) -> None:
+    resultado = await Autoria.get_pymongo_collection().delete_one(_par(principal, principal_id, outro_id))
+    if resultado.deleted_count == 0:
+        await _verificar_existencia(principal, principal_id, outro_id)
+        if erro_nao_vinculado:
+            raise HTTPException(status_code=404, detail=erro_nao_vinculado)
+
+
+async def vincular(
+    principal: Type[Document],
+    principal_id: PydanticObjectId,
+    outro_id: PydanticObjectId,
+    erro_ja_vinculado: str,
+) -> None:
+    """
+    Vincula um livro e um autor com $addToSet nos dois documentos.
+
+    O filtro do lado `principal` só casa se o vínculo ainda não existir, então
+    a verificação e a escrita são atômicas. Os dois lados são gravados na mesma
+    transação e o payload independe do tamanho dos arrays.
+
+    Com AUTORIA_STORAGE=colecao, grava apenas a aresta em `autorias`.
+    """
+    if usa_colecao():
+        return await _vincular_aresta(principal, principal_id, outro_id, erro_ja_vinculado)
+
+    campo, outro = _lado(principal)
+    campo_outro, _ = _lado(outro)
+    colecao = principal.get_pymongo_collection()
+    colecao_outro = outro.get_pymongo_collection()
+
+    async def operacao(sessao: Optional[AsyncClientSession]) -> None:
+        resultado = await colecao.update_one(
+            {"_id": principal_id, f"{campo}.$id": {"$ne": outro_id}},
+            {"$addToSet": {campo: _ref(outro, outro_id)}},
+            session=sessao,
+        )
+        if resultado.matched_count == 0:
+            if not await _existe(principal, principal_id, sessao):
+                raise _nao_encontrado(principal)
+            if not await _existe(outro, outro_id, sessao):
+                raise _nao_encontrado(outro)
+            raise HTTPException(status_code=400, detail=erro_ja_vinculado)
+
+        resultado = await colecao_outro.update_one(
+            {"_id": outro_id},
+            {"$addToSet": {campo_outro: _ref(principal, principal_id)}},
+            session=sessao,
+        )
+        if resultado.matched_count == 0:
+            if sessao is None:
+                # Sem transação: desfaz o lado já gravado
+                await colecao.update_one({"_id": principal_id}, {"$pull": {campo: _ref(outro, outro_id)}})
+            raise _nao_encontrado(outro)
+
+    await executar_atomicamente(operacao)
+
+
+async def desvincular(
+    principal: Type[Document],
+    principal_id: PydanticObjectId,
+    outro_id: PydanticObjectId,
+    erro_nao_vinculado: Optional[str] = None,
+) -> None:
+    """
+    Remove o vínculo entre um livro e um autor com $pull nos dois documentos,
+    na mesma transação.
+
+    Com `erro_nao_vinculado`, responde 404 quando o lado `principal` não tinha
+    o vínculo; sem ele, a remoção é idempotente.
+    """
+    if usa_colecao():
+        return await _desvincular_aresta(principal, principal_id, outro_id, erro_nao_vinculado)
+
+    campo, outro = _lado(principal)
+    campo_outro, _ = _lado(outro)
+    colecao = principal.get_pymongo_collection()
+    colecao_outro = outro.get_pymongo_collection()
+
+    async def operacao(sessao: Optional[AsyncClientSession]) -> None:
+        resultado = await colecao.update_one(
+            {"_id": principal_id},
+            {"$pull": {campo: _ref(outro, outro_id)}},
+            session=sessao,
+        )
+        if resultado.matched_count == 0:
+            raise _nao_encontrado(principal)
+        if resultado.modified_count == 0:
+            if not await _existe(outro, outro_id, sessao):
+                raise _nao_encontrado(outro)
+            if erro_nao_vinculado:
+                raise HTTPException(status_code=404, detail=erro_nao_vinculado)
+
+        resultado_outro = await colecao_outro.update_one(
+            {"_id": outro_id},
+            {"$pull": {campo_outro: _ref(principal, principal_id)}},
+            session=sessao,
+        )
+        if resultado_outro.matched_count == 0:
+            if sessao is None and resultado.modified_count:
+                # Sem transação: restaura o lado já gravado
+                await colecao.update_one({"_id": principal_id}, {"$addToSet": {campo: _ref(outro, outro_id)}})
+            raise _nao_encontrado(outro)
+
+    await executar_atomicamente(operacao)
+
+
+async def _limpar_vinculos(model: Type[Document], documento_id: PydanticObjectId) -> None:
+    """Remove as referências a um documento excluído do outro lado da relação."""
+    _, outro = _lado(model)
+    campo_outro, _ = _lado(outro)
+    if usa_colecao():
+        campo_aresta = "livro_id" if model is Livro else "autor_id"
+        await Autoria.get_pymongo_collection().delete_many({campo_aresta: documento_id})
+        return
+    await outro.get_pymongo_collection().update_many(
+        {f"{campo_outro}.$id": documento_id},
+        {"$pull": {campo_outro: _ref(model, documento_id)}},
+    )
+
+
+@tarefa("limpar_vinculos_livro")
+async def limpar_vinculos_livro(livro_id: PydanticObjectId) -> None:
+    await _limpar_vinculos(Livro, livro_id)
+
+
+@tarefa("limpar_vinculos_autor")
+async def limpar_vinculos_autor(autor_id: PydanticObjectId) -> None:
+    await _limpar_vinculos(Autor, autor_id)
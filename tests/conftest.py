@@ -0,0 +1,44 @@
+import os
+import pytest
+from beanie import init_beanie
+from bson import ObjectId
+from pymongo.errors import ServerSelectionTimeoutError
+import database
+
+# MongoDB usado pelos testes de integração; sem ele, esses testes são pulados
+MONGODB_TESTE_URL = os.getenv("MONGODB_TESTE_URL", "mongodb://localhost:27017/?serverSelectionTimeoutMS=1000")
+
+# Lembra a primeira falha de conexão para não esperar o timeout em cada teste
+_indisponivel = False
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def cliente_mongo():
+    """Cliente da API (com os listeners) ligado a MONGODB_TESTE_URL."""
+    global _indisponivel
+    if _indisponivel:
+        pytest.skip(f"MongoDB indisponível em {MONGODB_TESTE_URL}")
+    cliente = database.criar_cliente(MONGODB_TESTE_URL)
+    try:
+        await cliente.admin.command("ping")
+    except ServerSelectionTimeoutError:
+        _indisponivel = True
+        await cliente.close()
+        pytest.skip(f"MongoDB indisponível em {MONGODB_TESTE_URL}")
+    yield cliente
+    await cliente.close()
+
+
+@pytest.fixture
+async def banco(cliente_mongo):
+    """Banco descartável com os modelos do Beanie inicializados (sem índices)."""
+    nome = f"teste_{ObjectId()}"
+    db = cliente_mongo[nome]
+    await init_beanie(database=db, document_models=database.DOCUMENT_MODELS, skip_indexes=True)
+    yield db
+    await cliente_mongo.drop_database(nome)
@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from services.cache import CacheTTL
+
+pytestmark = pytest.mark.anyio
+
+
+def test_lru_descarta_o_menos_usado():
+    cache = CacheTTL(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.estatisticas()["evictions"] == 1
+
+
+def test_set_com_marca_anterior_a_invalidacao_e_descartado():
+    cache = CacheTTL(ttl=60)
+    marca = cache.marca()
+    cache.invalidate("chave")
+    cache.set("chave", "velho", marca=marca)
+    assert cache.get("chave") is None
+
+    cache.set("chave", "novo", marca=cache.marca())
+    assert cache.get("chave") == "novo"
+
+
+def test_invalidar_outra_chave_nao_recusa_o_set():
+    cache = CacheTTL(ttl=60)
+    marca = cache.marca()
+    cache.invalidate("outra")
+    cache.set("chave", "valor", marca=marca)
+    assert cache.get("chave") == "valor"
+
+
+def test_clear_e_invalidacoes_esquecidas_recusam_marcas_antigas():
+    cache = CacheTTL(ttl=60, maxsize=2)
+    marca = cache.marca()
+    for chave in ("a", "b", "c"):
+        cache.invalidate(chave)
+    # "a" saiu do registro de invalidações, mas continua protegida
+    cache.set("a", "velho", marca=marca)
+    assert cache.get("a") is None
+
+    marca = cache.marca()
+    cache.clear()
+    cache.set("d", "velho", marca=marca)
+    assert cache.get("d") is None
+
+
+async def test_preenchimento_concorrente_com_invalidacao_nao_grava_valor_velho():
+    cache = CacheTTL(ttl=60)
+    lido = asyncio.Event()
+    invalidado = asyncio.Event()
+
+    async def preencher():
+        marca = cache.marca()
+        lido.set()
+        await invalidado.wait()
+        cache.set("chave", "velho", marca=marca)
+
+    async def atualizar():
+        await lido.wait()
+        cache.invalidate("chave")
+        invalidado.set()
+
+    await asyncio.gather(preencher(), atualizar())
+    assert cache.get("chave") is None
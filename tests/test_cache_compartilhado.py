@@ -0,0 +1,115 @@
+import multiprocessing
+import time
+import pytest
+from services.cache import CacheCompartilhado
+
+pytestmark = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(),
+    reason="o cache compartilhado depende de mmap + flock (POSIX)",
+)
+
+
+def _cache(tmp_path, nome="teste", ttl=60.0, maxsize=200, tamanho=64 * 1024):
+    return CacheCompartilhado(str(tmp_path / f"{nome}.cache"), ttl=ttl, maxsize=maxsize, tamanho=tamanho)
+
+
+def _valor(chave: int, rodada: int) -> tuple:
+    # Cabeçalho e rodapé iguais: uma leitura rasgada aparece como divergência
+    return (chave, rodada, "x" * (50 + chave % 200), chave, rodada)
+
+
+def _escritor(arquivo: str, rodadas: int) -> None:
+    cache = CacheCompartilhado(arquivo, ttl=60.0, maxsize=200, tamanho=64 * 1024)
+    for rodada in range(rodadas):
+        for chave in range(100):
+            cache.set(chave, _valor(chave, rodada))
+            if chave % 7 == 0:
+                cache.invalidate(chave)
+        if rodada % 10 == 0:
+            cache.clear()
+
+
+def test_leituras_concorrentes_nunca_veem_registro_rasgado(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("inicio", 1)
+    contexto = multiprocessing.get_context("fork")
+    escritores = [contexto.Process(target=_escritor, args=(cache.arquivo, 60)) for _ in range(2)]
+    for escritor in escritores:
+        escritor.start()
+
+    lidos = 0
+    while any(escritor.is_alive() for escritor in escritores):
+        for chave in range(100):
+            valor = cache.get(chave)
+            if valor is None:
+                continue
+            lidos += 1
+            assert valor[0] == valor[3] == chave
+            assert valor[1] == valor[4]
+            assert valor[2] == "x" * (50 + chave % 200)
+
+    for escritor in escritores:
+        escritor.join()
+        assert escritor.exitcode == 0
+    assert lidos > 0
+    cache.fechar()
+
+
+def test_area_de_dados_cheia_compacta_e_mantem_os_recentes(tmp_path):
+    cache = _cache(tmp_path, maxsize=2000, tamanho=16 * 1024)
+    for rodada in range(50):
+        for chave in range(20):
+            cache.set((rodada, chave), "v" * 100)
+            # Cheio, o set compacta (ou limpa) e grava: nunca é descartado em silêncio
+            assert cache.get((rodada, chave)) == "v" * 100
+
+    estatisticas = cache.estatisticas()
+    assert estatisticas["bytes_usados"] <= estatisticas["bytes_total"]
+    cache.fechar()
+
+
+def test_compactacao_preserva_vivos_e_descarta_expirados(tmp_path):
+    cache = _cache(tmp_path, maxsize=2000, tamanho=16 * 1024)
+    cache.set("fixo", "valor")
+    for chave in range(200):
+        cache.set(chave, "v" * 60, ttl=0.01)
+    time.sleep(0.02)
+    # Os expirados ocupam a área; o próximo set compacta em vez de limpar tudo
+    for chave in range(200, 230):
+        cache.set(chave, "v" * 60)
+    assert cache.get("fixo") == "valor"
+    assert cache.get(0) is None
+    cache.fechar()
+
+
+def test_set_com_marca_anterior_a_invalidacao_e_descartado(tmp_path):
+    cache = _cache(tmp_path)
+    marca = cache.marca()
+    cache.invalidate("chave")
+    cache.set("chave", "velho", marca=marca)
+    assert cache.get("chave") is None
+
+    cache.set("chave", "novo", marca=cache.marca())
+    assert cache.get("chave") == "novo"
+    cache.fechar()
+
+
+def test_marca_continua_valendo_depois_de_compactar(tmp_path):
+    cache = _cache(tmp_path, maxsize=2000, tamanho=16 * 1024)
+    marca = cache.marca()
+    cache.invalidate("chave")
+    # Enche a área para forçar compactações, que descartam o slot da invalidação
+    for chave in range(300):
+        cache.set(chave, "v" * 100)
+    cache.set("chave", "velho", marca=marca)
+    assert cache.get("chave") is None
+    cache.fechar()
+
+
+def test_clear_recusa_valores_lidos_antes_dele(tmp_path):
+    cache = _cache(tmp_path)
+    marca = cache.marca()
+    cache.clear()
+    cache.set("chave", "velho", marca=marca)
+    assert cache.get("chave") is None
+    cache.fechar()
@@ -0,0 +1,63 @@
+from datetime import date
+import httpx
+import pytest
+from models import Aluno, Emprestimo, Livro
+from services import carregador
+from main import app
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def api(banco, monkeypatch):
+    monkeypatch.setattr(carregador, "QUERY_COUNT_HEADER", True)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as cliente:
+        yield cliente
+
+
+async def _popular(quantidade: int):
+    alunos = [Aluno(nome=f"Aluno {i}", matricula=str(i), curso="CC", email=f"a{i}@x.br") for i in range(quantidade)]
+    livros = [Livro(titulo=f"Livro {i}", ano=2000, isbn=str(i), categoria="Romance") for i in range(quantidade)]
+    for documento in (*alunos, *livros):
+        await documento.insert()
+    emprestimos = [
+        Emprestimo(
+            aluno=aluno,
+            livro=livro,
+            data_emprestimo=date(2026, 1, 1),
+            data_devolucao_prevista=date(2026, 1, 15),
+        )
+        for aluno, livro in zip(alunos, livros)
+    ]
+    for emprestimo in emprestimos:
+        await emprestimo.insert()
+    return alunos, livros, emprestimos
+
+
+async def _consultas(api, url: str) -> int:
+    resposta = await api.get(url)
+    assert resposta.status_code == 200, resposta.text
+    return int(resposta.headers[carregador.CONSULTAS_HEADER])
+
+
+@pytest.mark.parametrize("quantidade", [3, 20])
+async def test_listagem_de_emprestimos_faz_uma_consulta(api, quantidade):
+    # Aluno e livro vêm dos $lookup da mesma agregação, qualquer que seja a página
+    await _popular(quantidade)
+    assert await _consultas(api, "/emprestimos/?limit=20") == 1
+
+
+async def test_emprestimos_de_um_aluno(api):
+    alunos, _, _ = await _popular(3)
+    # Checagem do aluno (carregador) + agregação dos empréstimos
+    assert await _consultas(api, f"/alunos/{alunos[0].id}/emprestimos") == 2
+
+
+@pytest.mark.parametrize("quantidade", [3, 20])
+async def test_lote_faz_uma_consulta_por_colecao(api, quantidade):
+    alunos, livros, emprestimos = await _popular(quantidade)
+    ids = lambda documentos: ",".join(str(documento.id) for documento in documentos)
+
+    assert await _consultas(api, f"/alunos/lote?ids={ids(alunos)}") == 1
+    assert await _consultas(api, f"/livros/lote?ids={ids(livros)}") == 1
+    assert await _consultas(api, f"/emprestimos/lote?ids={ids(emprestimos)}") == 1
@@ -0,0 +1,76 @@
+from datetime import datetime
+import pytest
+from bson import DBRef, ObjectId
+from pymongo.errors import DuplicateKeyError, OperationFailure
+import database
+
+pytestmark = pytest.mark.anyio
+
+
+def _emprestimo(aluno_id, livro_id, devolvido: bool) -> dict:
+    return {
+        "data_emprestimo": datetime(2026, 1, 1),
+        "data_devolucao_prevista": datetime(2026, 1, 15),
+        "data_devolucao": datetime(2026, 1, 10) if devolvido else None,
+        "aluno": DBRef("alunos", aluno_id),
+        "livro": DBRef("livros", livro_id),
+    }
+
+
+async def test_indice_parcial_recusa_segundo_emprestimo_ativo(banco):
+    await database.sincronizar_indices()
+    colecao = banco.emprestimos
+    aluno_id, livro_id = ObjectId(), ObjectId()
+
+    await colecao.insert_one(_emprestimo(aluno_id, livro_id, devolvido=False))
+    with pytest.raises(DuplicateKeyError):
+        await colecao.insert_one(_emprestimo(aluno_id, livro_id, devolvido=False))
+
+    # Devolvidos ficam fora do filtro parcial: quantos forem
+    await colecao.insert_one(_emprestimo(aluno_id, livro_id, devolvido=True))
+    await colecao.insert_one(_emprestimo(aluno_id, livro_id, devolvido=True))
+    # Outro livro do mesmo aluno continua livre
+    await colecao.insert_one(_emprestimo(aluno_id, ObjectId(), devolvido=False))
+    assert await colecao.count_documents({"aluno.$id": aluno_id}) == 4
+
+
+async def test_indice_unico_que_nao_pode_ser_criado_impede_a_inicializacao(banco):
+    aluno_id, livro_id = ObjectId(), ObjectId()
+    await banco.emprestimos.insert_many([_emprestimo(aluno_id, livro_id, devolvido=False) for _ in range(2)])
+
+    with pytest.raises(OperationFailure):
+        await database.sincronizar_indices()
+
+
+async def test_sincronizar_indices_cria_os_declarados(banco):
+    assert await database.sincronizar_indices() == {}
+    assert "ativo_aluno_livro_unique" in await banco.emprestimos.index_information()
+
+
+def _valores_do_plano(plano, campo: str) -> set:
+    """Valores de `campo` em todos os estágios do plano (ex.: "stage", "indexName")."""
+    if isinstance(plano, dict):
+        valores = {plano[campo]} if campo in plano else set()
+        return valores.union(*(_valores_do_plano(valor, campo) for valor in plano.values()))
+    if isinstance(plano, list):
+        return set().union(*(_valores_do_plano(valor, campo) for valor in plano))
+    return set()
+
+
+async def test_listagem_de_ativos_usa_o_indice_parcial(banco):
+    await database.sincronizar_indices()
+    await banco.emprestimos.insert_many(
+        [_emprestimo(ObjectId(), ObjectId(), devolvido=(i % 2 == 0)) for i in range(200)]
+    )
+    ultimo_id = ObjectId()
+    consulta = banco.emprestimos.find({
+        "data_devolucao": None,
+        "$or": [
+            {"data_emprestimo": {"$gt": datetime(2026, 1, 1)}},
+            {"data_emprestimo": datetime(2026, 1, 1), "_id": {"$gt": ultimo_id}},
+        ],
+    }).sort([("data_emprestimo", 1), ("_id", 1)]).limit(10)
+    plano = (await consulta.explain())["queryPlanner"]["winningPlan"]
+    assert "ativos_data_id" in _valores_do_plano(plano, "indexName")
+    # Sem ordenação em memória (SORT_MERGE das ramificações do $or não bloqueia)
+    assert "SORT" not in _valores_do_plano(plano, "stage")
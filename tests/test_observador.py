@@ -0,0 +1,119 @@
+import asyncio
+import pytest
+from pymongo import AsyncMongoClient
+from models import Aluno, Livro, LivroOut
+from services.busca import indice_livros
+from services.cache import cache_entidades
+from services.observador import COLECAO_JOURNAL, ObservadorMudancas, observador
+from services.ranking import RANKING_LIMIT_PADRAO, ranking_cache
+from conftest import MONGODB_TESTE_URL
+
+pytestmark = pytest.mark.anyio
+
+
+async def _esperar(condicao, timeout: float = 10.0) -> None:
+    prazo = asyncio.get_running_loop().time() + timeout
+    while not condicao():
+        assert asyncio.get_running_loop().time() < prazo, "o observador não aplicou o evento a tempo"
+        await asyncio.sleep(0.05)
+
+
+@pytest.fixture
+async def outro_cliente(banco):
+    """Outro processo da API: um cliente sem os listeners deste."""
+    cliente = AsyncMongoClient(MONGODB_TESTE_URL)
+    yield cliente[banco.name]
+    await cliente.close()
+
+
+@pytest.fixture
+async def observador_change_stream(banco, cliente_mongo, outro_cliente, monkeypatch):
+    hello = await cliente_mongo.admin.command("hello")
+    if "setName" not in hello:
+        pytest.skip("change streams exigem replica set (mongod --replSet rs0 + rs.initiate())")
+    monkeypatch.setattr(observador, "modo_configurado", "change_stream")
+    await observador.iniciar()
+    # O stream abre em segundo plano: escreve até o primeiro evento chegar
+    aplicados = observador.eventos_aplicados
+    while observador.eventos_aplicados == aplicados:
+        await outro_cliente.alunos.insert_one({"nome": "aquecimento"})
+        await asyncio.sleep(0.1)
+    yield observador
+    await observador.parar()
+
+
+@pytest.fixture
+async def livro(banco):
+    livro = Livro(titulo="Ensaio sobre a Cegueira", ano=1995, isbn="1", categoria="Romance")
+    await livro.insert()
+    await indice_livros.reconstruir()
+    yield livro
+    cache_entidades.limpar()
+    ranking_cache.clear()
+
+
+async def test_escrita_de_outro_processo_invalida_cache_ranking_e_busca(observador_change_stream, outro_cliente, livro):
+    await cache_entidades.obter(Livro, livro.id, LivroOut)
+    ranking_cache.set(RANKING_LIMIT_PADRAO, [])
+
+    await outro_cliente.livros.update_one({"_id": livro.id}, {"$set": {"titulo": "Memorial do Convento"}})
+
+    await _esperar(lambda: cache_entidades.get(Livro, livro.id) is None)
+    await _esperar(lambda: livro.id in indice_livros.buscar("memorial"))
+    assert ranking_cache.get(RANKING_LIMIT_PADRAO) is None
+    assert livro.id not in indice_livros.buscar("cegueira")
+
+
+async def test_escritas_proprias_sao_ignoradas(observador_change_stream, outro_cliente, livro):
+    proprios = observador_change_stream.eventos_proprios
+    await livro.set({"titulo": "Memorial do Convento"})
+    # A rota já aplicou a escrita localmente; o evento dela não deve desfazer isso
+    cache_entidades.set(Livro, livro.id, LivroOut.model_validate(livro))
+
+    # Escrita de outro processo como barreira: quando ela chega, a própria já passou
+    aplicados = observador_change_stream.eventos_aplicados
+    await outro_cliente.alunos.insert_one({"nome": "barreira"})
+    await _esperar(lambda: observador_change_stream.eventos_aplicados > aplicados)
+
+    assert observador_change_stream.eventos_proprios == proprios + 1
+    assert not observador_change_stream._proprios
+    assert cache_entidades.get(Livro, livro.id) is not None
+
+
+@pytest.fixture
+async def observadores_polling(banco, monkeypatch):
+    # Este processo (listener do cliente da API) e outro, que só lê o journal
+    monkeypatch.setattr(observador, "modo_configurado", "polling")
+    outro = ObservadorMudancas("polling")
+    await observador.preparar()
+    await outro.preparar()
+    yield observador, outro
+    await observador.parar()
+
+
+async def test_polling_publica_e_consome_o_journal(observadores_polling, banco, livro):
+    este, outro = observadores_polling
+    assert (await banco[COLECAO_JOURNAL].options()).get("capped")
+
+    await livro.set({"titulo": "Memorial do Convento"})
+    aluno = Aluno(nome="Aluno", matricula="1", curso="CC", email="aluno@x.br")
+    await aluno.insert()
+    cache_entidades.set(Livro, livro.id, LivroOut.model_validate(livro))
+
+    await este._sincronizar_journal()
+    publicados = await banco[COLECAO_JOURNAL].find({"origem": este.origem}).to_list()
+    assert {(entrada["colecao"], entrada["documento_id"]) for entrada in publicados} >= {
+        ("livros", livro.id),
+        ("alunos", aluno.id),
+    }
+    # O próprio processo não reaplica o que publicou
+    assert este.eventos_aplicados == 0
+
+    await outro._sincronizar_journal()
+    assert outro.eventos_aplicados == len(publicados)
+    assert cache_entidades.get(Livro, livro.id) is None
+    assert livro.id in indice_livros.buscar("memorial")
+
+    # Entradas já vistas não são aplicadas de novo
+    await outro._sincronizar_journal()
+    assert outro.eventos_aplicados == len(publicados)
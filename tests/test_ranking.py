@@ -0,0 +1,29 @@
+from datetime import date
+import pytest
+from models import Aluno, Emprestimo, Livro
+from services.ranking import calcular_ranking
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_livro_removido_nao_ocupa_lugar_no_ranking(banco):
+    aluno = Aluno(nome="Aluno", matricula="1", curso="CC", email="aluno@x.br")
+    await aluno.insert()
+    livros = [Livro(titulo=f"Livro {i}", ano=2000, isbn=str(i), categoria="Romance") for i in range(3)]
+    for livro in livros:
+        await livro.insert()
+    # Livro 0 é o mais emprestado, seguido do 1 e do 2
+    for livro, vezes in zip(livros, (3, 2, 1)):
+        for _ in range(vezes):
+            await Emprestimo(
+                aluno=aluno,
+                livro=livro,
+                data_emprestimo=date(2026, 1, 1),
+                data_devolucao_prevista=date(2026, 1, 15),
+                data_devolucao=date(2026, 1, 10),
+            ).insert()
+
+    assert [linha["titulo"] for linha in await calcular_ranking(2)] == ["Livro 0", "Livro 1"]
+
+    await livros[0].delete()
+    assert [linha["titulo"] for linha in await calcular_ranking(2)] == ["Livro 1", "Livro 2"]
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from models import Tarefa
+from services.tarefas import FilaTarefas, tarefa
+
+pytestmark = pytest.mark.anyio
+
+
+def _fila() -> FilaTarefas:
+    return FilaTarefas(workers=1, tentativas=1, espera=0, tamanho=100, historico=100, persistir=True, drenar=1, lease=30)
+
+
+def _documento(status: str, lease_ate) -> dict:
+    return {
+        "nome": "contar",
+        "argumentos": {},
+        "chave": None,
+        "status": status,
+        "tentativas": 0,
+        "erro": None,
+        "criada_em": datetime.now(),
+        "iniciada_em": None,
+        "concluida_em": None,
+        "dono": "outro-processo",
+        "lease_ate": lease_ate,
+    }
+
+
+@pytest.fixture
+def execucoes():
+    contagem = []
+
+    @tarefa("contar")
+    async def contar():
+        contagem.append(1)
+
+    return contagem
+
+
+async def test_workers_assumem_cada_tarefa_abandonada_uma_vez(banco, execucoes):
+    colecao = Tarefa.get_pymongo_collection()
+    vencido = datetime.now() - timedelta(seconds=1)
+    await colecao.insert_many([_documento("pendente", vencido) for _ in range(5)])
+    await colecao.insert_one(_documento("executando", None))
+    # Dono ainda vivo: fica com ele
+    viva = (await colecao.insert_one(_documento("executando", datetime.now() + timedelta(minutes=5)))).inserted_id
+
+    filas = [_fila() for _ in range(3)]
+    await asyncio.gather(*(fila.iniciar() for fila in filas))
+    try:
+        assert sum(len(fila.listar()) for fila in filas) == 6
+        for _ in range(100):
+            if len(execucoes) == 6:
+                break
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.1)
+        assert len(execucoes) == 6
+    finally:
+        for fila in filas:
+            await fila.parar()
+
+    assert (await colecao.find_one({"_id": viva}))["dono"] == "outro-processo"
+    assert await colecao.count_documents({"status": "concluida"}) == 6
+
+
+async def test_parar_libera_as_tarefas_para_outro_processo(banco, execucoes):
+    colecao = Tarefa.get_pymongo_collection()
+    fila = _fila()
+    # Sem iniciar: enfileira sem executar, como um processo que cai antes dos workers
+    fila._fila = asyncio.Queue()
+    await fila.enfileirar("contar")
+    doc = await colecao.find_one()
+    assert doc["dono"] == fila.origem and doc["lease_ate"] > datetime.now()
+
+    await fila._liberar()
+    outra = _fila()
+    await outra.iniciar()
+    try:
+        for _ in range(100):
+            if execucoes:
+                break
+            await asyncio.sleep(0.02)
+        assert execucoes == [1]
+    finally:
+        await outra.parar()
+    assert (await colecao.find_one())["dono"] == outra.origem